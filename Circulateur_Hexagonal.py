@@ -16,11 +16,12 @@ Created on Mon Jan 13 10:31:37 2025
 @author: parker
 """
 
-import numpy as np
-from math import pi
-import ansys.aedt.core
 from pathlib import Path
-from ansys.aedt.core.application.variables import Variable
+from circulateur.adaptive import ConvergencePolicy
+from circulateur.builder import build, estimate, open_project
+from circulateur.cli import parse_arguments, release_at_exit, solve_and_export
+from circulateur.project import open_or_update
+from circulateur.spec import CirculatorSpec, DielectricSpec, FerriteSpec, SetupSpec
 
 ###############################
 # Paramètres de la simulation #
@@ -36,6 +37,17 @@ max_passes = 30
 max_delta_S = 0.02
 percent_refinement = 20
 
+# Balayage paramétrique des dimensions dans un seul setup Optimetrics réutilisant "Setup", e.g.
+# {"largeur_adaptation": ("650um", "750um", 5), "Hk": ["13000", "14000"]}
+# rayon_jonction, longueur_adaptation, largeur_50_Ohm, longueur_50_Ohm_min et hauteur_substrat ne peuvent pas être balayés ici :
+# ils alimentent longueur_substrat, largeur_port ou hauteur_port, calculées en Python
+parametric_sweep = {}
+
+# Présélection analytique avant l'ouverture de HFSS
+prescreen = False # Le modèle de Fay-Comstock ignore les lignes d'adaptation larges de ce design
+isolation_min = 20 # dB
+bande_isolation_min = "0GHz" # freq_unit
+
 ############################
 # Propriétés des matériaux #
 ############################
@@ -80,337 +92,128 @@ hauteur_ferrite = hauteur_substrat
 aedt_version = "2024.2"
 non_graphical = False
 new_desktop = True
+reports = None # Rapports de paramètres S, None pour ne les créer qu'avec l'interface graphique
+solve = False # Résolution et export des paramètres S dans Designs/<nom>
+release_desktop = False # Sauvegarde du projet et libération du Desktop à la fin du script
+update_mode = False # Réutilise le projet existant si sa structure n'a pas changé et ne met à jour que les variables (avec new_desktop = False pour rester dans la session AEDT ouverte)
+
+# Les options de la ligne de commande remplacent les valeurs ci-dessus, e.g.
+# python Circulateur_Hexagonal.py --non-graphical --no-reports --solve --release --profile-log etapes.jsonl
+options = parse_arguments(non_graphical = non_graphical,
+                          reports = reports,
+                          solve = solve,
+                          release = release_desktop)
+
+##############################
+# Description du circulateur #
+##############################
+
+Circulateur_spec = CirculatorSpec(name = "Circulateur Hexagonal",
+                                  topology = "hexagonal",
+                                  dimensions = {"epaisseur_metallisation": epaisseur_metallisation,
+                                                "rayon_jonction": rayon_jonction,
+                                                "longueur_adaptation": longueur_adaptation,
+                                                "largeur_adaptation": largeur_adaptation,
+                                                "largeur_50_Ohm": largeur_50_Ohm,
+                                                "longueur_50_Ohm_min": longueur_50_Ohm_min,
+                                                "hauteur_substrat": hauteur_substrat,
+                                                "rayon_ferrite": rayon_ferrite,
+                                                "hauteur_ferrite": hauteur_ferrite},
+                                  ferrite = FerriteSpec(epsilon = ferrite_epsilon,
+                                                        tand = ferrite_tand,
+                                                        Hk = Hk,
+                                                        Mr = Mr,
+                                                        delta_H = delta_H,
+                                                        freq_delta_H = freq_delta_H),
+                                  dielectric = DielectricSpec(epsilon = dielectrique_epsilon,
+                                                              tand = dielectrique_tand),
+                                  nzm_chen_path = str(Path(__file__).resolve().parent / Nzm_Chen_filename),
+                                  setup = SetupSpec(frequency = setup_frequency,
+                                                    sweep_start = sweep_start,
+                                                    sweep_stop = sweep_stop,
+                                                    sweep_step = sweep_step,
+                                                    max_passes = max_passes,
+                                                    max_delta_S = max_delta_S,
+                                                    percent_refinement = percent_refinement),
+                                  parametric = parametric_sweep)
+
+# Passes, raffinement et maillage initial appris des solves de géométries voisines (--convergence-history et --adaptive)
+if options.adaptive:
+    reglages = ConvergencePolicy(options.convergence_history).propose(Circulateur_spec)
+    Circulateur_spec = reglages.apply(Circulateur_spec)
+    print("Réglages adaptatifs d'après {} solves voisins : {} passes, raffinement de {}%, cible lambda {}".format(reglages.neighbours,
+                                                                                                                  reglages.max_passes,
+                                                                                                                  reglages.percent_refinement,
+                                                                                                                  reglages.lambda_target))
+
+###########################
+# Présélection analytique #
+###########################
+
+# Estimation de Fay-Comstock avant l'ouverture de HFSS : un design qui ne peut pas circuler dans la bande du sweep n'est pas simulé
+if prescreen:
+    estimation = estimate(Circulateur_spec,
+                          isolation_min = isolation_min,
+                          bandwidth_min = bande_isolation_min)
+
+    print("Fréquence de circulation estimée : {:.2f}GHz, bande à {}dB : {:.3f}GHz".format(float(estimation.frequency)/1e9,
+                                                                                          isolation_min,
+                                                                                          float(estimation.bandwidth)/1e9))
+    if not estimation.feasible:
+        raise SystemExit("Design rejeté par la présélection : " + str(estimation.reasons))
 
 ##########################
 # Initialisation de HFSS #
 ##########################
 
-# Création du nom du projet
-    # Pour obtenir le chemin du script
-script_path = Path(__file__).resolve()
-    # Pour obtenir le dossier dans lequel est le script
-script_dir = script_path.parent
-    # Définition du nom du projet            
-project_name = "Circulateur Hexagonal"
-project_dir = "Designs/" + project_name
-
-project = script_dir / project_dir / (project_name+".aedt")
-project.parent.parent.mkdir(parents=True,exist_ok=True)
-project.parent.mkdir(parents=True,exist_ok=True)
-
-# Création du projet HFSS
-Circulateur = ansys.aedt.core.Hfss(project = str(project),
-                                             version = aedt_version,
-                                             design = "Circulateur",
-                                             non_graphical = non_graphical,
-                                             new_desktop = new_desktop,
-                                             solution_type = "Modal")
-
-################################
-# Initialisation des variables #
-################################
-
-    # Propriétés des matériaux
-        # Dielectrique
-Circulateur["$dielectrique_epsilon"] = dielectrique_epsilon
-Circulateur["$dielectrique_tand"] = dielectrique_tand
-        # Ferrite
-Circulateur["$ferrite_epsilon"] = ferrite_epsilon
-Circulateur["$ferrite_tand"] = ferrite_tand
-Circulateur["$ferrite_Mr"] = Mr+"Gauss"
-Circulateur["$ferrite_delta_H"] = delta_H
-Circulateur["$ferrite_freq_delta_H"] = freq_delta_H
-    # Propriétés métallisation
-    # Dimensions de la jonction Y
-Circulateur["epaisseur_metallisation"] = epaisseur_metallisation
-Circulateur["rayon_jonction"] = rayon_jonction
-Circulateur["longueur_adaptation"] = longueur_adaptation
-Circulateur["largeur_adaptation"] = largeur_adaptation
-Circulateur["largeur_50_Ohm"] = largeur_50_Ohm
-Circulateur["longueur_50_Ohm_min"] = longueur_50_Ohm_min
-    # Dimensions du substrat
-Circulateur["hauteur_substrat"] = hauteur_substrat
-    # Calcul de la dimension des ports
-        # Equations from https://emtalk.com/waveport_calc.htm
-w = Circulateur.variable_manager.decompose("largeur_50_Ohm")[0]
-h = Circulateur.variable_manager.decompose("hauteur_substrat")[0]
-if w/h < 1:
-    largeur_port = 20*np.round(w)
-    hauteur_port = np.round(h/w)*np.ceil(h)
+# Le projet est créé dans Designs/Circulateur Hexagonal à côté de ce script
+script_dir = Path(__file__).resolve().parent
+
+if update_mode:
+    Circulateur, Circulateur_variables, _, _ = open_or_update(Circulateur_spec,
+                                                               script_dir,
+                                                               version = aedt_version,
+                                                               non_graphical = options.non_graphical,
+                                                               new_desktop = new_desktop,
+                                                               reports = options.reports,
+                                                               profiler = options.profiler)
 else:
-    largeur_port = np.round(w*(w/h)*(w/h))
-    hauteur_port = np.round(h*w/h)
-Circulateur["longueur_substrat"] = str(np.max([1.5*largeur_port/(2*np.tan(30*pi/180)),Circulateur.variable_manager.decompose("rayon_jonction")[0]+Circulateur.variable_manager.decompose("longueur_adaptation")[0]+Circulateur.variable_manager.decompose("longueur_50_Ohm_min")[0]]))+"um"
-    # Dimensions du ferrite
-Circulateur["rayon_ferrite"] = rayon_ferrite
-Circulateur["hauteur_ferrite"] = hauteur_ferrite
-    # Propriétés du ferrite
-Circulateur["Hk"] = Hk
-Circulateur["Mr"] = Mr
-        # Obtention du Nz à partir du dataset Nzm_Chen qui doit se trouver dans le même dossier que ce script
-            # Pour obtenir le chemin du script
-script_path = Path(__file__).resolve()
-            # Pour obtenir le dossier dans lequel est le script
-script_dir = script_path.parent
-Nzm_Chen_path = script_dir / Nzm_Chen_filename
-Circulateur["Nzm_Chen"] = Circulateur.import_dataset1d(input_file = str(Nzm_Chen_path), is_project_dataset = False)
-Circulateur["gamma_Chen"] = "hauteur_ferrite/(2*rayon_ferrite)"
-Circulateur["Nz"] = "pwl(Nzm_Chen,gamma_Chen)"
-        # Champ interne
-Circulateur["Hint"] = "Hk-Nz*Mr"
-Circulateur["Hint_apm"] = "1000*Hint/(4*pi)"
-
-    # Dimensions des ports    
-Circulateur["hauteur_port"] = str(hauteur_port)+"um"
-Circulateur["largeur_port"] = str(largeur_port)+"um"
-Circulateur["epaisseur_pec"] = "10um"
-
-#######################
-# Ajout des matériaux #
-#######################
-
-# Création du dielectrique
-Dielectrique = Circulateur.materials.add_material("mon_dielectrique")
-Dielectrique.permittivity.value = "$dielectrique_epsilon"
-Dielectrique.dielectric_loss_tangent.value = "$dielectrique_tand"
-
-# Création du ferrite
-Ferrite = Circulateur.materials.add_material("mon_ferrite")
-Ferrite.permittivity = "$ferrite_epsilon"
-Ferrite.dielectric_loss_tangent = "$ferrite_tand"
-#Ferrite.permeability.type = "nonlinear"
-#Ferrite.magnetic_saturation = "$ferrite_Mr"
+    Circulateur = open_project(Circulateur_spec,
+                               script_dir,
+                               version = aedt_version,
+                               non_graphical = options.non_graphical,
+                               new_desktop = new_desktop,
+                               profiler = options.profiler)
+
+if options.release:
+    release_at_exit(Circulateur)
 
 ###############################
-# Modélisation du circulateur #
+# Construction du circulateur #
 ###############################
 
-# Création du plan de masse
-GND = Circulateur.modeler.create_cylinder(orientation = 'Z',
-                                                    origin = [0, 0, 0],
-                                                    radius = "longueur_substrat/cos(30deg)",
-                                                    height = "-epaisseur_metallisation",
-                                                    num_sides = 6,
-                                                    name = "GND",
-                                                    material = "gold")
-GND.rotate(axis = "Z",
-           angle = "30deg")
-
-# Création du substrat
-Substrat = Circulateur.modeler.create_cylinder(orientation = 'Z',
-                                                         origin = [0, 0, 0],
-                                                         radius = "longueur_substrat/cos(30deg)",
-                                                         height = "hauteur_substrat",
-                                                         num_sides = 6,
-                                                         name = "Substrat",
-                                                         material = "mon_dielectrique")
-
-Substrat.rotate(axis = "Z",
-                angle = "30deg")
-
-# Création de l'insert de ferrite
-Ferrite = Circulateur.modeler.create_cylinder(orientation = 'Z',
-                                                        origin = [0, 0, 0],
-                                                        radius = "rayon_ferrite",
-                                                        height = "hauteur_substrat",
-                                                        name = "Ferrite",
-                                                        material = "mon_ferrite")
-
-# Création de la cavité dans le substrat
-Circulateur.modeler.subtract(blank_list = "Substrat",
-                                        tool_list = "Ferrite",
-                                        keep_originals = True)
-
-# Métallisation supérieure
-    # Création du résonateur
-Jonction = Circulateur.modeler.create_cylinder(orientation = 'Z',
-                                                         origin = [0, 0, "hauteur_substrat"],
-                                                         radius = "rayon_jonction",
-                                                         height = "epaisseur_metallisation",
-                                                         name = "Jonction",
-                                                         material = "gold")
-
-    # Création des lignes d'adaptation
-Ligne_adaptation_1 = Circulateur.modeler.create_box(origin = [0, "-largeur_adaptation/2", "hauteur_substrat"],
-                                                              sizes = ["rayon_jonction+longueur_adaptation","largeur_adaptation","epaisseur_metallisation"],
-                                                              name = "Ligne_adaptation_1",
-                                                              material = "gold")
-
-Ligne_adaptation_2 = Circulateur.modeler.create_box(origin = [0, "-largeur_adaptation/2", "hauteur_substrat"],
-                                                              sizes = ["rayon_jonction+longueur_adaptation","largeur_adaptation","epaisseur_metallisation"],
-                                                              name = "Ligne_adaptation_2",
-                                                              material = "gold")
-Ligne_adaptation_2.rotate(axis = 'Z',
-                          angle = "120deg")
-
-Ligne_adaptation_3 = Circulateur.modeler.create_box(origin = [0, "-largeur_adaptation/2", "hauteur_substrat"],
-                                                              sizes = ["rayon_jonction+longueur_adaptation","largeur_adaptation","epaisseur_metallisation"],
-                                                              name = "Ligne_adaptation_3",
-                                                              material = "gold")
-Ligne_adaptation_3.rotate(axis = 'Z',
-                          angle = "240deg")
-
-    # Création des lignes d'accès
-Ligne_50_Ohm_1 = Circulateur.modeler.create_box(origin = ["rayon_jonction+longueur_adaptation", "-largeur_50_Ohm/2", "hauteur_substrat"],
-                                                          sizes = ["longueur_substrat-rayon_jonction-longueur_adaptation","largeur_50_Ohm","epaisseur_metallisation"],
-                                                          name = "Ligne_50_Ohm_1",
-                                                          material = "gold")
-
-Ligne_50_Ohm_2 = Circulateur.modeler.create_box(origin = ["rayon_jonction+longueur_adaptation", "-largeur_50_Ohm/2", "hauteur_substrat"],
-                                                          sizes = ["longueur_substrat-rayon_jonction-longueur_adaptation","largeur_50_Ohm","epaisseur_metallisation"],
-                                                          name = "Ligne_50_Ohm_2",
-                                                          material = "gold")
-Ligne_50_Ohm_2.rotate(axis = 'Z',
-                      angle = "120deg")
-
-Ligne_50_Ohm_3 = Circulateur.modeler.create_box(origin = ["rayon_jonction+longueur_adaptation", "-largeur_50_Ohm/2", "hauteur_substrat"],
-                                                          sizes = ["longueur_substrat-rayon_jonction-longueur_adaptation","largeur_50_Ohm","epaisseur_metallisation"],
-                                                          name = "Ligne_50_Ohm_3",
-                                                          material = "gold")
-Ligne_50_Ohm_3.rotate(axis = 'Z',
-                      angle = "240deg")
-
-    # Union des différents éléments
-Circulateur.modeler.unite(["Jonction","Ligne_adaptation_1","Ligne_adaptation_2","Ligne_adaptation_3","Ligne_50_Ohm_1","Ligne_50_Ohm_2","Ligne_50_Ohm_3"])
-
-###################
-# Ajout des ports #
-###################
-
-# Ajout du port 1
-PEC_Port_1 = Circulateur.modeler.create_box(origin = ["longueur_substrat", "-largeur_port/2", 0],
-                                                      sizes = ["epaisseur_pec","largeur_port","hauteur_port"],
-                                                      name = "PEC_Port_1",
-                                                      material = "pec")
-Circulateur.wave_port(PEC_Port_1.bottom_face_x,
-                                name = "1")
-
-# Ajout du port 2
-PEC_Port_2 = Circulateur.modeler.create_box(origin = ["longueur_substrat", "-largeur_port/2", 0],
-                                                      sizes = ["epaisseur_pec","largeur_port","hauteur_port"],
-                                                      name = "PEC_Port_2",
-                                                      material = "pec")
-Circulateur.wave_port(PEC_Port_2.bottom_face_x,
-                                name = "2")
-PEC_Port_2.rotate(axis = 'Z',
-                  angle = "120deg")
-
-# Ajout du port 3
-PEC_Port_3 = Circulateur.modeler.create_box(origin = ["longueur_substrat", "-largeur_port/2", 0],
-                                                      sizes = ["epaisseur_pec","largeur_port","hauteur_port"],
-                                                      name = "PEC_Port_3",
-                                                      material = "pec")
-Circulateur.wave_port(PEC_Port_3.bottom_face_x,
-                                name = "3")
-PEC_Port_3.rotate(axis = 'Z',
-                  angle = "240deg")
-
-# Couleur des ports
-PEC_Port_1.color = (255,0,255)
-PEC_Port_2.color = (255,0,255)
-PEC_Port_3.color = (255,0,255)
+# Variables, matériaux, géométrie, ports, setup et rapports
+if not update_mode:
+    Circulateur_variables = build(Circulateur,
+                                  Circulateur_spec,
+                                  reports = options.reports,
+                                  profiler = options.profiler)
+# Pour retoucher une dimension sans tout reconstruire, seules les variables affectées sont repoussées :
+# Circulateur_variables.update(Circulateur, rayon_jonction = "1000um")
 
 ########################
-# Paramétrage du setup #
+# Résolution et export #
 ########################
 
-# Création de la boite d'air et des conditions aux limites
-Circulateur.set_auto_open(enable = True)
-
-# Analysis setup setting
-Setup = Circulateur.setups[0]
-    # Sweep setup
-var_sweep_start = Variable(sweep_start)
-var_sweep_stop = Variable(sweep_stop)
-var_sweep_step = Variable(sweep_step)
-
-var_sweep_stop.rescale_to(var_sweep_start.units)
-var_sweep_step.rescale_to(var_sweep_start.units)
-
-Setup.create_linear_step_sweep(name = "Sweep",
-                               unit = var_sweep_start.units,
-                               start_frequency = var_sweep_start.numeric_value,
-                               stop_frequency = var_sweep_stop.numeric_value,
-                               step_size = var_sweep_step.numeric_value,
-                               sweep_type = "Interpolating")
-    # Setup setup
-Setup.properties["Name"] = "Setup"
-Setup.properties["Solution Freq"] = setup_frequency
-Setup.properties["Delta S"] = max_delta_S
-Setup.properties["Passes"] = max_passes
-Setup.properties["Percent Refinement"] = percent_refinement
-
-###################
-# Post processing #
-###################
-
-plot_tous_les_ports = Circulateur.post.create_report(expressions = ["dB(S(1,1))", "dB(S(2,1))", "dB(S(3,1))",
-                                                                      "dB(S(2,2))", "dB(S(3,2))", "dB(S(1,2))",
-                                                                      "dB(S(3,3))", "dB(S(1,3))", "dB(S(2,3))"])
-plot_tous_les_ports.plot_name = "Tous les ports"
-plot_tous_les_ports.hide_legend(solution_name = False,
-                                trace_name = True,
-                                variation_key = False,
-                                font_size = 10)
-plot_tous_les_ports.edit_y_axis_scaling(min_scale = -30,
-                                        max_scale = 0)
-
-plot_Port_1 = Circulateur.post.create_report(expressions = ["db(S11)", "db(S21)", "db(S31)"])
-plot_Port_1.plot_name = "Port 1"
-plot_Port_1.hide_legend(solution_name = True,
-                        trace_name = True,
-                        variation_key = False,
-                        font_size = 10)
-plot_Port_1.edit_y_axis_scaling(min_scale = -30,
-                                max_scale = 0)
-
-plot_Port_2 = Circulateur.post.create_report(expressions = ["dB(S(2,2))", "dB(S(3,2))", "dB(S(1,2))"])
-plot_Port_2.plot_name = "Port 2"
-plot_Port_2.hide_legend(solution_name = True,
-                        trace_name = True,
-                        variation_key = False,
-                        font_size = 10)
-plot_Port_2.edit_y_axis_scaling(min_scale = -30,
-                                max_scale = 0)
-
-plot_Port_3 = Circulateur.post.create_report(expressions = ["dB(S(3,3))", "dB(S(1,3))", "dB(S(2,3))"])
-plot_Port_3.plot_name = "Port 3"
-plot_Port_3.hide_legend(solution_name = True,
-                        trace_name = True,
-                        variation_key = False,
-                        font_size = 10)
-plot_Port_3.edit_y_axis_scaling(min_scale = -30,
-                                max_scale = 0)
-
-plot_Adaptation = Circulateur.post.create_report(expressions = ["dB(S(1,1))", "dB(S(2,2))", "dB(S(3,3))"])
-plot_Adaptation.plot_name = "Adaptation"
-plot_Adaptation.hide_legend(solution_name = True,
-                            trace_name = True,
-                            variation_key = False,
-                            font_size = 10)
-plot_Adaptation.edit_y_axis_scaling(min_scale = -30,
-                                    max_scale = 0)
-
-plot_Isolation = Circulateur.post.create_report(expressions = ["dB(S(2,1))", "dB(S(3,2))", "dB(S(1,3))"])
-plot_Isolation.plot_name = "Isolation"
-plot_Isolation.hide_legend(solution_name = True,
-                           trace_name = True,
-                           variation_key = False,
-                           font_size = 10)
-plot_Isolation.edit_y_axis_scaling(min_scale = -30,
-                                   max_scale = 0)
-
-
-plot_Transmission = Circulateur.post.create_report(expressions = ["dB(S(3,1))", "dB(S(1,2))", "dB(S(2,3))"])
-plot_Transmission.plot_name = "Transmission"
-plot_Transmission.hide_legend(solution_name = True,
-                              trace_name = True,
-                              variation_key = False,
-                              font_size = 10)
-plot_Transmission.edit_y_axis_scaling(min_scale = -30,
-                                      max_scale = 0)
-
-
-
-
-#Circulateur.release_desktop()
\ No newline at end of file
+# Paramètres S du Sweep écrits dans Designs/<nom>/<nom>.s3p (<nom>_variation_<n>.s3p par variation paramétrique) et dans le stockage Designs/<nom>/Resultats
+if options.solve:
+    fichiers_resultats = solve_and_export(Circulateur,
+                                          Circulateur_spec,
+                                          Circulateur_variables,
+                                          script_dir,
+                                          cores = options.cores,
+                                          profiler = options.profiler,
+                                          monitor = options.monitor,
+                                          history = options.convergence_history)
+    for fichier_resultats in fichiers_resultats:
+        print("Paramètres S exportés dans " + str(fichier_resultats))
@@ -0,0 +1,8 @@
+"""
+Shared building blocks for the ferrite circulator scripts
+
+The Y, T and hexagonal circulator scripts import their physics and helper
+functions from this package instead of each defining their own copy.
+"""
+
+from circulateur.ferrite import GYRO_RATIO, Polder_Mu_eff, internal_field, polder_grid, polder_tensor
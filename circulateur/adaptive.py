@@ -0,0 +1,260 @@
+"""
+Adaptive settings learnt from the convergence of previous solves
+
+Every solve can be appended to a ``ConvergenceHistory``, a JSON lines file
+holding the design, its topology, the SI values of the geometric features
+(``FEATURES``), the adaptive settings and the ``(tetrahedra, delta_s)`` of
+every pass::
+
+    {"time": "2025-03-04T09:12:40", "design": "Circulateur en Y", "topology": "Y",
+     "features": {"rayon_jonction": 0.0011, "hauteur_substrat": 0.000352},
+     "settings": {"max_passes": 30, "max_delta_S": 0.02, "percent_refinement": 20, "lambda_target": null},
+     "passes": [[20000, null], [24000, 0.37], ...], "completed": true, "memory": 6.2e9, "elapsed": 845.1}
+
+``ConvergencePolicy`` looks up the solves of the same topology whose features
+are within ``radius`` (relative) of a new design and estimates from them the
+initial mesh at the default lambda target and the mesh at which delta S
+reached the requested ``max_delta_S``. It then proposes:
+
+- a finer initial mesh (``lambda_target``), seeded at ``seed_fraction`` of
+  the converged mesh, AEDT meshing ``(0.3333/target)**3`` times more
+  tetrahedra than with its default target,
+- the ``percent_refinement`` covering the remaining growth in about
+  ``growth_passes`` passes, so that the mesh overshoots the converged one,
+  and the peak memory, by at most one refinement,
+- ``max_passes`` as the passes this schedule needs plus ``margin``, bounded
+  by the spec.
+
+``max_delta_S`` is the accuracy requested by the spec and is kept. Without
+at least ``min_neighbours`` similar solves the spec is left unchanged. From
+the scripts::
+
+    python Circulateur_Y_Ferrite_substrate.py --non-graphical --solve --convergence-history convergence.jsonl --adaptive
+"""
+
+import datetime
+import json
+import math
+from dataclasses import replace
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from circulateur.builder import variable_graph
+
+# Variables de design qui déterminent le maillage d'une topologie
+FEATURES = ("rayon_jonction", "hauteur_substrat")
+# Cible lambda du maillage initial d'AEDT quand SetLambdaTarget n'est pas activé
+DEFAULT_LAMBDA_TARGET = 0.3333
+
+
+def _json_value(value):
+    # NaN écrit null, pour un JSON strict
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+def features(spec, graph=None):
+    """``{name: SI value}`` of the ``FEATURES`` defined by the spec."""
+    graph = graph or variable_graph(spec)
+    return {name: float(graph.values[name]) for name in FEATURES if name in graph}
+
+
+def converged_mesh(passes, max_delta_S):
+    """Tetrahedra of the first pass with delta S below ``max_delta_S``, ``None`` if none."""
+    for tetrahedra, delta_s in passes:
+        if delta_s is not None and tetrahedra is not None and delta_s <= max_delta_S:
+            return float(tetrahedra)
+    return None
+
+
+class ConvergenceHistory:
+    """JSON lines file of the convergence of past solves.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        File appended to by every solve.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def append(self, spec, passes, completed=True, memory=None, elapsed=None, graph=None):
+        """Record the solve of ``spec``.
+
+        Parameters
+        ----------
+        spec : circulateur.spec.CirculatorSpec
+            Spec solved, with the adaptive settings of the solve.
+        passes : list
+            ``(tetrahedra, delta_s)`` of every pass, NaN or ``None`` when
+            unknown.
+        completed : bool, optional
+            Whether the solve ended normally. The default is ``True``.
+        memory : float, optional
+            Peak memory of AEDT in bytes.
+        elapsed : float, optional
+            Duration of the solve in s.
+        graph : circulateur.variables.VariableGraph, optional
+            Variables of the spec, evaluated again when omitted.
+
+        Returns
+        -------
+        dict
+            Record written.
+        """
+        record = {"time": datetime.datetime.now().isoformat(timespec="seconds"),
+                  "design": spec.name,
+                  "topology": spec.topology,
+                  "features": features(spec, graph),
+                  "settings": {"max_passes": spec.setup.max_passes,
+                               "max_delta_S": spec.setup.max_delta_S,
+                               "percent_refinement": spec.setup.percent_refinement,
+                               "lambda_target": spec.setup.lambda_target},
+                  "passes": [[_json_value(float(tetrahedra)), _json_value(float(delta_s))] for tetrahedra, delta_s in passes],
+                  "completed": bool(completed),
+                  "memory": _json_value(memory),
+                  "elapsed": elapsed}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as history:
+            history.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    def records(self, topology=None):
+        """Recorded solves, of one ``topology`` or all of them, oldest first."""
+        if not self.path.exists():
+            return []
+        records = []
+        with open(self.path, encoding="utf-8") as history:
+            for line in history:
+                # Une ligne tronquée par un arrêt brutal est ignorée
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if topology is None or record.get("topology") == topology:
+                    records.append(record)
+        return records
+
+
+class AdaptiveSettings(NamedTuple):
+    """Adaptive settings proposed for one design."""
+    max_passes: int
+    max_delta_S: float
+    percent_refinement: int
+    lambda_target: Optional[float] # None pour la cible par défaut d'AEDT
+    neighbours: int # Solves similaires utilisés, 0 si la spec est gardée
+    tetrahedra: float # Maillage convergé attendu, NaN sans historique
+
+    def apply(self, spec):
+        """Copy of ``spec`` with these adaptive settings."""
+        return replace(spec, setup=replace(spec.setup,
+                                           max_passes=self.max_passes,
+                                           max_delta_S=self.max_delta_S,
+                                           percent_refinement=self.percent_refinement,
+                                           lambda_target=self.lambda_target))
+
+
+class ConvergencePolicy:
+    """Adaptive settings of a design from the solves of similar geometries.
+
+    Parameters
+    ----------
+    history : ConvergenceHistory or str or pathlib.Path
+        Past solves.
+    radius : float, optional
+        Largest relative distance of the features of a similar solve. The
+        default is ``0.25``.
+    neighbours : int, optional
+        Nearest similar solves used. The default is ``8``.
+    min_neighbours : int, optional
+        Similar solves needed to change the spec. The default is ``2``.
+    seed_fraction : float, optional
+        Initial mesh aimed at, as a fraction of the converged mesh. The
+        default is ``0.5``.
+    growth_passes : int, optional
+        Passes over which the mesh grows from the initial to the converged
+        one. The default is ``3``.
+    margin : int, optional
+        Passes allowed beyond the expected ones. The default is ``2``.
+    refinement : tuple of int, optional
+        Bounds of the proposed ``percent_refinement``. The default is
+        ``(10, 50)``.
+    lambda_min : float, optional
+        Finest proposed lambda target. The default is ``0.1``.
+    """
+
+    def __init__(self, history, radius=0.25, neighbours=8, min_neighbours=2, seed_fraction=0.5, growth_passes=3, margin=2,
+                 refinement=(10, 50), lambda_min=0.1):
+        self.history = history if isinstance(history, ConvergenceHistory) else ConvergenceHistory(history)
+        self.radius = radius
+        self.neighbours = neighbours
+        self.min_neighbours = min_neighbours
+        self.seed_fraction = seed_fraction
+        self.growth_passes = growth_passes
+        self.margin = margin
+        self.refinement = refinement
+        self.lambda_min = lambda_min
+
+    def similar(self, spec, graph=None):
+        """``(distance, record)`` of the nearest solves of the spec's topology, nearest first.
+
+        The distance is the root mean square of the relative differences of
+        the features both define; solves sharing none are ignored.
+        """
+        values = features(spec, graph)
+        similar = []
+        for record in self.history.records(spec.topology):
+            common = [name for name in values if record.get("features", {}).get(name) is not None and values[name] != 0]
+            if not common or len(record.get("passes", [])) < 2:
+                continue
+            distance = math.sqrt(np.mean([((record["features"][name] - values[name])/values[name])**2 for name in common]))
+            if distance <= self.radius:
+                similar.append((distance, record))
+        similar.sort(key=lambda item: item[0])
+        return similar[:self.neighbours]
+
+    def propose(self, spec, graph=None):
+        """Adaptive settings of ``spec``.
+
+        Returns
+        -------
+        AdaptiveSettings
+        """
+        setup = spec.setup
+        unchanged = AdaptiveSettings(setup.max_passes, setup.max_delta_S, setup.percent_refinement, setup.lambda_target, 0, np.nan)
+        initial, converged, weights = [], [], []
+        for distance, record in self.similar(spec, graph):
+            mesh = converged_mesh(record["passes"], setup.max_delta_S)
+            first = record["passes"][0][0]
+            if mesh is None or not first:
+                continue
+            # Maillage initial ramené à la cible lambda par défaut
+            target = record["settings"].get("lambda_target") or DEFAULT_LAMBDA_TARGET
+            initial.append(first*(target/DEFAULT_LAMBDA_TARGET)**3)
+            converged.append(mesh)
+            # Poids gaussien de la distance relative
+            weights.append(math.exp(-0.5*(distance/(0.5*self.radius))**2))
+        if len(converged) < self.min_neighbours:
+            return unchanged
+
+        count = len(converged)
+        # Moyennes géométriques pondérées, les tailles de maillage variant d'un facteur
+        initial = math.exp(np.average(np.log(initial), weights=weights))
+        converged = math.exp(np.average(np.log(converged), weights=weights))
+
+        lambda_target = None
+        seed = initial
+        if self.seed_fraction*converged > initial:
+            lambda_target = max(self.lambda_min, DEFAULT_LAMBDA_TARGET*(initial/(self.seed_fraction*converged))**(1/3))
+            seed = initial*(DEFAULT_LAMBDA_TARGET/lambda_target)**3
+            lambda_target = round(lambda_target, 4)
+
+        growth = max(converged/seed, 1.0)
+        percent = int(round(100*(growth**(1/self.growth_passes) - 1)))
+        percent = int(np.clip(percent, *self.refinement))
+        # Première passe sans delta S, puis une passe par raffinement
+        expected = 1 + max(1, math.ceil(math.log(growth)/math.log(1 + percent/100)))
+        max_passes = min(setup.max_passes, expected + self.margin)
+        return AdaptiveSettings(max_passes, setup.max_delta_S, percent, lambda_target, count, converged)
@@ -0,0 +1,290 @@
+"""
+Streaming reader for AEDT project files
+
+``.aedt`` files are nested ``$begin 'Name'`` / ``$end 'Name'`` text blocks
+holding ``key=value``, ``key(args)`` and ``key[n: args]`` lines. Solved
+projects grow to hundreds of MB, so ``AedtFile`` memory-maps the file and
+builds an offset index of the blocks in a single pass over the mapped
+bytes, without decoding or copying the file. Blocks are then reached by path
+(``"AnsoftProject/Desktop"``) and only the requested block is decoded and
+parsed::
+
+    with AedtFile("Designs/Circulateur en Y/Circulateur en Y.aedt") as project:
+        project["AnsoftProject/Desktop"].properties()["Version"]
+        project.variables()
+
+No AEDT installation is needed.
+"""
+
+import mmap
+import re
+from pathlib import Path
+from typing import NamedTuple
+
+# Recherche littérale de "$", bien plus rapide qu'un motif ancré en début de ligne
+_MARKER = re.compile(rb"\$(begin|end) '([^'\r\n]*)'")
+_ASSIGNMENT = re.compile(r"^([^=(\[\s]+)(?:=(.*)|(\(.*\))|(\[.*\]))$", re.S)
+_NUMBER = re.compile(r"^[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?$")
+
+
+class _Entry(NamedTuple):
+    name: str
+    parent: int # -1 pour les blocs de premier niveau
+    start: int # Début de la ligne $begin
+    body: int # Début du contenu, après la ligne $begin
+    body_end: int # Début de la ligne $end
+    end: int # Après la ligne $end
+
+
+def _unquoted(text):
+    # (position, caractère) hors des chaînes entre apostrophes
+    quoted = False
+    for index, char in enumerate(text):
+        if quoted:
+            if char == "'" and text[index - 1] != "\\":
+                quoted = False
+        elif char == "'":
+            quoted = True
+        else:
+            yield index, char
+
+
+def _open_parentheses(text):
+    # Parenthèses ouvertes et non refermées hors des chaînes
+    return sum(1 if char == "(" else -1 for _, char in _unquoted(text) if char in "()")
+
+
+def _split_arguments(text):
+    # Découpe "a, 'b, c', f(d, e)" aux virgules de premier niveau
+    arguments = []
+    depth = 0
+    start = 0
+    for index, char in _unquoted(text):
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        elif char == "," and depth == 0:
+            arguments.append(text[start:index].strip())
+            start = index + 1
+    if text[start:].strip():
+        arguments.append(text[start:].strip())
+    return arguments
+
+
+def parse_value(text):
+    """Python value of an AEDT property value.
+
+    Quoted strings, booleans and numbers are converted; ``(a, b)`` argument
+    lists become lists; anything else is returned as a string.
+    """
+    text = text.strip()
+    if len(text) >= 2 and text[0] == "'" and text[-1] == "'":
+        return text[1:-1].replace("\\'", "'")
+    if text in ("true", "false"):
+        return text == "true"
+    if _NUMBER.match(text):
+        return float(text) if any(char in text for char in ".eE") else int(text)
+    if text.startswith("(") and text.endswith(")"):
+        return [parse_value(argument) for argument in _split_arguments(text[1:-1])]
+    if text.startswith("[") and text.endswith("]"):
+        # [n: a, b, ...] : le nombre d'éléments précède la liste
+        _, _, items = text[1:-1].partition(":")
+        return [parse_value(argument) for argument in _split_arguments(items)]
+    return text
+
+
+class Block:
+    """Lazily decoded ``$begin``/``$end`` block of an ``AedtFile``."""
+
+    def __init__(self, file, index):
+        self._file = file
+        self._index = index
+
+    @property
+    def name(self):
+        return self._file._entries[self._index].name
+
+    @property
+    def path(self):
+        names = []
+        index = self._index
+        while index >= 0:
+            names.append(self._file._entries[index].name)
+            index = self._file._entries[index].parent
+        return "/".join(reversed(names))
+
+    def __repr__(self):
+        return "Block('{}')".format(self.path)
+
+    def children(self, name=None):
+        """Child blocks, optionally only those called ``name``."""
+        return [Block(self._file, index) for index in self._file._children(self._index)
+                if name is None or self._file._entries[index].name == name]
+
+    def child(self, name):
+        """First child block called ``name``."""
+        for index in self._file._children(self._index):
+            if self._file._entries[index].name == name:
+                return Block(self._file, index)
+        raise KeyError("No block '{}' in '{}'".format(name, self.path))
+
+    def __getitem__(self, path):
+        block = self
+        for name in path.strip("/").split("/"):
+            block = block.child(name)
+        return block
+
+    def __contains__(self, name):
+        return any(self._file._entries[index].name == name for index in self._file._children(self._index))
+
+    def text(self):
+        """Decoded content of the block, nested blocks included."""
+        entry = self._file._entries[self._index]
+        return self._file._map[entry.body:entry.body_end].decode("utf-8", errors="replace")
+
+    def lines(self):
+        """Decoded lines of the block itself, nested blocks excluded."""
+        entry = self._file._entries[self._index]
+        position = entry.body
+        for child in self._file._children(self._index):
+            yield from self._file._lines(position, self._file._entries[child].start)
+            position = self._file._entries[child].end
+        yield from self._file._lines(position, entry.body_end)
+
+    def entries(self):
+        """``(name, value)`` of every property line, repeated names included."""
+        pending = ""
+        for line in self.lines():
+            line = pending + line.strip()
+            if not line:
+                continue
+            # Une valeur entre parenthèses peut continuer sur les lignes suivantes
+            if _open_parentheses(line) > 0:
+                pending = line + " "
+                continue
+            pending = ""
+            match = _ASSIGNMENT.match(line)
+            if match is None:
+                yield line, None
+                continue
+            name, value, arguments, array = match.groups()
+            yield name, parse_value(value if value is not None else arguments or array)
+
+    def properties(self):
+        """``{name: value}`` of the property lines, the last one wins for repeated names."""
+        return dict(self.entries())
+
+
+class AedtFile:
+    """Memory-mapped ``.aedt`` file with an index of its blocks.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Project file, opened read-only.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._handle = open(self.path, "rb")
+        try:
+            self._map = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Fichier vide
+            self._map = b""
+        self._entries = None
+        self._child_index = None
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _index(self):
+        # Un seul passage sur le fichier mappé, rien n'est décodé
+        if self._entries is not None:
+            return
+        entries = []
+        stack = [] # (nom, parent, début, début du contenu, indice dans entries)
+        for marker in _MARKER.finditer(self._map):
+            # Seuls les marqueurs en début de ligne comptent, pas ceux des données embarquées
+            line_start = self._map.rfind(b"\n", 0, marker.start()) + 1
+            if self._map[line_start:marker.start()].strip(b" \t"):
+                continue
+            line_end = self._map.find(b"\n", marker.end())
+            line_end = len(self._map) if line_end < 0 else line_end + 1
+            kind, name = marker.group(1), marker.group(2).decode("utf-8", errors="replace")
+            if kind == b"begin":
+                stack.append((name, stack[-1][4] if stack else -1, line_start, line_end, len(entries)))
+                entries.append(None)
+            else:
+                if not stack or stack[-1][0] != name:
+                    expected = stack[-1][0] if stack else None
+                    raise ValueError("{}: $end '{}' at byte {} does not close '{}'".format(self.path, name, marker.start(), expected))
+                name, parent, start, body, slot = stack.pop()
+                entries[slot] = _Entry(name, parent, start, body, line_start, line_end)
+        if stack:
+            raise ValueError("{}: block '{}' is never closed".format(self.path, stack[-1][0]))
+        self._entries = entries
+
+    def _children(self, index):
+        self._index()
+        if self._child_index is None:
+            self._child_index = {}
+            for child, entry in enumerate(self._entries):
+                self._child_index.setdefault(entry.parent, []).append(child)
+        return self._child_index.get(index, [])
+
+    def _lines(self, start, end):
+        if end > start:
+            yield from self._map[start:end].decode("utf-8", errors="replace").splitlines()
+
+    def blocks(self):
+        """Top-level blocks."""
+        return [Block(self, index) for index in self._children(-1)]
+
+    def __getitem__(self, path):
+        first, _, rest = path.strip("/").partition("/")
+        for block in self.blocks():
+            if block.name == first:
+                return block[rest] if rest else block
+        raise KeyError("No block '{}' in {}".format(first, self.path))
+
+    def find(self, name):
+        """Every block called ``name``, at any depth."""
+        self._index()
+        return [Block(self, index) for index, entry in enumerate(self._entries) if entry.name == name]
+
+    def designs(self):
+        """``{design name: block}`` of the designs of the project."""
+        designs = {}
+        for block in self["AnsoftProject"].children():
+            if "ModelSetup" in block:
+                designs[block.properties().get("Name", block.name)] = block
+        return designs
+
+    def variables(self):
+        """Project and design variables.
+
+        Returns
+        -------
+        dict
+            ``{"$project_variable": expression, ..., "design": {name: expression}}``
+            with one dictionary per design.
+        """
+        def variable_props(block):
+            if "Properties" not in block:
+                return {}
+            return {value[0]: value[3] for name, value in block.child("Properties").entries()
+                    if name == "VariableProp" and isinstance(value, list) and len(value) >= 4}
+
+        variables = variable_props(self["AnsoftProject"])
+        for name, design in self.designs().items():
+            variables[name] = variable_props(design.child("ModelSetup"))
+        return variables
@@ -0,0 +1,217 @@
+"""
+Benchmark of the project generation, phase by phase
+
+Every circulator script is built several times and each phase of the build
+is timed separately:
+
+- ``desktop``: opening the project, i.e. launching AEDT,
+- ``variables``, ``materials``, ``geometry``, ``ports``, ``setup``,
+  ``reports`` (and ``parametric``): the stages of
+  ``circulateur.builder.build``, see ``circulateur.profiling``.
+
+By default the builds run against ``circulateur.mock.MockHfss``, which also
+counts the AEDT calls of each phase, so that the cost of the builders is
+measured without a licence; ``--aedt`` runs them in real AEDT sessions. The
+results are written as JSON and compared with a previous run, a phase being
+flagged when its best time grows by more than the tolerance or when it
+makes more AEDT calls::
+
+    python -m circulateur.benchmark Circulateur_*.py --repeat 5 --output benchmark.json --baseline previous.json
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from circulateur.builder import build, open_project
+from circulateur.mock import patched
+from circulateur.profiling import Profiler
+
+_STOP_BANNER = "# Présélection analytique #"
+
+
+class Regression(NamedTuple):
+    """Phase slower, or making more AEDT calls, than in the baseline."""
+    design: str
+    phase: str
+    metric: str # "min" en s ou "calls"
+    baseline: float
+    current: float
+
+
+def load_spec(script):
+    """``CirculatorSpec`` described by a circulator script, without running HFSS.
+
+    The script is executed up to its analytic pre-screen, its command line
+    options being ignored.
+    """
+    source = Path(script).read_text(encoding="utf-8")
+    stop = source.find(_STOP_BANNER)
+    if stop < 0:
+        raise ValueError("{} has no '{}' section".format(script, _STOP_BANNER.strip("# ")))
+    namespace = {"__file__": str(Path(script).resolve()), "__name__": "__benchmark__"}
+    argv = sys.argv
+    sys.argv = [str(script)]
+    try:
+        exec(compile(source[:source.rfind("\n", 0, stop)], str(script), "exec"), namespace)
+    finally:
+        sys.argv = argv
+    specs = [value for value in namespace.values() if type(value).__name__ == "CirculatorSpec"]
+    if len(specs) != 1:
+        raise ValueError("{} defines {} circulator specs".format(script, len(specs)))
+    return specs[0]
+
+
+def run_once(spec, directory, version="2024.2", aedt=False, latency=0.0):
+    """Times in s and numbers of AEDT calls of every stage of one build.
+
+    Returns
+    -------
+    dict
+        ``{stage: (time, calls)}``, calls being ``None`` with ``aedt=True``.
+    """
+    profiler = Profiler()
+
+    def generate():
+        app = open_project(spec, directory, version=version, non_graphical=True, new_desktop=True, profiler=profiler)
+        try:
+            build(app, spec, reports=True, profiler=profiler)
+        finally:
+            if aedt:
+                app.release_desktop(close_projects=True, close_desktop=True)
+
+    if aedt:
+        generate()
+    else:
+        with patched(latency=latency):
+            generate()
+    return {record["stage"]: (record["wall_time"], record["calls"]) for record in profiler.records}
+
+
+def benchmark(scripts, repeat=3, version="2024.2", aedt=False, latency=0.0):
+    """Benchmark the project generation of every script.
+
+    Parameters
+    ----------
+    scripts : list of str or pathlib.Path
+        Circulator scripts.
+    repeat : int, optional
+        Builds per script. The default is ``3``.
+    version : str, optional
+        AEDT version. The default is ``"2024.2"``.
+    aedt : bool, optional
+        Whether to build in AEDT instead of ``MockHfss``. The default is
+        ``False``.
+    latency : float, optional
+        Simulated round trip per call of the mock in s.
+
+    Returns
+    -------
+    dict
+        JSON-serializable results, ``results["designs"][name][phase]``
+        holding the ``times`` of every build, their ``median`` and ``min``
+        and the number of AEDT ``calls``.
+    """
+    results = {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+               "backend": "aedt" if aedt else "mock",
+               "version": version,
+               "latency": latency,
+               "python": platform.python_version(),
+               "machine": platform.node(),
+               "repeat": repeat,
+               "designs": {}}
+    for script in scripts:
+        spec = load_spec(script)
+        times = {}
+        calls = {}
+        for _ in range(repeat):
+            directory = tempfile.mkdtemp(prefix="circulateur_benchmark_")
+            try:
+                for phase, (duration, count) in run_once(spec, directory, version, aedt, latency).items():
+                    times.setdefault(phase, []).append(duration)
+                    calls[phase] = count
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+        results["designs"][spec.name] = {phase: {"times": times[phase],
+                                                 "median": float(np.median(times[phase])),
+                                                 "min": float(np.min(times[phase])),
+                                                 "calls": calls[phase]}
+                                         for phase in times}
+    return results
+
+
+def compare(current, baseline, tolerance=0.2, min_time=5e-3):
+    """Phases of ``current`` that regressed with respect to ``baseline``.
+
+    A phase regresses when its best time over the builds, the least noisy,
+    exceeds the baseline by more than ``tolerance`` (relative) and
+    ``min_time`` seconds, or when it makes more AEDT calls. Only results of
+    the same backend are compared.
+
+    Returns
+    -------
+    list of Regression
+    """
+    if current.get("backend") != baseline.get("backend"):
+        raise ValueError("Cannot compare '{}' results with a '{}' baseline".format(current.get("backend"), baseline.get("backend")))
+    regressions = []
+    for design, phases in current["designs"].items():
+        for phase, result in phases.items():
+            reference = baseline["designs"].get(design, {}).get(phase)
+            if reference is None:
+                continue
+            if result["min"] > reference["min"]*(1 + tolerance) and result["min"] - reference["min"] > min_time:
+                regressions.append(Regression(design, phase, "min", reference["min"], result["min"]))
+            if result["calls"] is not None and reference["calls"] is not None and result["calls"] > reference["calls"]:
+                regressions.append(Regression(design, phase, "calls", reference["calls"], result["calls"]))
+    return regressions
+
+
+def report(results):
+    """Table of the median time and AEDT calls of every phase."""
+    lines = []
+    for design, phases in results["designs"].items():
+        lines.append("{} ({}, {} builds)".format(design, results["backend"], results["repeat"]))
+        for phase, result in phases.items():
+            lines.append("  {:<10} {:>10.2f} ms {:>6} calls".format(phase, 1e3*result["median"], "-" if result["calls"] is None else result["calls"]))
+        lines.append("  {:<10} {:>10.2f} ms".format("total", 1e3*sum(result["median"] for result in phases.values())))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every phase of the project generation of circulator scripts.")
+    parser.add_argument("scripts", nargs="+", help="circulator scripts")
+    parser.add_argument("--repeat", type=int, default=3, help="builds per script")
+    parser.add_argument("--aedt", action="store_true", help="build in AEDT instead of the mock")
+    parser.add_argument("--version", default="2024.2", help="AEDT version")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated round trip per call of the mock in s")
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="JSON results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown flagged as a regression")
+    parser.add_argument("--min-time", type=float, default=5e-3, help="smallest slowdown flagged as a regression in s")
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.scripts, repeat=args.repeat, version=args.version, aedt=args.aedt, latency=args.latency)
+    print(report(results))
+    if args.output is not None:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=1)
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as baseline:
+        regressions = compare(results, json.load(baseline), args.tolerance, args.min_time)
+    for regression in regressions:
+        print("Regression {} / {}: {} {:.4g} -> {:.4g}".format(*regression))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
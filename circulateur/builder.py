@@ -0,0 +1,365 @@
+"""
+Data-driven HFSS builder for the circulator topologies
+
+Turns a ``CirculatorSpec`` into an HFSS project. The build is split in the
+phases of the original scripts: variables, materials, geometry, ports, setup
+and reports. Only the topology data from ``circulateur.topologies`` changes
+from one circulator to the other.
+"""
+
+from pathlib import Path
+
+import numpy as np
+from ansys.aedt.core.application.variables import Variable
+
+from circulateur.demag import AHARONI_EXPRESSIONS, aharoni_nz
+from circulateur.expressions import Evaluator, evaluate, unit_scale
+from circulateur.ferrite import Polder_Mu_eff
+from circulateur.nzm_chen import NZM_CHEN_PATH, chen_nz, load_dataset
+from circulateur.parametric import add_parametric_sweep
+from circulateur.prescreen import estimate as prescreen_estimate
+from circulateur.profiling import Profiler, count_aedt_calls
+from circulateur.reports import create_reports
+from circulateur.results import variables_hash
+from circulateur.spec import BentLine, Box, Cylinder
+from circulateur.topologies import TOPOLOGIES
+from circulateur.variables import Computed, VariableGraph
+
+
+def _rescaled(expression, unit):
+    return evaluate(expression)/unit_scale(unit)
+
+
+def dimension_values(spec):
+    """Numeric value in um of every dimension and topology variable, evaluated locally."""
+    values = Evaluator({**spec.dimensions, **TOPOLOGIES[spec.topology].variables}).evaluate()
+    return {name: value/unit_scale("um") for name, value in values.items()}
+
+
+def port_size(w, h):
+    """Wave port width and height in um for a microstrip of width ``w`` on a substrate of height ``h``.
+
+    Equations from https://emtalk.com/waveport_calc.htm
+    """
+    if w/h < 1:
+        largeur_port = 20*np.round(w)
+        hauteur_port = np.round(h/w)*np.ceil(h)
+    else:
+        largeur_port = np.round(w*(w/h)*(w/h))
+        hauteur_port = np.round(h*w/h)
+    return largeur_port, hauteur_port
+
+
+def demagnetisation_factor(spec):
+    """Nz of the ferrite computed locally with the topology's demagnetisation model."""
+    topology = TOPOLOGIES[spec.topology]
+    values = dimension_values(spec)
+    if topology.demagnetisation == "aharoni":
+        return aharoni_nz(*topology.demagnetisation_dimensions(values))
+    return chen_nz(values["hauteur_ferrite"]/(2*values["rayon_ferrite"]), path=spec.nzm_chen_path or NZM_CHEN_PATH)
+
+
+def estimate(spec, isolation_min=20, bandwidth_min="0GHz"):
+    """Analytic pre-screen of the spec over its sweep band, see ``circulateur.prescreen``."""
+    return prescreen_estimate(radius = _rescaled(spec.dimensions["rayon_jonction"], "meter"),
+                              epsilon = float(spec.ferrite.epsilon),
+                              Hk = float(spec.ferrite.Hk),
+                              Nz = demagnetisation_factor(spec),
+                              Mr = float(spec.ferrite.Mr),
+                              dH = _rescaled(spec.ferrite.delta_H, "Oe"),
+                              f_dH = _rescaled(spec.ferrite.freq_delta_H, "Hz"),
+                              f_min = _rescaled(spec.setup.sweep_start, "Hz"),
+                              f_max = _rescaled(spec.setup.sweep_stop, "Hz"),
+                              isolation_min = isolation_min,
+                              bandwidth_min = _rescaled(bandwidth_min, "Hz"))
+
+
+def project_path(spec, directory):
+    """Path ``<directory>/Designs/<name>/<name>.aedt`` of the spec's project."""
+    return Path(directory) / "Designs" / spec.name / (spec.name+".aedt")
+
+
+def open_project(spec, directory, version="2024.2", non_graphical=False, new_desktop=True, profiler=None):
+    """Create ``<directory>/Designs/<name>/<name>.aedt`` and return its ``Hfss`` application.
+
+    The opening is timed as the ``desktop`` stage of ``profiler``, see
+    ``circulateur.profiling``, whose AEDT calls are counted from then on.
+    """
+    import ansys.aedt.core
+
+    project = project_path(spec, directory)
+    project.parent.mkdir(parents=True, exist_ok=True)
+
+    profiler = profiler if profiler is not None else Profiler()
+    profiler.context["design"] = spec.name
+    count_aedt_calls()
+    with profiler.stage("desktop"):
+        profiler.app = ansys.aedt.core.Hfss(project = str(project),
+                                            version = version,
+                                            design = spec.design,
+                                            non_graphical = non_graphical,
+                                            new_desktop = new_desktop,
+                                            solution_type = "Modal")
+    return profiler.app
+
+
+def _port_width(values):
+    return str(port_size(values["largeur_50_Ohm"]/unit_scale("um"), values["hauteur_substrat"]/unit_scale("um"))[0])+"um"
+
+
+def _port_height(values):
+    return str(port_size(values["largeur_50_Ohm"]/unit_scale("um"), values["hauteur_substrat"]/unit_scale("um"))[1])+"um"
+
+
+def variable_graph(spec):
+    """Variable graph of the spec, evaluated locally without AEDT.
+
+    Returns
+    -------
+    circulateur.variables.VariableGraph
+    """
+    topology = TOPOLOGIES[spec.topology]
+    variables = {}
+    datasets = {}
+
+    # Propriétés des matériaux
+    if spec.dielectric is not None:
+        variables["$dielectrique_epsilon"] = spec.dielectric.epsilon
+        variables["$dielectrique_tand"] = spec.dielectric.tand
+    variables["$ferrite_epsilon"] = spec.ferrite.epsilon
+    variables["$ferrite_tand"] = spec.ferrite.tand
+    variables["$ferrite_Mr"] = spec.ferrite.Mr+"Gauss"
+    variables["$ferrite_delta_H"] = spec.ferrite.delta_H
+    variables["$ferrite_freq_delta_H"] = spec.ferrite.freq_delta_H
+
+    # Dimensions et variables dérivées de la topologie
+    variables.update(spec.dimensions)
+    variables.update(topology.variables)
+
+    # Dimensions des ports
+    variables.update(topology.computed_variables or {})
+    variables["hauteur_port"] = Computed(inputs = ("largeur_50_Ohm", "hauteur_substrat"), function = _port_height)
+    variables["largeur_port"] = Computed(inputs = ("largeur_50_Ohm", "hauteur_substrat"), function = _port_width)
+    variables["epaisseur_pec"] = "10um"
+
+    # Propriétés du ferrite
+    variables["Hk"] = spec.ferrite.Hk
+    variables["Mr"] = spec.ferrite.Mr
+    if topology.demagnetisation == "aharoni":
+        variables.update(AHARONI_EXPRESSIONS)
+    else:
+        datasets["Nzm_Chen"] = load_dataset(spec.nzm_chen_path or NZM_CHEN_PATH)
+        variables["gamma_Chen"] = "hauteur_ferrite/(2*rayon_ferrite)"
+        variables["Nz"] = "pwl(Nzm_Chen,gamma_Chen)"
+    # Champ interne
+    variables["Hint"] = "Hk-Nz*Mr"
+    variables["Hint_apm"] = "1000*Hint/(4*pi)"
+
+    # Perméabilité effective du taper autour du ferrite
+    if topology.taper:
+        frequency = _rescaled(spec.setup.frequency, "Hz")
+
+        def taper_mu_effective(values):
+            polder_mu_eff = Polder_Mu_eff(frequency,
+                                          values["Hk"],
+                                          values["Nz"],
+                                          values["Mr"],
+                                          values["$ferrite_delta_H"]/unit_scale("Oe"),
+                                          values["$ferrite_freq_delta_H"])
+            return float(np.real(polder_mu_eff))
+
+        variables["$ferrite_mu_effective"] = Computed(inputs = ("Hk", "Nz", "Mr", "$ferrite_delta_H", "$ferrite_freq_delta_H"),
+                                                      function = taper_mu_effective)
+
+    return VariableGraph(variables, datasets)
+
+
+def define_variables(app, spec):
+    """Push the project and design variables of the spec in one batch.
+
+    Returns
+    -------
+    circulateur.variables.VariableGraph
+        The pushed variables, for incremental updates with
+        ``VariableGraph.update(app, name=expression)``.
+    """
+    graph = variable_graph(spec)
+    if "Nzm_Chen" in graph.datasets:
+        nzm_chen_path = Path(spec.nzm_chen_path or NZM_CHEN_PATH)
+        app["Nzm_Chen"] = app.import_dataset1d(input_file = str(nzm_chen_path), is_project_dataset = False)
+    graph.push(app)
+    return graph
+
+
+def add_materials(app, spec):
+    """Create the dielectric, taper and ferrite materials used by the topology."""
+    topology = TOPOLOGIES[spec.topology]
+
+    if spec.dielectric is not None:
+        dielectrique = app.materials.add_material("mon_dielectrique")
+        dielectrique.permittivity.value = "$dielectrique_epsilon"
+        dielectrique.dielectric_loss_tangent.value = "$dielectrique_tand"
+
+    if topology.taper:
+        taper = app.materials.add_material("mon_ferrite_taper")
+        taper.permittivity.value = "$ferrite_epsilon"
+        taper.dielectric_loss_tangent.value = "$ferrite_tand"
+        taper.permeability = "$ferrite_mu_effective"
+
+    ferrite = app.materials.add_material("mon_ferrite")
+    ferrite.permittivity = "$ferrite_epsilon"
+    ferrite.dielectric_loss_tangent = "$ferrite_tand"
+    #ferrite.permeability.type = "nonlinear"
+    #ferrite.magnetic_saturation = "$ferrite_Mr"
+
+
+def create_primitive(modeler, primitive):
+    """Emit the modeler calls of one primitive and return the created object."""
+    if isinstance(primitive, Box):
+        obj = modeler.create_box(origin = primitive.origin,
+                                 sizes = primitive.sizes,
+                                 name = primitive.name,
+                                 material = primitive.material)
+    elif isinstance(primitive, Cylinder):
+        obj = modeler.create_cylinder(orientation = 'Z',
+                                      origin = primitive.origin,
+                                      radius = primitive.radius,
+                                      height = primitive.height,
+                                      num_sides = primitive.num_sides,
+                                      name = primitive.name,
+                                      material = primitive.material)
+    elif isinstance(primitive, BentLine):
+        obj = modeler.create_equationbased_surface(x_uv = primitive.x_uv,
+                                                   y_uv = primitive.y_uv,
+                                                   z_uv = primitive.z_uv,
+                                                   u_start = primitive.u_start,
+                                                   u_end = primitive.u_end,
+                                                   v_start = primitive.v_start,
+                                                   v_end = primitive.v_end,
+                                                   name = primitive.name)
+        modeler.thicken_sheet(assignment = primitive.name,
+                              thickness = primitive.thickness)
+        obj.material_name = primitive.material
+        return obj
+    else:
+        raise TypeError("Unknown primitive type '{}'".format(type(primitive).__name__))
+
+    if primitive.rotate:
+        obj.rotate(axis = 'Z',
+                   angle = primitive.rotate)
+    if primitive.color is not None:
+        obj.color = primitive.color
+    if primitive.material_appearance:
+        obj.material_appearance = True
+    return obj
+
+
+def build_geometry(app, spec):
+    """Create the substrate and the united top metallisation."""
+    topology = TOPOLOGIES[spec.topology]
+    objects = {}
+
+    # Substrat et cavité du ferrite
+    for primitive in topology.substrate:
+        objects[primitive.name] = create_primitive(app.modeler, primitive)
+    blank, tool = topology.cavity
+    app.modeler.subtract(blank_list = blank,
+                         tool_list = tool,
+                         keep_originals = True)
+
+    # Métallisation supérieure
+    for primitive in topology.metallisation:
+        objects[primitive.name] = create_primitive(app.modeler, primitive)
+    app.modeler.unite([primitive.name for primitive in topology.metallisation])
+    return objects
+
+
+def add_ports(app, spec):
+    """Create the PEC boxes and wave ports."""
+    topology = TOPOLOGIES[spec.topology]
+    boxes = {}
+    for port in topology.ports:
+        box = create_primitive(app.modeler, port.box)
+        app.wave_port(getattr(box, port.face),
+                      name = port.name)
+        if port.rotate:
+            box.rotate(axis = 'Z',
+                       angle = port.rotate)
+        boxes[port.name] = box
+    return boxes
+
+
+def configure_setup(app, spec):
+    """Open region, adaptive setup and interpolating frequency sweep."""
+    # Création de la boite d'air et des conditions aux limites
+    app.set_auto_open(enable = True)
+
+    setup = app.setups[0]
+    # Sweep setup
+    var_sweep_start = Variable(spec.setup.sweep_start)
+    var_sweep_stop = Variable(spec.setup.sweep_stop)
+    var_sweep_step = Variable(spec.setup.sweep_step)
+
+    var_sweep_stop.rescale_to(var_sweep_start.units)
+    var_sweep_step.rescale_to(var_sweep_start.units)
+
+    setup.create_linear_step_sweep(name = "Sweep",
+                                   unit = var_sweep_start.units,
+                                   start_frequency = var_sweep_start.numeric_value,
+                                   stop_frequency = var_sweep_stop.numeric_value,
+                                   step_size = var_sweep_step.numeric_value,
+                                   sweep_type = "Interpolating")
+    # Setup setup
+    setup.properties["Name"] = "Setup"
+    setup.properties["Solution Freq"] = spec.setup.frequency
+    configure_adaptive(setup, spec.setup)
+    return setup
+
+
+def configure_adaptive(setup, setup_spec):
+    """Convergence criterion, passes, refinement and initial mesh of the adaptive setup."""
+    setup.properties["Delta S"] = setup_spec.max_delta_S
+    setup.properties["Passes"] = setup_spec.max_passes
+    setup.properties["Percent Refinement"] = setup_spec.percent_refinement
+    if setup_spec.lambda_target is not None:
+        # Maillage initial semé plus fin que la cible lambda par défaut d'AEDT
+        setup.update({"SetLambdaTarget": True,
+                      "Target": setup_spec.lambda_target})
+
+
+def build(app, spec, reports=None, profiler=None):
+    """Build the whole circulator described by ``spec`` in ``app``.
+
+    The S-parameter reports of ``circulateur.reports.REPORTS`` are only
+    created when ``reports`` is ``True``, by default in graphical sessions.
+    Every phase is timed as a stage of ``profiler``, see
+    ``circulateur.profiling``.
+
+    Returns
+    -------
+    circulateur.variables.VariableGraph
+        The pushed variables, see ``define_variables``.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+    profiler.context["design"] = spec.name
+    profiler.app = app
+    with profiler.stage("variables"):
+        graph = define_variables(app, spec)
+        profiler.context["parameters"] = variables_hash(dict(graph.items()))
+    with profiler.stage("materials"):
+        add_materials(app, spec)
+    with profiler.stage("geometry"):
+        build_geometry(app, spec)
+    with profiler.stage("ports"):
+        add_ports(app, spec)
+    with profiler.stage("setup"):
+        configure_setup(app, spec)
+    if reports is None:
+        reports = not app.desktop_class.non_graphical
+    if reports:
+        with profiler.stage("reports"):
+            create_reports(app)
+    if spec.parametric:
+        with profiler.stage("parametric"):
+            add_parametric_sweep(app, graph, spec.parametric)
+    return graph
@@ -0,0 +1,170 @@
+"""
+Command line options of the circulator scripts
+
+The scripts keep their parameters at module level and can still be run from
+Spyder unchanged. From a terminal or a compute node the HFSS session can be
+driven without editing them::
+
+    python Circulateur_Y_Ferrite_substrate.py --non-graphical --no-reports --solve --release
+
+``--solve`` solves ``Setup`` (and the parametric setup if any) and exports
+the S-parameters of ``Sweep`` next to the project, as ``<name>.s3p`` and in
+the ``Resultats`` result store, each parametric variation as
+``<name>_variation_<n>.s3p``. ``--release`` saves the project and releases
+the Desktop when the script ends, even on an error, so that no AEDT process
+keeps holding memory and licences. ``--profile-log`` and ``--cprofile`` time
+every stage of the build and the solve, see ``circulateur.profiling``.
+``--monitor-log``, ``--stall-passes`` and ``--max-solve-time`` follow the
+adaptive passes of the solve and stop it early, see ``circulateur.monitor``.
+``--convergence-history`` records the convergence of every solve and
+``--adaptive`` tunes the adaptive settings of the design from the solves of
+similar geometries, see ``circulateur.adaptive``.
+"""
+
+import argparse
+import atexit
+import re
+import time
+
+import numpy as np
+
+from circulateur.adaptive import ConvergenceHistory
+from circulateur.builder import project_path
+from circulateur.monitor import SolveMonitor, read_convergence
+from circulateur.parametric import PARAMETRIC_SETUP, solve_parametric, variations
+from circulateur.profiling import Profiler
+from circulateur.results import ResultStore, solution_s_parameters
+from circulateur.touchstone import write_touchstone
+
+# Options de configuration d'un noyau IPython, --Classe.option=valeur
+_KERNEL_OPTION = re.compile(r"--\w+(\.\w+)+(=.*)?")
+
+
+def parse_arguments(argv=None, non_graphical=False, reports=None, solve=False, release=False, cores=4):
+    """Options of the script, the keyword arguments being its own defaults.
+
+    The arguments of an IPython or Spyder kernel (``-f <connection file>``,
+    ``--Class.option=value``) are ignored, any other unknown argument is an
+    error. ``reports`` stays ``None``, reports in graphical sessions only, unless
+    ``--no-reports`` is given.
+
+    Returns
+    -------
+    argparse.Namespace
+        ``non_graphical``, ``reports``, ``solve``, ``release``, ``cores``,
+        the ``profiler`` of the stages, the ``monitor`` options of the
+        solve (``None`` without monitoring), the ``convergence_history``
+        file and ``adaptive``.
+    """
+    parser = argparse.ArgumentParser(description="Build, and optionally solve, the circulator of the script.")
+    parser.add_argument("--non-graphical", action="store_true", default=non_graphical, help="run AEDT without GUI")
+    parser.add_argument("--no-reports", action="store_false", dest="reports", default=reports, help="do not create the S-parameter reports")
+    parser.add_argument("--solve", action="store_true", default=solve, help="solve the setup and export the S-parameters")
+    parser.add_argument("--release", action="store_true", default=release, help="save the project and release the Desktop at exit")
+    parser.add_argument("--cores", type=int, default=cores, help="cores used by the solve")
+    parser.add_argument("--profile-log", default=None, help="append the timing of every stage to this JSON lines file")
+    parser.add_argument("--cprofile", default=None, help="directory receiving a cProfile file per stage")
+    parser.add_argument("--monitor-log", default=None, help="append the convergence of every adaptive pass to this JSON lines file")
+    parser.add_argument("--stall-passes", type=int, default=None, help="stop the solve when delta S stalls over this many passes")
+    parser.add_argument("--max-solve-time", type=float, default=None, help="stop the solve after this many seconds")
+    parser.add_argument("--poll-interval", type=float, default=10.0, help="seconds between two reads of the convergence of a monitored solve")
+    parser.add_argument("--convergence-history", default=None, help="append the convergence of every solve to this JSON lines file")
+    parser.add_argument("--adaptive", action="store_true", help="tune the adaptive settings from the convergence history")
+    parser.add_argument("-f", dest="kernel_file", default=None, help=argparse.SUPPRESS)
+    options, unknown = parser.parse_known_args(argv)
+    unknown = [argument for argument in unknown if not _KERNEL_OPTION.fullmatch(argument)]
+    if unknown:
+        parser.error("unrecognized arguments: {}".format(" ".join(unknown)))
+    if options.adaptive and options.convergence_history is None:
+        parser.error("--adaptive needs --convergence-history")
+    options.profiler = Profiler(options.profile_log, options.cprofile)
+    options.monitor = None
+    if options.monitor_log is not None or options.stall_passes is not None or options.max_solve_time is not None:
+        options.monitor = {"log": options.monitor_log, "window": options.stall_passes, "max_time": options.max_solve_time,
+                           "interval": options.poll_interval}
+    return options
+
+
+def release_at_exit(app):
+    """Save the project and release the Desktop when the interpreter exits."""
+    def release():
+        try:
+            app.save_project()
+        finally:
+            app.release_desktop(close_projects=True, close_desktop=True)
+    atexit.register(release)
+    return release
+
+
+def solve_and_export(app, spec, graph, directory, cores=4, setup="Setup", sweep="Sweep", profiler=None, monitor=None, history=None):
+    """Solve the circulator and write its S-parameters to disk.
+
+    Parameters
+    ----------
+    app : ansys.aedt.core.Hfss
+    spec : circulateur.spec.CirculatorSpec
+    graph : circulateur.variables.VariableGraph
+        Variables of the project, the key of the result store.
+    directory : str or pathlib.Path
+        Directory containing ``Designs/<name>/<name>.aedt``.
+    cores : int, optional
+        Cores used by the solve. The default is ``4``.
+    profiler : circulateur.profiling.Profiler, optional
+        Timer of the ``solve`` and ``export`` stages.
+    monitor : dict, optional
+        Keyword arguments of ``circulateur.monitor.SolveMonitor`` to follow
+        the adaptive passes of ``setup``. The default is ``None``, which
+        solves without monitoring.
+    history : str or pathlib.Path, optional
+        ``circulateur.adaptive.ConvergenceHistory`` file receiving the
+        convergence of the solve, also when it is stopped.
+
+    Returns
+    -------
+    list of pathlib.Path
+        Touchstone files of the nominal design, then of every parametric
+        variation of ``spec.parametric``.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+    profiler.app = app
+    with profiler.stage("solve"):
+        if monitor is not None:
+            result = SolveMonitor(app, setup, **monitor).run(cores=cores)
+            passes = [(record.tetrahedra, record.delta_s) for record in result.passes]
+            memory = [record.memory for record in result.passes if np.isfinite(record.memory)]
+            if history is not None:
+                ConvergenceHistory(history).append(spec, passes, result.completed, max(memory, default=None), result.elapsed, graph)
+            if not result.completed:
+                raise RuntimeError("Solve of setup '{}' stopped: {}".format(setup, result.reason))
+        else:
+            start = time.monotonic()
+            if not app.analyze_setup(setup, cores=cores):
+                raise RuntimeError("Solve of setup '{}' failed".format(setup))
+            if history is not None:
+                passes = [(tetrahedra, delta_s) for _, tetrahedra, delta_s in read_convergence(app, setup)]
+                ConvergenceHistory(history).append(spec, passes, elapsed=time.monotonic() - start, graph=graph)
+        if spec.parametric:
+            parametric = next((parametric for parametric in app.parametrics.setups if parametric.name == PARAMETRIC_SETUP), None)
+            if parametric is None:
+                raise RuntimeError("Parametric setup '{}' not found in design '{}', rebuild the project".format(PARAMETRIC_SETUP, spec.design))
+            solve_parametric(parametric, cores=cores)
+        app.save_project()
+
+    with profiler.stage("export"):
+        project = project_path(spec, directory)
+        project.parent.mkdir(parents=True, exist_ok=True)
+        store = None
+        touchstones = []
+        # Design nominal, puis chaque variation du balayage paramétrique
+        for index, variation in enumerate([{}] + (variations(spec.parametric) if spec.parametric else [])):
+            frequencies, s_parameters = solution_s_parameters(app, setup, sweep, variation=variation)
+            variables = {**dict(graph.items()), **variation}
+            suffix = "_variation_{}".format(index) if index else ""
+            touchstone = project.with_name(project.stem + suffix + ".s{}p".format(s_parameters.shape[-1]))
+            write_touchstone(touchstone, frequencies, s_parameters,
+                             comments=["{} = {}".format(name, expression) for name, expression in variables.items()])
+            if store is None:
+                store = ResultStore(project.parent / "Resultats", n_ports=s_parameters.shape[-1])
+            store.append(variables, frequencies, s_parameters)
+            touchstones.append(touchstone)
+    return touchstones
@@ -0,0 +1,94 @@
+"""
+Demagnetisation factor of a rectangular ferrite plate
+
+Aharoni's closed-form demagnetisation factor along Z of a rectangular prism
+(A. Aharoni, J. Appl. Phys. 83, 3432 (1998)), written with NumPy so arrays of
+(length, width, height) are evaluated at once. The same formula is kept as
+HFSS design-variable expressions in ``AHARONI_EXPRESSIONS`` so that the Y and
+T scripts push exactly what is checked here.
+
+All terms are homogeneous of degree zero, so any consistent length unit can
+be used.
+"""
+
+import numpy as np
+
+from circulateur.expressions import Evaluator
+
+# Expressions HFSS du modèle de Aharoni, longueur_substrat x largeur_substrat x hauteur_substrat
+AHARONI_EXPRESSIONS = {
+    "N1": "(largeur_substrat^2 - hauteur_substrat^2)/(2*largeur_substrat*hauteur_substrat)*ln((sqrt(longueur_substrat^2 + largeur_substrat^2 + hauteur_substrat^2) - longueur_substrat)/(sqrt(longueur_substrat^2 + largeur_substrat^2 + hauteur_substrat^2) + longueur_substrat))",
+    "N2": "(longueur_substrat^2 - hauteur_substrat^2)/(2*longueur_substrat*hauteur_substrat)*ln((sqrt(longueur_substrat^2 + largeur_substrat^2 + hauteur_substrat^2) - largeur_substrat)/(sqrt(longueur_substrat^2 + largeur_substrat^2 + hauteur_substrat^2) + largeur_substrat))",
+    "N3": "largeur_substrat/(2*hauteur_substrat)*ln((sqrt(longueur_substrat^2 + largeur_substrat^2) + longueur_substrat)/(sqrt(longueur_substrat^2 + largeur_substrat^2) - longueur_substrat))",
+    "N4": "longueur_substrat/(2*hauteur_substrat)*ln((sqrt(longueur_substrat^2 + largeur_substrat^2) + largeur_substrat)/(sqrt(longueur_substrat^2 + largeur_substrat^2) - largeur_substrat))",
+    "N5": "hauteur_substrat/(2*longueur_substrat)*ln((sqrt(largeur_substrat^2 + hauteur_substrat^2) - largeur_substrat)/(sqrt(largeur_substrat^2 + hauteur_substrat^2) + largeur_substrat))",
+    "N6": "hauteur_substrat/(2*largeur_substrat)*ln((sqrt(longueur_substrat^2 + hauteur_substrat^2) - longueur_substrat)/(sqrt(longueur_substrat^2 + hauteur_substrat^2) + longueur_substrat))",
+    "N7": "2*atan((longueur_substrat*largeur_substrat)/(hauteur_substrat*sqrt(longueur_substrat^2+largeur_substrat^2+hauteur_substrat^2)))",
+    "N8": "(longueur_substrat^3+largeur_substrat^3-2*hauteur_substrat^3)/(3*longueur_substrat*largeur_substrat*hauteur_substrat)",
+    "N9": "(longueur_substrat^2+largeur_substrat^2-2*hauteur_substrat^2)/(3*longueur_substrat*largeur_substrat*hauteur_substrat)*sqrt(longueur_substrat^2+largeur_substrat^2+hauteur_substrat^2)",
+    "N10": "hauteur_substrat/(longueur_substrat*largeur_substrat)*(sqrt(longueur_substrat^2+hauteur_substrat^2)+sqrt(largeur_substrat^2+hauteur_substrat^2))",
+    "N11": "((longueur_substrat^2+largeur_substrat^2)^(3/2)+(largeur_substrat^2+hauteur_substrat^2)^(3/2)+(hauteur_substrat^2+longueur_substrat^2)^(3/2))/(3*longueur_substrat*largeur_substrat*hauteur_substrat)",
+    "Nz": "(N1+N2+N3+N4+N5+N6+N7+N8+N9+N10-N11)/pi",
+}
+
+
+def aharoni_nz(length, width, height):
+    """Demagnetisation factor along the height of a rectangular prism.
+
+    Parameters
+    ----------
+    length, width, height : float or array_like
+        Dimensions of the prism, broadcast against each other.
+
+    Returns
+    -------
+    numpy.ndarray
+        Nz for every broadcast geometry, between 0 and 1.
+    """
+    a = np.asarray(length, dtype=float)
+    b = np.asarray(width, dtype=float)
+    c = np.asarray(height, dtype=float)
+
+    # Termes communs, évalués une seule fois
+    a2, b2, c2 = a*a, b*b, c*c
+    abc = a*b*c
+    r_abc = np.sqrt(a2 + b2 + c2)
+    r_ab = np.sqrt(a2 + b2)
+    r_bc = np.sqrt(b2 + c2)
+    r_ac = np.sqrt(a2 + c2)
+
+    N1 = (b2 - c2)/(2*b*c)*np.log((r_abc - a)/(r_abc + a))
+    N2 = (a2 - c2)/(2*a*c)*np.log((r_abc - b)/(r_abc + b))
+    N3 = b/(2*c)*np.log((r_ab + a)/(r_ab - a))
+    N4 = a/(2*c)*np.log((r_ab + b)/(r_ab - b))
+    N5 = c/(2*a)*np.log((r_bc - b)/(r_bc + b))
+    N6 = c/(2*b)*np.log((r_ac - a)/(r_ac + a))
+    N7 = 2*np.arctan(a*b/(c*r_abc))
+    N8 = (a2*a + b2*b - 2*c2*c)/(3*abc)
+    N9 = (a2 + b2 - 2*c2)/(3*abc)*r_abc
+    N10 = c/(a*b)*(r_ac + r_bc)
+    N11 = (r_ab**3 + r_bc**3 + r_ac**3)/(3*abc)
+
+    return (N1 + N2 + N3 + N4 + N5 + N6 + N7 + N8 + N9 + N10 - N11)/np.pi
+
+
+def _evaluate_hfss_expressions(length, width, height):
+    evaluator = Evaluator({"longueur_substrat": "0", "largeur_substrat": "0", "hauteur_substrat": "0", **AHARONI_EXPRESSIONS})
+    return evaluator.evaluate(longueur_substrat = length,
+                              largeur_substrat = width,
+                              hauteur_substrat = height)["Nz"]
+
+
+def check_hfss_expressions(length, width, height, rtol=1e-9):
+    """Check ``aharoni_nz`` against the HFSS expression strings.
+
+    Raises
+    ------
+    AssertionError
+        If both evaluations differ by more than ``rtol`` for any geometry.
+    """
+    expected = _evaluate_hfss_expressions(length, width, height)
+    computed = aharoni_nz(length, width, height)
+    if not np.allclose(computed, expected, rtol=rtol, atol=0):
+        raise AssertionError("aharoni_nz differs from the HFSS expressions (max error {:.3g})".format(np.max(np.abs(computed - expected))))
+    return True
@@ -0,0 +1,293 @@
+"""
+Parallel design-of-experiments runner
+
+Distributes the rows of a parameter table over a pool of worker processes,
+each driving its own non-graphical AEDT session. Every row is solved on a
+private copy of a template project whose geometry is already parametrized
+by design variables: the row values are applied to the variable graph of
+the template's ``CirculatorSpec``, so that the variables computed in Python
+(port sizes, taper permeability, hexagonal substrate length) follow them,
+the changed variables are pushed, the setup is solved and the 3x3
+S-parameters of the frequency sweep are collected into a single ``.npz``
+result file.
+
+The number of workers should not exceed the number of available HFSS
+licences. Example::
+
+    python -m circulateur.doe Circulateur_Y_Ferrite_substrate.py plan.csv --workers 3 --output plan.npz
+
+where the script describes the template, by default its project
+``Designs/<name>/<name>.aedt``, and ``plan.csv`` has one column per design
+variable, e.g. ``rayon_jonction,longueur_adaptation,largeur_adaptation,Hk``,
+and HFSS expressions such as ``950um`` as values. With ``--store DIR`` every
+solved row is also appended, with the full variable table of its design, to
+a ``circulateur.results.ResultStore`` and rows already in the store are not
+solved again, and ``--touchstone DIR`` writes one ``row_<n>.s3p`` file per
+solved row.
+"""
+
+import argparse
+import atexit
+import copy
+import csv
+import json
+import multiprocessing
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from circulateur.benchmark import load_spec
+from circulateur.builder import project_path, variable_graph
+from circulateur.project import SIDECAR_SUFFIX
+from circulateur.results import ResultStore, solution_s_parameters
+from circulateur.touchstone import write_touchstone
+
+N_PORTS = 3
+
+_desktop = None
+
+
+class DoeResults(NamedTuple):
+    """S-parameters of every row of a design of experiments."""
+    parameters: list # Une table {variable: expression} par ligne
+    frequencies: np.ndarray # Fréquences du sweep en Hz
+    s_parameters: np.ndarray # (n_lignes, n_freq, 3, 3), NaN si la ligne a échoué
+    errors: list # Message d'erreur par ligne, "" si la ligne a été résolue
+
+    def save(self, path):
+        """Write the results to a single ``.npz`` file."""
+        names = sorted({name for row in self.parameters for name in row})
+        columns = {"param_" + name: np.array([row.get(name, "") for row in self.parameters], dtype=str) for name in names}
+        np.savez(path,
+                 frequencies=self.frequencies,
+                 s_parameters=self.s_parameters,
+                 errors=np.array(self.errors, dtype=str),
+                 **columns)
+
+
+def read_table(path):
+    """Read a CSV parameter table as a list of ``{variable: expression}`` rows."""
+    with open(path, newline="") as table:
+        return [{name.strip(): value.strip() for name, value in row.items()} for row in csv.DictReader(table)]
+
+
+def design_variables(graph, row):
+    """Full ``{name: expression}`` table of the design with the variables of ``row`` changed.
+
+    The variables computed in Python (``Computed``) are recomputed from the
+    row, ``graph`` itself is left unchanged.
+
+    Raises
+    ------
+    KeyError
+        If the row sets a variable the design does not define.
+    ValueError
+        If the row sets a computed variable or an invalid expression.
+    """
+    graph = copy.deepcopy(graph)
+    graph.update(**row)
+    return dict(graph.items())
+
+
+def check_template(template, graph):
+    """Check that ``template`` was built with the variables of ``graph``.
+
+    The check uses the ``circulateur.project`` sidecar of the template and
+    is skipped when the template has none.
+
+    Raises
+    ------
+    ValueError
+        If the template variables differ from the graph.
+    """
+    template = Path(template)
+    sidecar = template.with_name(template.stem + SIDECAR_SUFFIX)
+    if not sidecar.exists():
+        return
+    with open(sidecar) as stored:
+        variables = json.load(stored).get("variables", {})
+    differing = sorted(name for name in set(variables) | set(graph) if variables.get(name) != (graph[name] if name in graph else None))
+    if differing:
+        raise ValueError("{} was not built from this spec, differing variables: {}".format(template, ", ".join(differing)))
+
+
+def _init_worker(version):
+    # Un Desktop non graphique par processus, réutilisé pour toutes les lignes du processus
+    global _desktop
+    import ansys.aedt.core
+    _desktop = ansys.aedt.core.Desktop(version=version, non_graphical=True, new_desktop=True, close_on_exit=True)
+    atexit.register(_desktop.release_desktop)
+
+
+def solve_row(template, spec, row, index, work_dir, version, design="Circulateur", setup="Setup", sweep="Sweep", cores=None, prepare=None):
+    """Solve one row of the table on a copy of ``template``, built from ``spec``.
+
+    Returns
+    -------
+    tuple
+        ``(index, frequencies, s_parameters)`` with frequencies in Hz and
+        S-parameters of shape ``(n_freq, 3, 3)``.
+    """
+    import ansys.aedt.core
+
+    template = Path(template)
+    project = Path(work_dir) / "row_{:05d}".format(index) / template.name
+    project.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(template, project)
+
+    app = ansys.aedt.core.Hfss(project=str(project),
+                               design=design,
+                               version=version,
+                               non_graphical=True,
+                               new_desktop=False)
+    try:
+        # Ligne et variables calculées en Python qui en dépendent, envoyées en un seul lot
+        variable_graph(spec).update(app, known=app.variable_manager.variable_names, **row)
+        if prepare is not None:
+            prepare(app, row)
+        if not app.analyze_setup(setup, cores=cores):
+            raise RuntimeError("Solve of setup '{}' failed".format(setup))
+
+        frequencies, s_parameters = solution_s_parameters(app, setup, sweep, N_PORTS)
+        return index, frequencies, s_parameters
+    finally:
+        app.close_project(save=False)
+
+
+def run_doe(template, spec, table, workers=2, version="2024.2", design="Circulateur", setup="Setup", sweep="Sweep", cores=None, work_dir=None, prepare=None, store=None):
+    """Solve every row of ``table`` in parallel AEDT sessions.
+
+    Parameters
+    ----------
+    template : str or pathlib.Path
+        Parametrized ``.aedt`` project used as the starting point of each row.
+    spec : circulateur.spec.CirculatorSpec
+        Spec the template was built from, whose variable graph recomputes
+        the variables computed in Python for every row.
+    table : list of dict
+        One ``{variable: expression}`` dictionary per design to solve.
+    workers : int, optional
+        Number of parallel AEDT sessions. The default is ``2``.
+    version : str, optional
+        AEDT version. The default is ``"2024.2"``.
+    design, setup, sweep : str, optional
+        Names of the design, setup and frequency sweep in the template.
+    cores : int, optional
+        Cores per solve. The default is ``None``, which keeps the AEDT settings.
+    work_dir : str or pathlib.Path, optional
+        Directory receiving the per-row project copies. The default is a
+        temporary directory removed once all rows are done.
+    prepare : callable, optional
+        ``prepare(app, row)`` called after the variables are set. It must be
+        a module-level function so that it can be sent to the worker
+        processes.
+    store : circulateur.results.ResultStore, optional
+        Store receiving every solved row with the full variable table of its
+        design. Rows already in the store are read from it instead of being
+        solved.
+
+    Returns
+    -------
+    DoeResults
+    """
+    table = [dict(row) for row in table]
+    graph = variable_graph(spec)
+    check_template(template, graph)
+    cleanup = work_dir is None
+    work_dir = Path(tempfile.mkdtemp(prefix="circulateur_doe_") if cleanup else work_dir)
+
+    results = {}
+    errors = [""]*len(table)
+    variables = [None]*len(table)
+    for index, row in enumerate(table):
+        # Ligne refusée avant tout solve si elle fixe une variable calculée ou inconnue
+        try:
+            variables[index] = design_variables(graph, row)
+        except (KeyError, ValueError, ArithmeticError) as error:
+            errors[index] = "{}: {}".format(type(error).__name__, error)
+            continue
+        if store is not None and variables[index] in store:
+            results[index] = (store.frequencies, np.array(store.get(variables[index])))
+    pending = [index for index in range(len(table)) if variables[index] is not None and index not in results]
+    try:
+        # spawn : chaque processus démarre sa propre session COM/gRPC proprement
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(version,)) as pool:
+            futures = {pool.submit(solve_row, template, spec, table[index], index, work_dir, version, design, setup, sweep, cores, prepare): index
+                       for index in pending}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    _, frequencies, s_parameters = future.result()
+                    results[index] = (frequencies, s_parameters)
+                    if store is not None:
+                        store.append(variables[index], frequencies, s_parameters)
+                except Exception as error:
+                    errors[index] = "{}: {}".format(type(error).__name__, error)
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    frequencies = next(iter(results.values()))[0] if results else np.empty(0)
+    s_parameters = np.full((len(table), len(frequencies), N_PORTS, N_PORTS), np.nan, dtype=complex)
+    for index, (freq, s) in results.items():
+        if len(freq) != len(frequencies) or not np.allclose(freq, frequencies):
+            errors[index] = "Frequency grid differs from the other rows"
+            continue
+        s_parameters[index] = s
+    return DoeResults(parameters=table, frequencies=frequencies, s_parameters=s_parameters, errors=errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve a table of circulator variants in parallel AEDT sessions.")
+    parser.add_argument("script", help="circulator script describing the template")
+    parser.add_argument("table", help="CSV file, one column per design variable")
+    parser.add_argument("--template", default=None, help="parametrized .aedt project, by default the project of the script")
+    parser.add_argument("--workers", type=int, default=2, help="number of parallel AEDT sessions")
+    parser.add_argument("--version", default="2024.2", help="AEDT version")
+    parser.add_argument("--design", default="Circulateur")
+    parser.add_argument("--setup", default="Setup")
+    parser.add_argument("--sweep", default="Sweep")
+    parser.add_argument("--cores", type=int, default=None, help="cores per solve")
+    parser.add_argument("--work-dir", default=None, help="keep the per-row projects in this directory")
+    parser.add_argument("--store", default=None, help="result store directory, rows already stored are not solved again")
+    parser.add_argument("--touchstone", default=None, help="directory receiving one .s3p file per solved row")
+    parser.add_argument("--output", default="doe_results.npz")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.script)
+    template = args.template or project_path(spec, Path(args.script).resolve().parent)
+    results = run_doe(template, spec, read_table(args.table),
+                      workers=args.workers,
+                      version=args.version,
+                      design=args.design,
+                      setup=args.setup,
+                      sweep=args.sweep,
+                      cores=args.cores,
+                      work_dir=args.work_dir,
+                      store=None if args.store is None else ResultStore(args.store, n_ports=N_PORTS))
+    results.save(args.output)
+    if args.touchstone is not None:
+        Path(args.touchstone).mkdir(parents=True, exist_ok=True)
+        for index, (row, error) in enumerate(zip(results.parameters, results.errors)):
+            if not error:
+                write_touchstone(Path(args.touchstone) / "row_{:05d}.s{}p".format(index, N_PORTS),
+                                 results.frequencies,
+                                 results.s_parameters[index],
+                                 comments=["{} = {}".format(name, expression) for name, expression in row.items()])
+    failed = sum(1 for error in results.errors if error)
+    print("{} rows solved, {} failed, results written to {}".format(len(results.errors) - failed, failed, args.output))
+    for index, error in enumerate(results.errors):
+        if error:
+            print("  row {}: {}".format(index, error))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,240 @@
+"""
+In-process evaluator for HFSS design-variable expressions
+
+Translates the HFSS variable language (numbers with units, ``+ - * / ^``,
+``sin``, ``cos``, ``atan``, ``ln``, ``sqrt``, ``pi``, ``pwl(dataset, x)``...)
+into NumPy code, so the values of a variable table are computed without an
+AEDT session. Values are in SI units: meters, hertz, radians, A/m for ``Oe``
+and tesla for ``Gauss``.
+
+The dependency graph of a table is resolved and every expression compiled
+once by ``Evaluator``; ``Evaluator.evaluate`` then accepts arrays for any
+variable and broadcasts them through the whole table::
+
+    evaluator = Evaluator({"a": "1mm", "b": "2*a", "c": "sqrt(a^2 + b^2)"})
+    evaluator.evaluate(a=np.linspace(1e-3, 2e-3, 101))["c"]
+"""
+
+import re
+
+import numpy as np
+
+from circulateur.nzm_chen import pwl
+
+# Unités HFSS et leur facteur vers le SI, comparées sans tenir compte de la casse comme AEDT
+_PREFIXES = {"f": 1e-15, "p": 1e-12, "n": 1e-9, "u": 1e-6, "m": 1e-3, "": 1.0, "k": 1e3, "meg": 1e6, "g": 1e9, "t": 1e12}
+UNIT_SCALES = {**_PREFIXES, # Sans dimension
+               **{prefix+"m": scale for prefix, scale in (("f", 1e-15), ("p", 1e-12), ("n", 1e-9), ("u", 1e-6),
+                                                         ("m", 1e-3), ("c", 1e-2), ("d", 1e-1), ("k", 1e3))},
+               "meter": 1.0, "uin": 2.54e-8, "mil": 2.54e-5, "in": 0.0254, "ft": 0.3048, "yd": 0.9144, "mile": 1609.344,
+               "hz": 1.0, "khz": 1e3, "mhz": 1e6, "ghz": 1e9, "thz": 1e12, "rps": 1.0, "per_sec": 1.0,
+               "fs": 1e-15, "ps": 1e-12, "ns": 1e-9, "us": 1e-6, "ms": 1e-3, "s": 1.0, "min": 60.0, "hour": 3600.0,
+               "deg": np.pi/180, "rad": 1.0, "degmin": np.pi/180/60, "degsec": np.pi/180/3600,
+               **{prefix+"a_per_m": scale for prefix, scale in _PREFIXES.items() if prefix != "t"},
+               **{prefix+"a_per_meter": scale for prefix, scale in _PREFIXES.items() if prefix != "t"},
+               **{prefix+"tesla": scale for prefix, scale in _PREFIXES.items() if prefix != "t"},
+               "oe": 1000/(4*np.pi), "gauss": 1e-4}
+
+FUNCTIONS = {"abs": np.abs, "sin": np.sin, "cos": np.cos, "tan": np.tan,
+             "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan, "atan2": np.arctan2,
+             "sinh": np.sinh, "cosh": np.cosh, "tanh": np.tanh,
+             "exp": np.exp, "ln": np.log, "log10": np.log10, "sqrt": np.sqrt, "pow": np.power,
+             "min": np.minimum, "max": np.maximum, "sgn": np.sign, "if": np.where,
+             "int": np.trunc, "nint": np.rint, "mod": np.mod,
+             "real": np.real, "imag": np.imag, "mag": np.abs, "ang": np.angle, "conj": np.conj,
+             "pwl": pwl}
+# Fonctions du langage HFSS que l'évaluateur local ne sait pas calculer
+UNSUPPORTED_FUNCTIONS = {"even", "odd", "pwl_periodic", "spl"}
+CONSTANTS = {"pi": np.pi, "c0": 299792458.0, "e0": 8.8541878128e-12, "u0": 4e-7*np.pi,
+             "Z0": 376.730313668, "boltz": 1.380649e-23, "qelec": 1.602176634e-19}
+
+_TOKEN = re.compile(r"\s*(?:(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)(?P<unit>[A-Za-z_]\w*)?"
+                    r"|(?P<name>\$?[A-Za-z_]\w*)"
+                    r"|(?P<operator>\^|[-+*/(),]|[<>=!]=|[<>]))")
+
+
+def _tokens(expression):
+    expression = str(expression)
+    position = 0
+    while position < len(expression):
+        token = _TOKEN.match(expression, position)
+        if token is None or token.end() == position:
+            if expression[position:].strip():
+                raise ValueError("Unexpected '{}' in '{}'".format(expression[position:], expression))
+            return
+        position = token.end()
+        if token.group("unit") is not None and token.group("unit").lower() not in UNIT_SCALES:
+            raise ValueError("Unknown unit '{}' in '{}'".format(token.group("unit"), expression))
+        yield token
+
+
+def unit_scale(unit):
+    """Factor converting a value in ``unit`` to SI."""
+    try:
+        return UNIT_SCALES[unit.lower()]
+    except KeyError:
+        raise ValueError("Unknown unit '{}'".format(unit)) from None
+
+
+def references(expression):
+    """Names of the variables and datasets used by an HFSS expression.
+
+    Raises
+    ------
+    ValueError
+        If the expression contains an unknown unit or character.
+    """
+    names = []
+    for token in _tokens(expression):
+        name = token.group("name")
+        if (name is not None and name not in FUNCTIONS and name not in UNSUPPORTED_FUNCTIONS
+                and name not in CONSTANTS and name not in names):
+            names.append(name)
+    return names
+
+
+def dependency_order(expressions, known=(), dependencies=None):
+    """Names of ``expressions`` sorted so that every variable follows its references.
+
+    The order of ``expressions`` is kept wherever the dependencies allow it.
+
+    Parameters
+    ----------
+    expressions : dict
+        ``{name: expression}`` table.
+    known : iterable of str, optional
+        Names defined outside the table (existing variables, datasets) that
+        expressions may reference.
+    dependencies : dict, optional
+        ``{name: [names]}`` extra dependencies that do not appear in the
+        expressions, e.g. inputs of variables computed in Python.
+
+    Raises
+    ------
+    ValueError
+        On an unknown unit, a reference to an undefined name or a circular
+        definition.
+    """
+    known = set(known)
+    extra = dependencies or {}
+    dependencies = {}
+    for name, expression in expressions.items():
+        refs = references(expression)
+        refs += [ref for ref in extra.get(name, ()) if ref not in refs]
+        undefined = [ref for ref in refs if ref not in expressions and ref not in known]
+        if undefined:
+            raise ValueError("'{}' = '{}' references undefined {}".format(name, expression, ", ".join(undefined)))
+        if name in refs:
+            raise ValueError("'{}' = '{}' references itself".format(name, expression))
+        dependencies[name] = [ref for ref in refs if ref in expressions]
+
+    order = []
+    state = {} # 1 : en cours de visite, 2 : placé
+    for root in expressions:
+        if state.get(root) == 2:
+            continue
+        state[root] = 1
+        stack = [(root, iter(dependencies[root]))]
+        while stack:
+            name, pending = stack[-1]
+            for dependency in pending:
+                if state.get(dependency) == 1:
+                    cycle = [entry[0] for entry in stack]
+                    cycle = cycle[cycle.index(dependency):] + [dependency]
+                    raise ValueError("Circular variable definition: {}".format(" -> ".join(cycle)))
+                if state.get(dependency) != 2:
+                    state[dependency] = 1
+                    stack.append((dependency, iter(dependencies[dependency])))
+                    break
+            else:
+                stack.pop()
+                state[name] = 2
+                order.append(name)
+    return order
+
+
+def _translate(expression, datasets):
+    # Source Python équivalente : variables dans _v, fonctions dans _f, datasets dans _d
+    source = []
+    for token in _tokens(expression):
+        if token.group("number") is not None:
+            value = float(token.group("number"))
+            if token.group("unit") is not None:
+                value *= unit_scale(token.group("unit"))
+            source.append(repr(value))
+        elif token.group("name") is not None:
+            name = token.group("name")
+            if name in FUNCTIONS:
+                source.append("_f[{!r}]".format(name))
+            elif name in UNSUPPORTED_FUNCTIONS:
+                raise ValueError("Function '{}' of '{}' is not supported by the local evaluator".format(name, expression))
+            elif name in CONSTANTS:
+                source.append(repr(CONSTANTS[name]))
+            elif name in datasets:
+                source.append("_d[{!r}]".format(name))
+            else:
+                source.append("_v[{!r}]".format(name))
+        else:
+            source.append("**" if token.group("operator") == "^" else token.group("operator"))
+    return " ".join(source)
+
+
+def _compile(name, expression, datasets):
+    try:
+        return compile(_translate(expression, datasets), "<{}>".format(name), "eval")
+    except SyntaxError:
+        raise ValueError("Invalid expression '{}' = '{}'".format(name, expression)) from None
+
+
+class Evaluator:
+    """Variable table compiled for repeated NumPy evaluation.
+
+    Parameters
+    ----------
+    variables : dict or circulateur.variables.VariableTable
+        ``{name: expression}`` table in HFSS syntax.
+    datasets : dict, optional
+        ``{name: circulateur.nzm_chen.Dataset1D}`` usable in ``pwl``.
+    """
+
+    def __init__(self, variables, datasets=None):
+        self.expressions = dict(variables.items())
+        self.datasets = dict(datasets or {})
+        self.order = dependency_order(self.expressions, known=self.datasets)
+        self._code = {name: _compile(name, self.expressions[name], self.datasets) for name in self.order}
+
+    def evaluate(self, **overrides):
+        """Values of every variable, in SI units.
+
+        Keyword arguments replace the value of a variable by a number or an
+        array in SI units, or by an HFSS expression string. Arrays are
+        broadcast through every variable that depends on them.
+
+        Returns
+        -------
+        dict
+            ``{name: float or numpy.ndarray}`` in dependency order.
+        """
+        unknown = [name for name in overrides if name not in self.expressions]
+        if unknown:
+            raise KeyError("Unknown variables: {}".format(", ".join(unknown)))
+        values = {}
+        namespace = {"_v": values, "_f": FUNCTIONS, "_d": self.datasets}
+        for name in self.order:
+            if name not in overrides:
+                values[name] = eval(self._code[name], {"__builtins__": {}}, namespace)
+            elif isinstance(overrides[name], str):
+                values[name] = eval(_compile(name, overrides[name], self.datasets), {"__builtins__": {}}, namespace)
+            else:
+                values[name] = np.asarray(overrides[name], dtype=float)
+        return values
+
+
+def evaluate(expression, values=None, datasets=None, name="expression"):
+    """Value in SI units of a single HFSS expression.
+
+    ``values`` gives the SI values of the variables it references and
+    ``name`` names the expression in the errors.
+    """
+    code = _compile(name, expression, datasets or {})
+    return eval(code, {"__builtins__": {}}, {"_v": dict(values or {}), "_f": FUNCTIONS, "_d": dict(datasets or {})})
@@ -0,0 +1,237 @@
+"""
+Offline extractor of variables, materials and setups from archived projects
+
+Scans a directory tree such as ``Designs/`` for ``.aedt`` files, parses them
+in parallel with ``circulateur.aedt_file`` and gathers one row per design in
+a columnar table:
+
+- ``project``, ``design``, ``sha256``,
+- ``var_<name>``: expression of every project and design variable, and
+  ``value_<name>`` its SI value when the expression is a plain value,
+- ``material_<material>_<property>``: scalar properties of the materials,
+- ``setup_<setup>_<property>``: scalar properties of the solve setups.
+
+Parsed projects are cached by the SHA-256 of their content and the
+``PARSER_VERSION``, so only new or modified files, and every file after a
+change of the parser, are parsed again. Projects that fail to parse are not
+cached. Example::
+
+    python -m circulateur.extract Designs --output projects.npz --workers 4
+
+then ``load_table("projects.npz")`` and e.g.
+``(table["value_Hk"] == 18000) & np.isclose(table["value_longueur_adaptation"], 600e-6)``,
+SI values converted from other units not being exact.
+A ``.parquet`` output is written with pyarrow when it is installed.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from circulateur.aedt_file import AedtFile
+from circulateur.expressions import evaluate
+
+CACHE_DIR = Path.home() / ".cache" / "circulateur" / "extract"
+# Version des enregistrements, à incrémenter à chaque changement de l'analyse des fichiers
+PARSER_VERSION = 2
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of the file content, read by chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _scalars(block):
+    return {name: value for name, value in block.properties().items()
+            if isinstance(value, (str, int, float, bool)) and value is not None}
+
+
+def extract_project(path):
+    """One record per design of an ``.aedt`` project.
+
+    Returns
+    -------
+    list of dict
+        ``{"design", "variables", "materials", "setups"}`` with
+        ``{name: expression}``, ``{material: {property: value}}`` and
+        ``{setup: {property: value}}``.
+    """
+    with AedtFile(path) as project:
+        variables = project.variables()
+        project_variables = {name: value for name, value in variables.items() if not isinstance(value, dict)}
+
+        materials = {}
+        root = project["AnsoftProject"]
+        if "Definitions" in root and "Materials" in root.child("Definitions"):
+            for material in root["Definitions/Materials"].children():
+                materials[material.name] = _scalars(material)
+
+        records = []
+        for design_name, design in project.designs().items():
+            setups = {}
+            if "AnalysisSetup" in design and "SolveSetups" in design.child("AnalysisSetup"):
+                for setup in design["AnalysisSetup/SolveSetups"].children():
+                    setups[setup.name] = _scalars(setup)
+            records.append({"design": design_name,
+                            "variables": {**project_variables, **variables[design_name]},
+                            "materials": materials,
+                            "setups": setups})
+        if not records:
+            records.append({"design": "", "variables": project_variables, "materials": materials, "setups": {}})
+    return records
+
+
+def _extract_cached(path, cache_dir):
+    # Tâche d'un processus : extraction ou lecture du cache indexé par le contenu du fichier et la version de l'analyse
+    digest = file_hash(path)
+    cache = Path(cache_dir) / "{}_v{}.json".format(digest, PARSER_VERSION) if cache_dir is not None else None
+    records = None
+    if cache is not None and cache.exists():
+        try:
+            with open(cache) as handle:
+                records = json.load(handle)
+        except (OSError, ValueError):
+            records = None
+    if records is None:
+        try:
+            records = extract_project(path)
+        except (OSError, ValueError, KeyError) as error:
+            # Erreur non mise en cache : le fichier est analysé à nouveau au prochain passage
+            records = [{"design": "", "variables": {}, "materials": {}, "setups": {},
+                        "error": "{}: {}".format(type(error).__name__, error)}]
+            cache = None
+        if cache is not None:
+            cache.parent.mkdir(parents=True, exist_ok=True)
+            temporary = cache.with_suffix(".{}.tmp".format(os.getpid()))
+            with open(temporary, "w") as handle:
+                json.dump(records, handle)
+            temporary.replace(cache)
+    return [{"project": str(path), "sha256": digest, **record} for record in records]
+
+
+def scan(root, workers=None, cache_dir=CACHE_DIR):
+    """Extract every ``.aedt`` project under ``root`` in parallel.
+
+    Parameters
+    ----------
+    root : str or pathlib.Path
+        Directory scanned recursively, or a single ``.aedt`` file.
+    workers : int, optional
+        Number of processes. The default is ``None``, one per CPU.
+    cache_dir : str or pathlib.Path, optional
+        Cache of parsed projects, ``None`` to disable it.
+
+    Returns
+    -------
+    list of dict
+        Records sorted by project path.
+    """
+    root = Path(root)
+    paths = [root] if root.is_file() else sorted(path for path in root.rglob("*.aedt") if path.is_file())
+    if not paths:
+        return []
+    if workers == 1 or len(paths) == 1:
+        results = [_extract_cached(path, cache_dir) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_extract_cached, paths, [cache_dir]*len(paths), chunksize=8))
+    return [record for records in results for record in records]
+
+
+def _si_value(expression):
+    # Valeur numérique d'une expression sans référence à d'autres variables
+    try:
+        value = evaluate(expression)
+    except (ValueError, KeyError, TypeError, SyntaxError, ArithmeticError):
+        return np.nan
+    value = np.asarray(value)
+    return float(value) if value.ndim == 0 and np.isrealobj(value) else np.nan
+
+
+def to_columns(records):
+    """Columnar table ``{column: numpy.ndarray}`` of the extracted records.
+
+    Columns of numbers become float arrays with NaN for missing values,
+    the others string arrays with ``""``.
+    """
+    rows = []
+    for record in records:
+        row = {"project": record["project"], "design": record["design"], "sha256": record["sha256"],
+               "error": record.get("error", "")}
+        for name, expression in record["variables"].items():
+            row["var_" + name] = expression
+            row["value_" + name] = _si_value(expression)
+        for material, properties in record["materials"].items():
+            for name, value in properties.items():
+                row["material_{}_{}".format(material, name)] = value
+        for setup, properties in record["setups"].items():
+            for name, value in properties.items():
+                row["setup_{}_{}".format(setup, name)] = value
+        rows.append(row)
+
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    columns = {}
+    for name in names:
+        values = [row.get(name) for row in rows]
+        present = [value for value in values if value is not None]
+        if present and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in present):
+            columns[name] = np.array([np.nan if value is None else value for value in values], dtype=float)
+        else:
+            columns[name] = np.array(["" if value is None else str(value) for value in values], dtype=str)
+    return columns
+
+
+def save_table(columns, path):
+    """Write the table as ``.npz``, or ``.parquet`` with pyarrow."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Writing .parquet files needs pyarrow, use a .npz output instead") from None
+        pyarrow.parquet.write_table(pyarrow.table(columns), path)
+    else:
+        np.savez(path, **columns)
+
+
+def load_table(path):
+    """Read a table written by ``save_table`` as ``{column: numpy.ndarray}``."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(path)
+        return {name: column.to_numpy() for name, column in zip(table.column_names, table.columns)}
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract variables, materials and setups of archived .aedt projects.")
+    parser.add_argument("root", help="directory scanned recursively, or a single .aedt file")
+    parser.add_argument("--output", default="projects.npz", help=".npz or .parquet table")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes")
+    parser.add_argument("--cache", default=str(CACHE_DIR), help="cache directory of parsed projects")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args(argv)
+
+    records = scan(args.root, workers=args.workers, cache_dir=None if args.no_cache else args.cache)
+    save_table(to_columns(records), args.output)
+    failed = [record for record in records if record.get("error")]
+    print("{} designs from {} projects written to {}".format(len(records), len({record["project"] for record in records}), args.output))
+    for record in failed:
+        print("  {}: {}".format(record["project"], record["error"]))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
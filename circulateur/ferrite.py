@@ -0,0 +1,72 @@
+"""
+Ferrite physics for the circulator scripts
+
+Polder permeability tensor of a saturated ferrite biased along Z. Every
+function broadcasts its inputs with NumPy, so a whole frequency grid and a
+whole grid of bias/material parameters are evaluated in a single call.
+
+Units follow the scripts: frequencies in Hz, fields (Hk, dH) in Oe and the
+magnetisation 4*pi*Ms (Mr) in Gauss.
+"""
+
+import numpy as np
+
+GYRO_RATIO = 2.8e6 # Hz/Oe aka Gamma/(2*pi)
+
+
+def internal_field(Hk, Nz, Mr):
+    """Internal bias field ``Hint = Hk - Nz*Mr`` in Oe."""
+    return np.asarray(Hk, dtype=float) - np.asarray(Nz, dtype=float)*np.asarray(Mr, dtype=float)
+
+
+def polder_tensor(freq, Hk, Nz, Mr, dH, f_dH):
+    """Complex Polder tensor components of the ferrite.
+
+    Parameters
+    ----------
+    freq : float or array_like
+        Frequencies in Hz.
+    Hk, Nz, Mr, dH, f_dH : float or array_like
+        Applied field (Oe), demagnetisation factor, magnetisation (Gauss),
+        linewidth (Oe) and linewidth measurement frequency (Hz).
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        ``(mu, kappa, mu_eff)`` broadcast to the common shape of the inputs.
+    """
+    freq = np.asarray(freq, dtype=float)
+    Mr = np.asarray(Mr, dtype=float)
+
+    Hint = internal_field(Hk, Nz, Mr)
+
+    damping = (GYRO_RATIO*np.asarray(dH, dtype=float))/(2*np.asarray(f_dH, dtype=float))
+
+    w_0 = GYRO_RATIO*Hint + 1j*damping*freq
+    w_m = GYRO_RATIO*Mr
+
+    # Dénominateur commun à mu et kappa, calculé une seule fois
+    denom = w_0**2 - freq**2
+
+    polder_mu = 1 + (w_0*w_m)/denom
+    polder_kappa = (freq*w_m)/denom
+    polder_mu_eff = (polder_mu**2 - polder_kappa**2)/polder_mu
+
+    return polder_mu, polder_kappa, polder_mu_eff
+
+
+def polder_grid(freq, Hk, Nz, Mr, dH, f_dH):
+    """Polder tensor over the outer product of 1-D parameter grids.
+
+    Each argument gets its own axis, in the order of the signature, so the
+    result has shape ``(len(freq), len(Hk), len(Nz), len(Mr), len(dH),
+    len(f_dH))``. Scalars give axes of length 1.
+    """
+    grids = [np.atleast_1d(np.asarray(value, dtype=float)) for value in (freq, Hk, Nz, Mr, dH, f_dH)]
+    axes = np.ix_(*grids)
+    return polder_tensor(*axes)
+
+
+def Polder_Mu_eff(freq, Hk, Nz, Mr, dH, f_dH):
+    """Effective permeability ``(mu^2 - kappa^2)/mu`` of the ferrite."""
+    return polder_tensor(freq, Hk, Nz, Mr, dH, f_dH)[2]
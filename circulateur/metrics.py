@@ -0,0 +1,163 @@
+"""
+Figures of merit of the circulators, batched over variants
+
+The S-parameters of many variants are stacked as ``(..., n_freq, 3, 3)``
+arrays (``DoeResults.s_parameters``, ``ResultStore.s_parameters``) and the
+figures of merit of the reports of ``circulateur.reports.REPORTS`` are
+computed for all of them in one vectorized pass:
+
+- Adaptation: S11, S22, S33,
+- Isolation: S21, S32, S13,
+- Transmission: S31, S12, S23 (circulation 1 -> 3 -> 2 -> 1).
+
+The isolation band is the contiguous band around the best isolation where
+the worst of the three isolations stays above ``isolation_min`` dB, its
+edges linearly interpolated between frequency points. Insertion and return
+losses are the worst values over that band. Large stacks are processed by
+chunks of variants, so a memory-mapped store is never loaded at once.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+# (lignes, colonnes) des paramètres S, indices à partir de 0
+ADAPTATION = ((0, 1, 2), (0, 1, 2))
+ISOLATION = ((1, 2, 0), (0, 1, 2))
+TRANSMISSION = ((2, 0, 1), (0, 1, 2))
+ROTATION = np.array([1, 2, 0]) # Port i -> port i+1
+
+
+class FiguresOfMerit(NamedTuple):
+    """Figures of merit of every variant, arrays of the stack shape."""
+    bandwidth: np.ndarray # Bande à isolation_min en Hz, 0 si elle n'est jamais atteinte
+    center_frequency: np.ndarray # Milieu de la bande en Hz, NaN sans bande
+    f_low: np.ndarray # Bord inférieur de la bande en Hz
+    f_high: np.ndarray # Bord supérieur de la bande en Hz
+    isolation: np.ndarray # Meilleure isolation (pire des trois ports) en dB
+    insertion_loss: np.ndarray # Pire perte d'insertion sur la bande en dB
+    return_loss: np.ndarray # Pire adaptation sur la bande en dB
+    symmetry_error: np.ndarray # Écart relatif maximal à la symétrie de rotation des ports
+
+
+def loss_db(s_parameters, pairs):
+    """``-dB(S)`` of the port ``pairs``, shape ``(..., n_freq, 3)``."""
+    rows, columns = pairs
+    selected = s_parameters[..., rows, columns]
+    power = selected.real**2 + selected.imag**2
+    with np.errstate(divide="ignore"):
+        return -10*np.log10(power)
+
+
+def symmetry_error(s_parameters):
+    """Largest relative deviation from the rotational symmetry of the ports.
+
+    An ideal junction is unchanged when every port is renamed to the next
+    one, ``S[i, j] == S[i+1, j+1]``. Returns the maximum over frequency of
+    ``||S - R(S)|| / ||S||`` (Frobenius norms).
+    """
+    difference = s_parameters - s_parameters[..., ROTATION[:, None], ROTATION]
+    deviation = np.sum(difference.real**2 + difference.imag**2, axis=(-2, -1))
+    norm = np.sum(s_parameters.real**2 + s_parameters.imag**2, axis=(-2, -1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.sqrt(np.max(deviation/norm, axis=-1))
+
+
+def _band_edges(frequencies, worst, isolation_min):
+    # Plage contiguë autour du maximum où worst >= isolation_min, sur la dernière dimension
+    n_freq = worst.shape[-1]
+    index = np.arange(n_freq)
+    inside = worst >= isolation_min
+    center = np.argmax(np.where(np.isnan(worst), -np.inf, worst), axis=-1)[..., None]
+    # Dernier point hors bande avant chaque point et premier point hors bande après
+    before = np.maximum.accumulate(np.where(inside, -1, index), axis=-1)
+    after = np.flip(np.minimum.accumulate(np.flip(np.where(inside, n_freq, index), axis=-1), axis=-1), axis=-1)
+    first = np.take_along_axis(before, center, axis=-1)[..., 0] + 1
+    last = np.take_along_axis(after, center, axis=-1)[..., 0] - 1
+    found = np.take_along_axis(inside, center, axis=-1)[..., 0]
+
+    def crossing(inner, outer):
+        # Interpolation linéaire du passage à isolation_min entre un point de la bande et son voisin
+        exists = (outer >= 0) & (outer < n_freq)
+        outer = np.clip(outer, 0, n_freq - 1)
+        w_in = np.take_along_axis(worst, inner[..., None], axis=-1)[..., 0]
+        w_out = np.take_along_axis(worst, outer[..., None], axis=-1)[..., 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.clip((w_in - isolation_min)/(w_in - w_out), 0, 1)
+        t = np.where(exists & np.isfinite(t), t, 0)
+        return frequencies[inner] + t*(frequencies[outer] - frequencies[inner])
+
+    first, last = np.clip(first, 0, n_freq - 1), np.clip(last, 0, n_freq - 1)
+    f_low = np.where(found, crossing(first, first - 1), np.nan)
+    f_high = np.where(found, crossing(last, last + 1), np.nan)
+    return found, first, last, f_low, f_high
+
+
+def figures_of_merit(frequencies, s_parameters, isolation_min=20.0, chunk=4096):
+    """Figures of merit of a stack of 3-port circulators.
+
+    Parameters
+    ----------
+    frequencies : numpy.ndarray
+        Frequencies in Hz, increasing.
+    s_parameters : numpy.ndarray
+        Complex array of shape ``(..., n_freq, 3, 3)``.
+    isolation_min : float, optional
+        Isolation defining the band in dB. The default is ``20``.
+    chunk : int, optional
+        Variants processed at a time. The default is ``4096``.
+
+    Returns
+    -------
+    FiguresOfMerit
+    """
+    frequencies = np.asarray(frequencies, dtype=float)
+    shape = s_parameters.shape[:-3]
+    stack = s_parameters.reshape((-1,) + s_parameters.shape[-3:])
+    merits = [np.empty(len(stack)) for _ in FiguresOfMerit._fields]
+
+    for start in range(0, len(stack), chunk):
+        s = np.asarray(stack[start:start + chunk])
+        isolation = loss_db(s, ISOLATION)
+        worst = np.min(isolation, axis=-1)
+        found, first, last, f_low, f_high = _band_edges(frequencies, worst, isolation_min)
+
+        # Pertes sur les points de la bande seulement
+        index = np.arange(len(frequencies))
+        band = found[:, None] & (index >= first[:, None]) & (index <= last[:, None])
+        insertion = np.max(loss_db(s, TRANSMISSION), axis=-1)
+        adaptation = np.min(loss_db(s, ADAPTATION), axis=-1)
+        with np.errstate(invalid="ignore"):
+            insertion_loss = np.where(found, np.max(np.where(band, insertion, -np.inf), axis=-1), np.nan)
+            return_loss = np.where(found, np.min(np.where(band, adaptation, np.inf), axis=-1), np.nan)
+
+        values = (np.where(found, f_high - f_low, 0.0),
+                  (f_low + f_high)/2,
+                  f_low,
+                  f_high,
+                  np.max(np.where(np.isnan(worst), -np.inf, worst), axis=-1),
+                  insertion_loss,
+                  return_loss,
+                  symmetry_error(s))
+        for merit, value in zip(merits, values):
+            merit[start:start + chunk] = value
+    return FiguresOfMerit(*(merit.reshape(shape) for merit in merits))
+
+
+def ranking(merits, insertion_loss_max=None):
+    """Variants sorted from the widest isolation band to the narrowest.
+
+    Ties are broken by the lowest insertion loss. Variants above
+    ``insertion_loss_max`` dB, or without band, come last.
+
+    Returns
+    -------
+    numpy.ndarray
+        Flat indices of the variants.
+    """
+    bandwidth = np.ravel(merits.bandwidth)
+    insertion_loss = np.nan_to_num(np.ravel(merits.insertion_loss), nan=np.inf)
+    rejected = bandwidth <= 0
+    if insertion_loss_max is not None:
+        rejected |= insertion_loss > insertion_loss_max
+    return np.lexsort((insertion_loss, -bandwidth, rejected))
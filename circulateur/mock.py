@@ -0,0 +1,749 @@
+"""
+Recording stand-in for the ``ansys.aedt.core.Hfss`` application
+
+``MockHfss`` implements the part of the HFSS API used by the builders
+(variables, datasets, materials, modeler, ports, setup, sweep, reports,
+parametric setups and solution data) without AEDT:
+
+- every call and property change is appended to a ``CallLog`` with its
+  duration, and can be summarized per method,
+- the variables are evaluated locally with ``circulateur.expressions``, so a
+  table rejected by AEDT (unknown variable, bad unit, cycle) is rejected
+  here too,
+- objects, materials, ports and setups are kept by name for the checks,
+- ``analyze_setup`` "solves" the sweep with a Python function of the
+  variable values, an ideal circulator by default, after adaptive passes
+  whose convergence table can be exported; a non-blocking solve advances
+  by one pass each time ``are_there_simulations_running`` is read,
+- ``save_project`` writes the state of the application (variables,
+  datasets, materials, objects, ports, setups with their sweeps and
+  parametric setups) as JSON in the project file, restored when the project
+  is opened again, so that the update mode of ``circulateur.project`` finds
+  the project as it was built.
+
+An optional latency per call emulates the round trip to AEDT. Calls outside
+this surface are accepted and recorded without effect. A script is run
+against the mock with::
+
+    python -m circulateur.mock Circulateur_Y_Ferrite_substrate.py --non-graphical --solve
+
+or from Python::
+
+    with patched() as apps:
+        runpy.run_path("Circulateur_Y_Ferrite_substrate.py", run_name="__main__")
+    print(apps[0].log.summary())
+"""
+
+import argparse
+import functools
+import json
+import re
+import runpy
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import NamedTuple
+
+import numpy as np
+
+from circulateur.expressions import Evaluator, unit_scale
+from circulateur.nzm_chen import Dataset1D, load_dataset
+
+_S_EXPRESSION = re.compile(r"S\((\d+),(\d+)\)")
+
+
+class Call(NamedTuple):
+    """One call to the AEDT API."""
+    target: str # Nom de l'objet, du matériau ou du setup concerné, "" pour l'application
+    method: str # e.g. "Modeler.create_box", "Object3D.color" pour une propriété
+    args: tuple
+    kwargs: dict
+    start: float # Instant de l'appel en s depuis la création du journal
+    duration: float # Durée en s, latence simulée comprise
+
+
+class CallLog:
+    """Ordered record of the calls made to one or several mock applications.
+
+    Parameters
+    ----------
+    latency : float, optional
+        Seconds added to every call to emulate a round trip to AEDT. The
+        default is ``0``.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self._origin = time.perf_counter()
+
+    def __len__(self):
+        return len(self.calls)
+
+    def record(self, target, method, args, kwargs, function):
+        """Run ``function()`` as the call ``method(*args, **kwargs)`` and record it."""
+        start = time.perf_counter()
+        try:
+            return function()
+        finally:
+            if self.latency:
+                time.sleep(self.latency)
+            end = time.perf_counter()
+            self.calls.append(Call(target, method, args, kwargs, start - self._origin, end - start))
+
+    def clear(self):
+        self.calls.clear()
+
+    def counts(self):
+        """``{method: number of calls}``."""
+        return Counter(call.method for call in self.calls)
+
+    def timings(self):
+        """``{method: total duration in s}``."""
+        timings = defaultdict(float)
+        for call in self.calls:
+            timings[call.method] += call.duration
+        return dict(timings)
+
+    def sequence(self):
+        """Calls without their timings, for comparisons between runs."""
+        return [(call.target, call.method, repr(call.args), repr(sorted(call.kwargs.items()))) for call in self.calls]
+
+    def summary(self):
+        """Table of the number of calls and total duration of every method."""
+        counts, timings = self.counts(), self.timings()
+        width = max((len(method) for method in counts), default=6)
+        lines = ["{:<{}}  {:>6}  {:>10}".format("Method", width, "Calls", "Time (ms)")]
+        for method, count in sorted(counts.items(), key=lambda item: -timings[item[0]]):
+            lines.append("{:<{}}  {:>6}  {:>10.3f}".format(method, width, count, 1e3*timings[method]))
+        lines.append("{:<{}}  {:>6}  {:>10.3f}".format("Total", width, len(self.calls), 1e3*sum(timings.values())))
+        return "\n".join(lines)
+
+    def save(self, path):
+        """Write the calls as JSON lines."""
+        with open(path, "w") as log:
+            for call in self.calls:
+                log.write(json.dumps({"target": call.target, "method": call.method, "args": repr(call.args),
+                                      "kwargs": repr(call.kwargs), "start": call.start, "duration": call.duration}) + "\n")
+
+
+def _recorded(method):
+    # Méthode d'un objet simulé enregistrée sous "<Classe>.<méthode>"
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        return self._log.record(self._name, "{}.{}".format(self._kind, method.__name__), args, kwargs,
+                                lambda: method(self, *args, **kwargs))
+    return wrapper
+
+
+class _Node:
+    # Objet de l'API simulée : journal, nom de l'objet et type affiché dans les comptes
+    _kind = ""
+
+    def __init__(self, log, name=""):
+        object.__setattr__(self, "_log", log)
+        object.__setattr__(self, "_name", name)
+
+
+class _Recorder(_Node):
+    """Any other part of the API: accepts and records every call and property change."""
+
+    def __init__(self, log, path):
+        super().__init__(log)
+        object.__setattr__(self, "_path", path)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _Recorder(self._log, "{}.{}".format(self._path, name))
+
+    def __call__(self, *args, **kwargs):
+        return self._log.record("", self._path, args, kwargs, lambda: _Recorder(self._log, self._path + "()"))
+
+    def __setattr__(self, name, value):
+        self._log.record("", "{}.{}".format(self._path, name), (value,), {}, lambda: None)
+
+    def __getitem__(self, key):
+        return _Recorder(self._log, "{}[{!r}]".format(self._path, key))
+
+    def __setitem__(self, key, value):
+        self._log.record("", "{}[{!r}]".format(self._path, key), (value,), {}, lambda: None)
+
+
+class _Properties(dict):
+    # Propriétés d'un setup, chaque modification étant un appel à AEDT
+    def __init__(self, owner, values):
+        super().__init__(values)
+        self._owner = owner
+
+    def __setitem__(self, key, value):
+        def change():
+            super(_Properties, self).__setitem__(key, value)
+            if key == "Name":
+                object.__setattr__(self._owner, "_name", value)
+        self._owner._log.record(self._owner._name, self._owner._kind + ".properties", (key, value), {}, change)
+
+
+class MockVariableManager(_Node):
+    _kind = "VariableManager"
+
+    def __init__(self, app):
+        super().__init__(app._log)
+        object.__setattr__(self, "_app", app)
+
+    @property
+    def variable_names(self):
+        return self._log.record("", "VariableManager.variable_names", (), {}, lambda: list(self._app.variables))
+
+    @_recorded
+    def set_variable(self, name, expression=None, **kwargs):
+        names = [name] if isinstance(name, str) else list(name)
+        expressions = [expression] if isinstance(name, str) else list(expression)
+        return self._app._set_variables(dict(zip(names, (str(value) for value in expressions))))
+
+
+class MockMaterialProperty:
+    # permittivity.value = ... comme material.permittivity = ...
+    def __init__(self, material, name):
+        object.__setattr__(self, "_material", material)
+        object.__setattr__(self, "_property", name)
+
+    @property
+    def value(self):
+        return self._material.properties.get(self._property)
+
+    @value.setter
+    def value(self, value):
+        setattr(self._material, self._property, value)
+
+
+class MockMaterial(_Node):
+    _kind = "Material"
+
+    def __init__(self, log, name):
+        super().__init__(log, name)
+        object.__setattr__(self, "properties", {})
+
+    @property
+    def name(self):
+        return self._name
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return MockMaterialProperty(self, name)
+
+    def __setattr__(self, name, value):
+        self._log.record(self._name, "Material." + name, (value,), {}, lambda: self.properties.__setitem__(name, value))
+
+
+class MockMaterials(_Node):
+    _kind = "Materials"
+
+    def __init__(self, log):
+        super().__init__(log)
+        self.material_keys = {}
+
+    @_recorded
+    def add_material(self, name, properties=None):
+        if name.lower() in self.material_keys:
+            return False
+        material = MockMaterial(self._log, name)
+        self.material_keys[name.lower()] = material
+        return material
+
+
+class MockObject3D(_Node):
+    _kind = "Object3D"
+
+    def __init__(self, log, name, material=None, kind=""):
+        super().__init__(log, name)
+        object.__setattr__(self, "properties", {"material_name": material, "kind": kind})
+
+    @property
+    def name(self):
+        return self._name
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name.endswith(("_face_x", "_face_y", "_face_z")):
+            # Face nommée comme les propriétés bottom_face_x, top_face_y... de pyaedt
+            return SimpleNamespace(object=self, name=name)
+        try:
+            return self.properties[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self._log.record(self._name, "Object3D." + name, (value,), {}, lambda: self.properties.__setitem__(name, value))
+
+    @_recorded
+    def rotate(self, axis, angle=90.0, units="deg"):
+        return True
+
+
+class MockModeler(_Node):
+    _kind = "Modeler"
+
+    def __init__(self, log):
+        super().__init__(log)
+        self.objects = {}
+
+    def _add(self, name, material, kind):
+        if name in self.objects:
+            raise ValueError("Object '{}' already exists".format(name))
+        self.objects[name] = MockObject3D(self._log, name, material, kind)
+        return self.objects[name]
+
+    @_recorded
+    def create_box(self, origin, sizes, name=None, material=None, **kwargs):
+        return self._add(name or "Box{}".format(len(self.objects) + 1), material, "box")
+
+    @_recorded
+    def create_cylinder(self, orientation, origin, radius, height, num_sides=0, name=None, material=None, **kwargs):
+        return self._add(name or "Cylinder{}".format(len(self.objects) + 1), material, "cylinder")
+
+    @_recorded
+    def create_equationbased_surface(self, x_uv="_u", y_uv="_v", z_uv="0", u_start=0, u_end=1, v_start=0, v_end=1, name=None, **kwargs):
+        return self._add(name or "EquationSurface{}".format(len(self.objects) + 1), None, "sheet")
+
+    @_recorded
+    def thicken_sheet(self, assignment, thickness, both_sides=False):
+        self.objects[assignment].properties["kind"] = "thickened"
+        return self.objects[assignment]
+
+    @_recorded
+    def subtract(self, blank_list, tool_list, keep_originals=True, **kwargs):
+        return True
+
+    @_recorded
+    def unite(self, assignment, **kwargs):
+        # Les objets unis disparaissent au profit du premier
+        for name in assignment[1:]:
+            del self.objects[name]
+        return assignment[0]
+
+
+class MockSetup(_Node):
+    _kind = "Setup"
+
+    def __init__(self, log, name):
+        super().__init__(log, name)
+        object.__setattr__(self, "properties", _Properties(self, {"Name": name}))
+        object.__setattr__(self, "props", {"SetLambdaTarget": False, "Target": 0.3333})
+        object.__setattr__(self, "sweeps", {})
+
+    @property
+    def name(self):
+        return self._name
+
+    @_recorded
+    def update(self, properties=None):
+        self.props.update(properties or {})
+        return True
+
+    @_recorded
+    def create_linear_step_sweep(self, unit="GHz", start_frequency=1.0, stop_frequency=10.0, step_size=0.1, name=None, sweep_type="Discrete", **kwargs):
+        scale = unit_scale(unit)
+        # Pas arrondi comme AEDT, bornes comprises
+        count = int(round((stop_frequency - start_frequency)/step_size)) + 1
+        self.sweeps[name or "Sweep"] = np.linspace(start_frequency, start_frequency + (count - 1)*step_size, count)*scale
+        return self.sweeps[name or "Sweep"]
+
+
+class MockParametricSetup(_Node):
+    _kind = "ParametricSetup"
+
+    def __init__(self, log, name, variations):
+        super().__init__(log, name)
+        self.variations = variations
+        self.props = {"ProdOptiSetupDataV2": {}}
+        self.solved = False
+
+    @property
+    def name(self):
+        return self._name
+
+    @_recorded
+    def add_variation(self, sweep_variable, start_point, end_point=None, step=100, unit=None, variation_type="LinearCount"):
+        self.variations.append((sweep_variable, start_point, end_point, step, variation_type))
+        return True
+
+    @_recorded
+    def update(self):
+        return True
+
+    @_recorded
+    def analyze(self, cores=None, tasks=1, **kwargs):
+        self.solved = True
+        return True
+
+
+class MockParametrics(_Node):
+    _kind = "Parametrics"
+
+    def __init__(self, log):
+        super().__init__(log)
+        self.setups = []
+
+    @_recorded
+    def add(self, variable, start_point, end_point=None, step=100, variation_type="LinearCount", solution=None, name=None, **kwargs):
+        setup = MockParametricSetup(self._log, name or "ParametricSetup{}".format(len(self.setups) + 1),
+                                    [(variable, start_point, end_point, step, variation_type)])
+        self.setups.append(setup)
+        return setup
+
+
+class MockSolutionData:
+    """Solution of a sweep, with the ``get_expression_data`` of pyaedt."""
+
+    def __init__(self, frequencies, s_parameters):
+        self.primary_sweep = "Freq"
+        self.units_sweeps = {"Freq": "Hz"}
+        self._frequencies = frequencies
+        self._s_parameters = s_parameters
+
+    def get_expression_data(self, expression=None, formula="real", **kwargs):
+        i, j = (int(port) - 1 for port in _S_EXPRESSION.fullmatch(expression.replace(" ", "")).groups())
+        values = self._s_parameters[:, i, j]
+        formulas = {"real": np.real, "imag": np.imag, "mag": np.abs,
+                    "db20": lambda value: 20*np.log10(np.abs(value)), "phasedeg": lambda value: np.angle(value, deg=True)}
+        return self._frequencies, formulas[formula.lower()](values)
+
+
+class MockPost(_Node):
+    _kind = "Post"
+
+    def __init__(self, app):
+        super().__init__(app._log)
+        self._app = app
+        self.reports_by_category = _Recorder(app._log, "Post.reports_by_category")
+        self.oreportsetup = _Recorder(app._log, "Post.oreportsetup")
+
+    @_recorded
+    def get_solution_data(self, expressions=None, setup_sweep_name=None, variations=None, **kwargs):
+        nominal = self._app.solutions.get(setup_sweep_name.replace(" ", "") if setup_sweep_name else None)
+        changes = {name: values[0] for name, values in (variations or {}).items()
+                   if name in self._app.variables and values[0] != self._app.variables[name]}
+        if nominal is None or not changes:
+            return nominal
+        # Variation d'un setup paramétrique résolu, "résolue" à la demande
+        if not any(parametric.solved for parametric in self._app.parametrics.setups):
+            return None
+        values = Evaluator(self._app.variables, self._app.datasets).evaluate(**changes)
+        return MockSolutionData(nominal._frequencies, self._app.solver(values, nominal._frequencies))
+
+
+def ideal_circulator(values, frequencies, n_ports=3):
+    """S-parameters of a matched, lossless circulator, 1 -> 3 -> 2 -> 1."""
+    s_parameters = np.zeros((len(frequencies), n_ports, n_ports), dtype=complex)
+    s_parameters[:, np.arange(n_ports), (np.arange(n_ports) + 1) % n_ports] = 1.0
+    return s_parameters
+
+
+def geometric_convergence(values, properties, tetrahedra=20000, delta_s=0.5, order=2.0):
+    """``(tetrahedra, delta_s)`` of every adaptive pass of a setup.
+
+    The initial mesh has ``tetrahedra`` at the default lambda target, and
+    ``(0.3333/Target)**3`` times more with ``SetLambdaTarget``. It grows by
+    ``Percent Refinement`` per pass and delta S decreases as the mesh size
+    to the power ``-order``, being ``delta_s`` with 30 % more tetrahedra
+    than the default initial mesh, until ``Delta S`` or ``Passes`` is
+    reached.
+    """
+    refinement = 1 + float(properties.get("Percent Refinement", 30))/100
+    target = float(properties.get("Delta S", 0.02))
+    initial = tetrahedra*(0.3333/float(properties["Target"]))**3 if properties.get("SetLambdaTarget") else tetrahedra
+    passes = []
+    for number in range(int(properties.get("Passes", 6))):
+        mesh = initial*refinement**number
+        passes.append((round(mesh), np.nan if number == 0 else delta_s*(mesh/(1.3*tetrahedra))**-order))
+        if number > 0 and passes[-1][1] < target:
+            break
+    return passes
+
+
+class MockHfss(_Node):
+    """Recording stand-in for ``ansys.aedt.core.Hfss``.
+
+    Parameters
+    ----------
+    project, design, version, non_graphical, new_desktop, solution_type
+        Arguments of ``Hfss``, only recorded.
+    log : CallLog, optional
+        Journal receiving the calls. The default is a new journal.
+    latency : float, optional
+        Latency per call of a new journal, see ``CallLog``.
+    solver : callable, optional
+        ``solver(values, frequencies)`` returning the ``(n_freq, 3, 3)``
+        S-parameters of a solve from the SI values of the variables. The
+        default is ``ideal_circulator``.
+    convergence : callable, optional
+        ``convergence(values, properties)`` returning the
+        ``(tetrahedra, delta_s)`` of every adaptive pass from the variable
+        values and the setup properties (``props`` and ``properties``). The
+        default is ``geometric_convergence``.
+
+    An existing ``project`` saved by a ``MockHfss`` is opened with the state
+    it was saved with.
+    """
+
+    _kind = "Hfss"
+
+    def __init__(self, project=None, design=None, version=None, non_graphical=True, new_desktop=True, solution_type="Modal",
+                 log=None, latency=0.0, solver=ideal_circulator, convergence=geometric_convergence, **kwargs):
+        super().__init__(log if log is not None else CallLog(latency))
+        self.project_path = Path(project) if project else None
+        self.project_name = self.project_path.stem if project else "Project1"
+        self.design_name = design or "HFSSDesign1"
+        self.desktop_class = SimpleNamespace(non_graphical=non_graphical)
+        self.variables = {}
+        self.datasets = {}
+        self.solutions = {}
+        self.boundaries = []
+        self.solver = solver
+        self.convergence = convergence
+        self.converged = {} # {setup: [(tétraèdres, delta S)] des passes terminées}
+        self._running = None # (setup, passes restantes) d'un solve non bloquant
+        self.variable_manager = MockVariableManager(self)
+        self.materials = MockMaterials(self._log)
+        self.modeler = MockModeler(self._log)
+        self.setups = [MockSetup(self._log, "Setup1")]
+        self.parametrics = MockParametrics(self._log)
+        self.post = MockPost(self)
+        self._log.record("", "Hfss", (), {"project": project, "design": design, "version": version, "non_graphical": non_graphical,
+                                          "new_desktop": new_desktop, "solution_type": solution_type, **kwargs}, lambda: None)
+        if self.project_path is not None and self.project_path.exists():
+            # Projet rouvert : état enregistré par save_project, un fichier vide ou d'AEDT étant ignoré
+            try:
+                self._restore(json.loads(self.project_path.read_text(encoding="utf-8")))
+            except ValueError:
+                pass
+
+    def _state(self):
+        return {"variables": self.variables,
+                "datasets": {name: {field: np.asarray(values).tolist() for field, values in dataset._asdict().items()}
+                             for name, dataset in self.datasets.items()},
+                "materials": {material.name: material.properties for material in self.materials.material_keys.values()},
+                "objects": {name: item.properties for name, item in self.modeler.objects.items()},
+                "boundaries": self.boundaries,
+                "setups": [{"name": setup.name, "properties": dict(setup.properties), "props": setup.props,
+                            "sweeps": {name: frequencies.tolist() for name, frequencies in setup.sweeps.items()}}
+                           for setup in self.setups],
+                "parametrics": [{"name": setup.name, "variations": setup.variations, "props": setup.props}
+                                for setup in self.parametrics.setups]}
+
+    def _restore(self, state):
+        # Objets recréés sans passer par le journal, comme dans un projet ouvert par AEDT
+        self.variables = dict(state["variables"])
+        self.datasets = {name: Dataset1D(**{field: np.array(values) for field, values in dataset.items()})
+                         for name, dataset in state["datasets"].items()}
+        for name, properties in state["materials"].items():
+            material = MockMaterial(self._log, name)
+            material.properties.update(properties)
+            self.materials.material_keys[name.lower()] = material
+        for name, properties in state["objects"].items():
+            self.modeler.objects[name] = MockObject3D(self._log, name)
+            self.modeler.objects[name].properties.update(properties)
+        self.boundaries = list(state["boundaries"])
+        self.setups = []
+        for saved in state["setups"]:
+            setup = MockSetup(self._log, saved["name"])
+            dict.update(setup.properties, saved["properties"])
+            setup.props.update(saved["props"])
+            setup.sweeps.update({name: np.array(frequencies) for name, frequencies in saved["sweeps"].items()})
+            self.setups.append(setup)
+        for saved in state["parametrics"]:
+            setup = MockParametricSetup(self._log, saved["name"], [tuple(variation) for variation in saved["variations"]])
+            setup.props.update(saved["props"])
+            self.parametrics.setups.append(setup)
+
+    @property
+    def log(self):
+        return self._log
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _Recorder(self._log, "Hfss." + name)
+
+    @property
+    def available_variations(self):
+        def nominal():
+            return SimpleNamespace(nominal_values=dict(self.variables))
+        return self._log.record("", "Hfss.available_variations", (), {}, nominal)
+
+    def evaluate(self, name=None):
+        """SI value of a variable, or ``{name: value}`` of all of them."""
+        values = Evaluator(self.variables, self.datasets).evaluate()
+        return values if name is None else values[name]
+
+    def _set_variables(self, expressions):
+        # Refus comme AEDT si une expression ne s'évalue pas, la table restant inchangée
+        variables = {**self.variables, **expressions}
+        try:
+            Evaluator(variables, self.datasets).evaluate()
+        except (ValueError, KeyError, TypeError, SyntaxError, NameError, ArithmeticError):
+            return False
+        self.variables = variables
+        return True
+
+    def __getitem__(self, name):
+        return self.variables[name]
+
+    def __setitem__(self, name, value):
+        def assign():
+            if isinstance(value, Dataset1D):
+                self.datasets[name] = value
+            elif not self._set_variables({name: str(value)}):
+                raise ValueError("Invalid expression '{}' for variable '{}'".format(value, name))
+        self._log.record("", "Hfss.__setitem__", (name, value), {}, assign)
+
+    @_recorded
+    def import_dataset1d(self, input_file, name=None, is_project_dataset=True, sort=True):
+        dataset = load_dataset(input_file)
+        self.datasets[name or Path(input_file).stem] = dataset
+        return dataset
+
+    @_recorded
+    def wave_port(self, assignment, reference=None, name=None, **kwargs):
+        self.boundaries.append(name or "Port{}".format(len(self.boundaries) + 1))
+        return self.boundaries[-1]
+
+    @_recorded
+    def save_project(self, file_name=None, overwrite=True, refresh_ids=False):
+        # État écrit dans le fichier, pour que le mode mise à jour retrouve le projet
+        path = Path(file_name) if file_name else self.project_path
+        if path is not None:
+            path.write_text(json.dumps(self._state(), default=str), encoding="utf-8")
+        return True
+
+    @_recorded
+    def get_setup(self, name):
+        # Setup d'un projet rouvert, recréé s'il n'a pas été construit par cette application
+        setup = next((setup for setup in self.setups if setup.name == name), None)
+        if setup is None:
+            setup = MockSetup(self._log, name)
+            self.setups.append(setup)
+        return setup
+
+    def _finish(self, setup):
+        values = self.evaluate()
+        for sweep, frequencies in setup.sweeps.items():
+            self.solutions["{}:{}".format(setup.name, sweep)] = MockSolutionData(frequencies, self.solver(values, frequencies))
+        self._running = None
+
+    @_recorded
+    def analyze_setup(self, name=None, cores=None, blocking=True, **kwargs):
+        setup = next((setup for setup in self.setups if setup.name == (name or self.setups[0].name)), None)
+        if setup is None:
+            return False
+        passes = self.convergence(self.evaluate(), {**setup.props, **setup.properties})
+        self.converged[setup.name] = []
+        self._running = (setup, list(passes))
+        if blocking:
+            self.converged[setup.name].extend(passes)
+            self._finish(setup)
+        return True
+
+    @property
+    def are_there_simulations_running(self):
+        def advance():
+            # Une passe de plus à chaque relevé
+            if self._running is None:
+                return False
+            setup, remaining = self._running
+            if remaining:
+                self.converged[setup.name].append(remaining.pop(0))
+            if not remaining:
+                self._finish(setup)
+            return self._running is not None
+        return self._log.record("", "Hfss.are_there_simulations_running", (), {}, advance)
+
+    @_recorded
+    def stop_simulations(self, clean_stop=True):
+        if self._running is not None:
+            self._finish(self._running[0])
+        return "Simulations stopped"
+
+    @_recorded
+    def export_convergence(self, setup, variations="", output_file=None):
+        setup = setup.split(" : ")[0]
+        lines = ["Setup : {}".format(setup), "", "Pass Number\t# Tetrahedra\tMax Mag. Delta S"]
+        for number, (tetrahedra, delta_s) in enumerate(self.converged.get(setup, []), 1):
+            lines.append("{}\t{}\t{}".format(number, tetrahedra, "N/A" if np.isnan(delta_s) else "{:.6g}".format(delta_s)))
+        output_file = output_file or "{}_convergence.conv".format(setup)
+        Path(output_file).write_text("\n".join(lines) + "\n")
+        return str(output_file)
+
+
+@contextmanager
+def patched(**kwargs):
+    """Replace ``ansys.aedt.core.Hfss`` by ``MockHfss`` inside the block.
+
+    Keyword arguments are passed to every ``MockHfss``. Yields the list of the
+    applications created in the block, which share one ``CallLog``.
+    """
+    import ansys.aedt.core
+
+    kwargs.setdefault("log", CallLog(kwargs.pop("latency", 0.0)))
+    applications = []
+
+    def factory(*args, **options):
+        applications.append(MockHfss(*args, **{**options, **kwargs}))
+        return applications[-1]
+
+    original = ansys.aedt.core.Hfss
+    ansys.aedt.core.Hfss = factory
+    try:
+        yield applications
+    finally:
+        ansys.aedt.core.Hfss = original
+
+
+def run_script(path, arguments=(), **kwargs):
+    """Run a circulator script against ``MockHfss``.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Script, run as ``__main__``.
+    arguments : list of str, optional
+        Command line options of the script, see ``circulateur.cli``.
+    **kwargs
+        Arguments of ``MockHfss``, e.g. ``latency``.
+
+    Returns
+    -------
+    CallLog
+    """
+    argv = sys.argv
+    sys.argv = [str(path)] + list(arguments)
+    try:
+        with patched(**kwargs) as applications:
+            runpy.run_path(str(path), run_name="__main__")
+    finally:
+        sys.argv = argv
+    return applications[0].log if applications else CallLog()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a circulator script against a recording mock of HFSS.")
+    parser.add_argument("script", help="circulator script")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated round trip per call in s")
+    parser.add_argument("--log", default=None, help="write the calls to this JSON lines file")
+    args, script_arguments = parser.parse_known_args(argv)
+
+    log = run_script(args.script, script_arguments, latency=args.latency)
+    print(log.summary())
+    if args.log is not None:
+        log.save(args.log)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
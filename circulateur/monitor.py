@@ -0,0 +1,224 @@
+"""
+Convergence telemetry of the adaptive passes, with early abort
+
+``SolveMonitor`` starts the solve without blocking and polls the convergence
+table of the setup while it runs (``ExportConvergence``). Every new adaptive
+pass is appended to a JSON lines time series with its maximum delta S, the
+number of tetrahedra, the memory of the local AEDT processes and the elapsed
+time::
+
+    {"time": "2025-03-02T21:40:12", "event": "pass", "setup": "Setup", "pass": 7,
+     "tetrahedra": 48211, "delta_s": 0.031, "memory": 6.2e9, "elapsed": 412.5}
+
+The solve is stopped cleanly when convergence stalls, i.e. when the best
+delta S has not decreased by ``improvement`` (relative) over the last
+``window`` passes, or when it exceeds ``max_time`` or ``max_memory``. From
+the scripts::
+
+    python Circulateur_Y_Ferrite_substrate.py --non-graphical --solve --monitor-log convergence.jsonl --stall-passes 4
+"""
+
+import datetime
+import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import psutil
+
+# Processus AEDT dont la mémoire est comptée : Desktop, mailleur et solveur HFSS
+AEDT_PROCESSES = ("ansysedt", "hf3d", "hfss", "mesher", "meshing")
+
+_ROW_SPLIT = re.compile(r"\t+| {2,}")
+
+
+class PassRecord(NamedTuple):
+    """One adaptive pass, as seen by the monitor."""
+    number: int
+    tetrahedra: float # Taille du maillage, NaN si inconnue
+    delta_s: float # Delta S maximal, NaN à la première passe
+    memory: float # Mémoire résidente des processus AEDT en octets, NaN si inconnue
+    elapsed: float # Temps écoulé depuis le lancement quand la passe a été vue, en s
+
+
+class MonitorResult(NamedTuple):
+    """Outcome of a monitored solve."""
+    completed: bool # Solve terminé par AEDT
+    reason: str # Motif de l'arrêt anticipé, "" sinon
+    passes: list # PassRecord de chaque passe
+    elapsed: float # Durée totale en s
+
+
+def parse_convergence(text):
+    """``(pass, tetrahedra, delta_s)`` rows of an exported convergence table.
+
+    The table is found by its header line (``Pass Number``,
+    ``# Tetrahedra``, ``Max Mag. Delta S``); missing values (``N/A``) are
+    NaN.
+    """
+    rows = []
+    columns = None
+    for line in text.splitlines():
+        cells = [cell.strip() for cell in _ROW_SPLIT.split(line.strip())]
+        lowered = [cell.lower() for cell in cells]
+        if columns is None:
+            if lowered and lowered[0].startswith("pass") and any("delta" in cell for cell in lowered):
+                columns = (next((k for k, cell in enumerate(lowered) if "tet" in cell), None),
+                           next(k for k, cell in enumerate(lowered) if "delta" in cell))
+            continue
+        if not cells or not cells[0].isdigit():
+            continue
+
+        def value(index):
+            try:
+                return float(cells[index])
+            except (TypeError, IndexError, ValueError):
+                return np.nan
+
+        rows.append((int(cells[0]), value(columns[0]), value(columns[1])))
+    return rows
+
+
+def read_convergence(app, setup="Setup"):
+    """``(pass, tetrahedra, delta_s)`` rows of the convergence of a setup, solved or running."""
+    handle, path = tempfile.mkstemp(suffix=".conv", prefix="circulateur_")
+    os.close(handle)
+    try:
+        exported = Path(app.export_convergence(setup, output_file=path) or path)
+        text = exported.read_text(errors="replace") if exported.exists() else ""
+    finally:
+        Path(path).unlink(missing_ok=True)
+    return parse_convergence(text)
+
+
+def aedt_memory():
+    """Resident memory in bytes of the local AEDT processes, NaN if none is found."""
+    total = 0
+    found = False
+    for process in psutil.process_iter(["name", "memory_info"]):
+        name = (process.info["name"] or "").lower()
+        if process.info["memory_info"] is not None and any(pattern in name for pattern in AEDT_PROCESSES):
+            total += process.info["memory_info"].rss
+            found = True
+    return float(total) if found else np.nan
+
+
+def stalled(delta_s, window=4, improvement=0.1):
+    """Whether the best delta S has not decreased by ``improvement`` over the last ``window`` passes."""
+    delta_s = np.asarray(delta_s, dtype=float)
+    delta_s = delta_s[np.isfinite(delta_s)]
+    if len(delta_s) <= window:
+        return False
+    return np.min(delta_s[-window:]) > (1 - improvement)*np.min(delta_s[:-window])
+
+
+class SolveMonitor:
+    """Monitored, abortable solve of one setup.
+
+    Parameters
+    ----------
+    app : ansys.aedt.core.Hfss
+    setup : str, optional
+        Setup solved. The default is ``"Setup"``.
+    log : str or pathlib.Path, optional
+        JSON lines file receiving one record per pass and the outcome. The
+        default is ``None``, without file.
+    interval : float, optional
+        Seconds between two polls. The default is ``10``.
+    window : int, optional
+        Passes without ``improvement`` after which the solve is stopped. The
+        default is ``4``, ``None`` never stops on a stall.
+    improvement : float, optional
+        Relative decrease of the best delta S expected over ``window``
+        passes. The default is ``0.1``.
+    max_time : float, optional
+        Seconds after which the solve is stopped.
+    max_memory : float, optional
+        Bytes of AEDT memory above which the solve is stopped.
+    on_pass : callable, optional
+        ``on_pass(record)`` called for every new ``PassRecord``.
+    """
+
+    def __init__(self, app, setup="Setup", log=None, interval=10.0, window=4, improvement=0.1, max_time=None, max_memory=None, on_pass=None):
+        self.app = app
+        self.setup = setup
+        self.log = None if log is None else Path(log)
+        self.interval = interval
+        self.window = window
+        self.improvement = improvement
+        self.max_time = max_time
+        self.max_memory = max_memory
+        self.on_pass = on_pass
+        self.passes = []
+        self.memory = np.nan # Mémoire du dernier relevé, pendant une passe comme à sa fin
+
+    def _write(self, event, **fields):
+        if self.log is None:
+            return
+        self.log.parent.mkdir(parents=True, exist_ok=True)
+        # Valeurs inconnues (NaN) écrites null, pour un JSON strict
+        fields = {key: None if isinstance(value, float) and np.isnan(value) else value for key, value in fields.items()}
+        record = {"time": datetime.datetime.now().isoformat(timespec="seconds"), "event": event, "setup": self.setup, **fields}
+        with open(self.log, "a", encoding="utf-8") as log:
+            log.write(json.dumps(record, default=float) + "\n")
+
+    def poll(self, elapsed):
+        """Read the convergence table and the AEDT memory, and record the new passes.
+
+        Returns
+        -------
+        list of PassRecord
+        """
+        rows = read_convergence(self.app, self.setup)
+        memory = self.memory = aedt_memory()
+        new = []
+        for number, tetrahedra, delta_s in rows:
+            if number > len(self.passes):
+                record = PassRecord(number, tetrahedra, delta_s, memory, elapsed)
+                self.passes.append(record)
+                new.append(record)
+                self._write("pass", **{"pass": number, "tetrahedra": tetrahedra, "delta_s": delta_s, "memory": memory, "elapsed": elapsed})
+                if self.on_pass is not None:
+                    self.on_pass(record)
+        return new
+
+    def check(self, elapsed):
+        """Reason to stop the solve now, ``""`` to let it run."""
+        if self.window and stalled([record.delta_s for record in self.passes], self.window, self.improvement):
+            return "delta S stalled over {} passes".format(self.window)
+        if self.max_time is not None and elapsed > self.max_time:
+            return "time limit of {:.0f} s reached".format(self.max_time)
+        if self.max_memory is not None and self.memory > self.max_memory:
+            return "memory limit of {:.3g} GB reached".format(self.max_memory/1e9)
+        return ""
+
+    def run(self, cores=None):
+        """Solve the setup, polling it until it ends or is stopped.
+
+        Returns
+        -------
+        MonitorResult
+        """
+        start = time.monotonic()
+        self.passes = []
+        self.memory = np.nan
+        if not self.app.analyze_setup(self.setup, cores=cores, blocking=False):
+            raise RuntimeError("Solve of setup '{}' could not be started".format(self.setup))
+        reason = ""
+        while self.app.are_there_simulations_running:
+            time.sleep(self.interval)
+            elapsed = time.monotonic() - start
+            self.poll(elapsed)
+            reason = self.check(elapsed)
+            if reason:
+                self.app.stop_simulations(clean_stop=True)
+                break
+        elapsed = time.monotonic() - start
+        # Dernières passes terminées entre le dernier relevé et la fin du solve
+        self.poll(elapsed)
+        self._write("end", completed=not reason, reason=reason, passes=len(self.passes), elapsed=elapsed)
+        return MonitorResult(completed=not reason, reason=reason, passes=list(self.passes), elapsed=elapsed)
@@ -0,0 +1,127 @@
+"""
+Local loader and interpolator for the Nzm_Chen.tab dataset
+
+Nzm_Chen.tab tabulates Chen's magnetometric demagnetisation factor of a
+cylinder against its aspect ratio gamma = height/diameter. The hexagonal
+script imports it into HFSS with ``import_dataset1d`` and evaluates
+``pwl(Nzm_Chen, gamma_Chen)`` there; this module gives the same values
+offline for whole arrays of aspect ratios.
+
+Parsed files are cached per path and reloaded when their modification time
+changes. Segment slopes and monotone spline derivatives are computed once at
+load time so that every interpolation is a single ``np.searchsorted`` pass.
+"""
+
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+NZM_CHEN_PATH = Path(__file__).resolve().parent.parent / "Nzm_Chen.tab"
+
+
+class Dataset1D(NamedTuple):
+    """Tabulated 1-D dataset with its pre-computed interpolation data."""
+    x: np.ndarray # Abscisses croissantes
+    y: np.ndarray
+    slopes: np.ndarray # Pente de chaque segment, len(x)-1
+    derivatives: np.ndarray # Dérivées aux noeuds de la spline monotone (Fritsch-Carlson)
+
+
+_cache = {}
+
+
+def _pchip_derivatives(x, y, slopes):
+    # Dérivées de Fritsch-Carlson : moyenne harmonique pondérée, nulle aux extrema locaux
+    h = np.diff(x)
+    d = np.zeros_like(y)
+    if len(x) == 2:
+        d[:] = slopes[0]
+        return d
+    s0, s1 = slopes[:-1], slopes[1:]
+    w1 = 2*h[1:] + h[:-1]
+    w2 = h[1:] + 2*h[:-1]
+    same_sign = (s0*s1) > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d[1:-1] = np.where(same_sign, (w1 + w2)/(w1/s0 + w2/s1), 0.0)
+    # Extrémités : formule à trois points non centrée, bornée pour rester monotone
+    for end, (h0, h1, m0, m1) in ((0, (h[0], h[1], slopes[0], slopes[1])),
+                                  (-1, (h[-1], h[-2], slopes[-1], slopes[-2]))):
+        dk = ((2*h0 + h1)*m0 - h0*m1)/(h0 + h1)
+        if np.sign(dk) != np.sign(m0):
+            dk = 0.0
+        elif np.sign(m0) != np.sign(m1) and abs(dk) > abs(3*m0):
+            dk = 3*m0
+        d[end] = dk
+    return d
+
+
+def load_dataset(path=NZM_CHEN_PATH):
+    """Load a two-column ``.tab`` dataset, reusing the cached arrays if unchanged.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path, optional
+        Tab file with a header line and ``x y`` rows. The default is the
+        ``Nzm_Chen.tab`` file next to the scripts.
+
+    Returns
+    -------
+    Dataset1D
+        Arrays sorted by increasing ``x``.
+    """
+    path = Path(path).resolve()
+    mtime = path.stat().st_mtime_ns
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    data = np.loadtxt(path, skiprows=1, dtype=float, ndmin=2)
+    order = np.argsort(data[:, 0], kind="stable")
+    x = np.ascontiguousarray(data[order, 0])
+    y = np.ascontiguousarray(data[order, 1])
+    if len(x) < 2 or np.any(np.diff(x) <= 0):
+        raise ValueError("{} needs at least two points with distinct abscissae".format(path))
+
+    slopes = np.diff(y)/np.diff(x)
+    dataset = Dataset1D(x=x, y=y, slopes=slopes, derivatives=_pchip_derivatives(x, y, slopes))
+    _cache[path] = (mtime, dataset)
+    return dataset
+
+
+def _segments(dataset, x):
+    # Indice du segment contenant x, les points hors tableau utilisent le premier ou le dernier segment
+    x = np.asarray(x, dtype=float)
+    index = np.clip(np.searchsorted(dataset.x, x, side="right") - 1, 0, len(dataset.x) - 2)
+    return x, index
+
+
+def pwl(dataset, x):
+    """Piecewise-linear interpolation, extrapolated linearly like HFSS ``pwl``."""
+    x, k = _segments(dataset, x)
+    return dataset.y[k] + dataset.slopes[k]*(x - dataset.x[k])
+
+
+def pchip(dataset, x):
+    """Monotone cubic (Fritsch-Carlson) interpolation, linear outside the table."""
+    x, k = _segments(dataset, x)
+    x0, x1 = dataset.x[k], dataset.x[k + 1]
+    h = x1 - x0
+    t = (x - x0)/h
+    inside = (t >= 0) & (t <= 1)
+    t = np.clip(t, 0, 1)
+    t2, t3 = t*t, t*t*t
+    value = ((2*t3 - 3*t2 + 1)*dataset.y[k] + (t3 - 2*t2 + t)*h*dataset.derivatives[k]
+             + (-2*t3 + 3*t2)*dataset.y[k + 1] + (t3 - t2)*h*dataset.derivatives[k + 1])
+    return np.where(inside, value, pwl(dataset, x))
+
+
+def chen_nz(gamma, path=NZM_CHEN_PATH, method="pwl"):
+    """Chen demagnetisation factor for aspect ratios ``gamma = height/diameter``.
+
+    ``method`` is ``"pwl"`` (identical to the HFSS evaluation) or ``"pchip"``.
+    """
+    interpolators = {"pwl": pwl, "pchip": pchip}
+    if method not in interpolators:
+        raise ValueError("Unknown interpolation method '{}', expected one of {}".format(method, sorted(interpolators)))
+    return interpolators[method](load_dataset(path), gamma)
@@ -0,0 +1,419 @@
+"""
+Bayesian optimization of the isolation bandwidth
+
+The design variables to tune (geometry such as ``rayon_jonction``, ferrite
+parameters such as ``Hk``) are given with their bounds as HFSS expressions,
+the other variables of the template project are left unchanged, except the
+variables computed in Python, recomputed from every candidate as in
+``circulateur.doe``, which cannot be optimized themselves. The
+objective is the isolation bandwidth of ``circulateur.metrics``, negative
+for the designs without band or above ``insertion_loss_max`` (see
+``objective``).
+
+The first candidates are a Latin hypercube of the search space, the next
+ones maximize the expected improvement of a Gaussian process
+(``circulateur.surrogate.GaussianProcess``) fitted on the solved designs.
+Candidates still being solved are taken into account with the predicted
+value as a provisional result (kriging believer), so that every AEDT
+session gets a different candidate: a new one is proposed as soon as a
+solve ends and the workers never wait for the whole batch::
+
+    python -m circulateur.optimize Circulateur_Y_Ferrite_substrate.py \\
+        --space rayon_jonction=800um:1200um --space Hk=12000:20000 \\
+        --budget 40 --workers 3 --store "Designs/Circulateur en Y/Resultats"
+
+Solved designs are appended to the result store with the full variable
+table of their design, and the designs of the store that share the
+template's variables outside the search space are used as a warm start.
+"""
+
+import argparse
+import multiprocessing
+import re
+import shutil
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from circulateur.benchmark import load_spec
+from circulateur.builder import project_path, variable_graph
+from circulateur.doe import N_PORTS, _init_worker, check_template, design_variables, solve_row
+from circulateur.expressions import evaluate, unit_scale
+from circulateur.metrics import figures_of_merit
+from circulateur.results import ResultStore
+from circulateur.surrogate import GaussianProcess, training_set
+
+_VALUE = re.compile(r"\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?\s*(?P<unit>[A-Za-z_]\w*)?\s*")
+
+
+class SearchSpace:
+    """Bounds of the optimized design variables.
+
+    Parameters
+    ----------
+    bounds : dict
+        ``{variable: (low, high)}`` with HFSS values such as
+        ``("800um", "1200um")``. Candidates are written in the unit of
+        ``low``.
+    """
+
+    def __init__(self, bounds):
+        self.names = tuple(bounds)
+        if not self.names:
+            raise ValueError("The search space has no variable")
+        self.units = []
+        for name, (low, high) in bounds.items():
+            match = _VALUE.fullmatch(str(low))
+            if match is None:
+                raise ValueError("Bound '{}' of {} is not a plain value".format(low, name))
+            self.units.append(match.group("unit") or "")
+        self.lower = np.array([float(evaluate(str(low))) for low, _ in bounds.values()])
+        self.upper = np.array([float(evaluate(str(high))) for _, high in bounds.values()])
+        if np.any(self.upper <= self.lower):
+            raise ValueError("Empty range for {}".format(", ".join(np.array(self.names)[self.upper <= self.lower])))
+
+    def __len__(self):
+        return len(self.names)
+
+    def to_unit(self, values):
+        """SI values ``(..., d)`` to the unit hypercube."""
+        return (np.asarray(values, dtype=float) - self.lower)/(self.upper - self.lower)
+
+    def design(self, x):
+        """``{variable: expression}`` of a point of the unit hypercube."""
+        values = self.lower + np.clip(x, 0, 1)*(self.upper - self.lower)
+        return {name: "{:.6g}{}".format(value/unit_scale(unit), unit) for name, unit, value in zip(self.names, self.units, values)}
+
+
+def objective(frequencies, s_parameters, isolation_min=20.0, insertion_loss_max=None):
+    """Isolation bandwidth in Hz, broadcast over the variants.
+
+    A design without band scores the missing isolation as a negative
+    fraction of the sweep, ``-(isolation_min - isolation)/isolation_min``
+    times its width, and a design above ``insertion_loss_max`` dB the excess
+    loss in the same way, so that the optimizer is still guided toward the
+    band where nothing reaches it.
+    """
+    frequencies = np.asarray(frequencies, dtype=float)
+    merits = figures_of_merit(frequencies, s_parameters, isolation_min)
+    width = frequencies[-1] - frequencies[0]
+    value = np.where(merits.bandwidth > 0, merits.bandwidth,
+                     -width*np.clip((isolation_min - merits.isolation)/isolation_min, 0, 1))
+    if insertion_loss_max is not None:
+        excess = np.nan_to_num(merits.insertion_loss, nan=0.0) - insertion_loss_max
+        value = np.where(excess > 0, -width*np.clip(excess/insertion_loss_max, 0, 1), value)
+    return value
+
+
+def _normal_cdf(z):
+    # Abramowitz et Stegun 7.1.26, erreur absolue < 1e-7, sans scipy
+    x = np.abs(z)/np.sqrt(2)
+    t = 1/(1 + 0.3275911*x)
+    erf = 1 - t*(0.254829592 + t*(-0.284496736 + t*(1.421413741 + t*(-1.453152027 + t*1.061405429))))*np.exp(-x**2)
+    return 0.5*(1 + np.sign(z)*erf)
+
+
+def expected_improvement(mean, std, best, xi=0.01):
+    """Expected improvement over ``best`` of a maximized objective."""
+    std = np.maximum(std, 1e-12)
+    improvement = mean - best - xi
+    z = improvement/std
+    return improvement*_normal_cdf(z) + std*np.exp(-z**2/2)/np.sqrt(2*np.pi)
+
+
+class Optimizer:
+    """Asynchronous Bayesian optimizer of the isolation bandwidth.
+
+    ``ask`` proposes one design at a time and ``tell`` records its result,
+    in any order: designs asked but not told yet are pending and are not
+    proposed again.
+
+    Parameters
+    ----------
+    space : SearchSpace or dict
+        Optimized variables and their bounds.
+    initial : int, optional
+        Size of the Latin hypercube solved before the Gaussian process is
+        used. The default is ``2*d + 2`` for ``d`` variables.
+    candidates : int, optional
+        Random candidates over which the expected improvement is maximized,
+        half of them around the best designs. The default is ``2048``.
+    seed : int, optional
+        Seed of the random generator.
+    """
+
+    def __init__(self, space, initial=None, candidates=2048, seed=None):
+        self.space = space if isinstance(space, SearchSpace) else SearchSpace(space)
+        self.candidates = candidates
+        self._rng = np.random.default_rng(seed)
+        d = len(self.space)
+        n = initial or 2*d + 2
+        # Hypercube latin : une valeur par intervalle de chaque variable
+        self._initial = list((np.argsort(self._rng.random((d, n)), axis=1).T + self._rng.random((n, d)))/n)
+        self.X = np.empty((0, d))
+        self.y = np.empty(0)
+        self._pending = {}
+
+    def _key(self, design):
+        return tuple(design[name] for name in self.space.names)
+
+    @property
+    def best(self):
+        """``(design, objective)`` of the best solved design, ``None`` before the first."""
+        if not len(self.y):
+            return None
+        index = int(np.argmax(self.y))
+        return self.space.design(self.X[index]), float(self.y[index])
+
+    def observe(self, X, y):
+        """Add solved designs, SI values ``(n, d)``, without pending entries (warm start)."""
+        x = self.space.to_unit(np.atleast_2d(X))
+        inside = np.all((x >= 0) & (x <= 1), axis=1)
+        self.X = np.concatenate((self.X, x[inside]))
+        self.y = np.concatenate((self.y, np.asarray(y, dtype=float).ravel()[inside]))
+
+    def observe_store(self, store, isolation_min=20.0, insertion_loss_max=None, datasets=None, base=None):
+        """Warm start from the records of a result store that define every search variable.
+
+        ``base`` gives the ``{name: expression}`` the records must match, the
+        variables of the template that do not depend on the search space, so
+        that the records of other designs are left out.
+        """
+        if not len(store):
+            return
+        X, frequencies, s_parameters = training_set(store, self.space.names, datasets, skip_missing=True, conditions=base)
+        if not len(X):
+            return
+        self.observe(X, objective(frequencies, s_parameters, isolation_min, insertion_loss_max))
+
+    def _proposal(self):
+        pending = np.array(list(self._pending.values())).reshape(-1, len(self.space))
+        if len(self.y) < 2:
+            # Pas encore de modèle exploitable : point le plus éloigné des points connus
+            points = self._rng.random((self.candidates, len(self.space)))
+            known = np.concatenate((self.X, pending))
+            if not len(known):
+                return points[0]
+            distance = np.min(np.sum((points[:, None, :] - known[None, :, :])**2, axis=-1), axis=1)
+            return points[np.argmax(distance)]
+
+        process = GaussianProcess(self.X, self.y, bounds=(np.zeros(len(self.space)), np.ones(len(self.space))))
+        if len(pending):
+            process = process.condition(pending, process.predict(pending)[0])
+
+        # Candidats uniformes et perturbations des meilleurs points
+        half = self.candidates//2
+        top = self.X[np.argsort(self.y)[::-1][:3]]
+        around = top[self._rng.integers(len(top), size=self.candidates - half)] + 0.1*self._rng.standard_normal((self.candidates - half, len(self.space)))
+        points = np.concatenate((self._rng.random((half, len(self.space))), np.clip(around, 0, 1)))
+        mean, std = process.predict(points)
+        return points[np.argmax(expected_improvement(mean[:, 0], std[:, 0], np.max(self.y), 0.01*np.ptp(self.y)))]
+
+    def ask(self):
+        """Next design to solve, ``{variable: expression}``."""
+        x = self._initial.pop(0) if self._initial else self._proposal()
+        design = self.space.design(x)
+        # Point arrondi aux valeurs écrites dans le projet
+        self._pending[self._key(design)] = self.space.to_unit([float(evaluate(design[name])) for name in self.space.names])
+        return design
+
+    def tell(self, design, value):
+        """Record the objective of a design returned by ``ask``, ``None`` if its solve failed.
+
+        A failed design counts as the worst design so far, so that its region
+        is not proposed again.
+        """
+        x = self._pending.pop(self._key(design))
+        self.X = np.concatenate((self.X, x[None]))
+        self.y = np.append(self.y, np.min(self.y, initial=0.0) if value is None else float(value))
+
+
+class OptimizationResult(NamedTuple):
+    """Designs solved by ``optimize``, in the order their solves ended."""
+    designs: list # Une table {variable: expression} par solve, variables fixes comprises
+    objectives: np.ndarray # Objectif en Hz (bande d'isolation), NaN si le solve a échoué
+    errors: list # Message d'erreur par solve, "" si le design a été résolu
+    best: dict # Meilleur design
+    best_objective: float # Son objectif en Hz
+
+
+def optimize(template, spec, space, budget=30, workers=2, target=None, fixed=None, isolation_min=20.0, insertion_loss_max=None,
+             initial=None, seed=None, store=None, version="2024.2", design="Circulateur", setup="Setup", sweep="Sweep",
+             cores=None, work_dir=None, prepare=None, callback=None):
+    """Maximize the isolation bandwidth with parallel AEDT sessions.
+
+    Parameters
+    ----------
+    template : str or pathlib.Path
+        Parametrized ``.aedt`` project, see ``circulateur.doe.run_doe``.
+    spec : circulateur.spec.CirculatorSpec
+        Spec the template was built from, see ``circulateur.doe.run_doe``.
+    space : SearchSpace or dict
+        ``{variable: (low, high)}`` of the optimized variables, none of them
+        computed in Python.
+    budget : int, optional
+        Number of solves. The default is ``30``.
+    workers : int, optional
+        Number of parallel AEDT sessions, each kept busy with its own
+        candidate. The default is ``2``.
+    target : float, optional
+        Bandwidth in Hz ending the optimization once reached.
+    fixed : dict, optional
+        ``{variable: expression}`` written in every design, e.g. a ferrite
+        grade studied separately.
+    isolation_min, insertion_loss_max : float, optional
+        Definition of the objective, see ``objective``.
+    initial, seed : int, optional
+        See ``Optimizer``.
+    store : circulateur.results.ResultStore, optional
+        Warm start and destination of every solved design, recorded with the
+        full variable table of its design.
+    version, design, setup, sweep, cores, work_dir, prepare
+        See ``circulateur.doe.run_doe``.
+    callback : callable, optional
+        ``callback(row, objective, error)`` called after each solve.
+
+    Returns
+    -------
+    OptimizationResult
+
+    Raises
+    ------
+    KeyError
+        If the search space or ``fixed`` has a variable the design does not
+        define.
+    ValueError
+        If the search space or ``fixed`` has a variable computed in Python.
+    """
+    optimizer = Optimizer(space, initial, seed=seed)
+    fixed = dict(fixed or {})
+    graph = variable_graph(spec)
+    check_template(template, graph)
+    # Variables refusées avant tout solve : bornes et variables fixes appliquées au graphe
+    for corner in (np.zeros(len(optimizer.space)), np.ones(len(optimizer.space))):
+        design_variables(graph, {**fixed, **optimizer.space.design(corner)})
+    graph.update(**fixed)
+    if store is not None:
+        base = set(graph.affected(optimizer.space.names))
+        optimizer.observe_store(store, isolation_min, insertion_loss_max,
+                                base={name: expression for name, expression in graph.items() if name not in base})
+    cleanup = work_dir is None
+    work_dir = Path(tempfile.mkdtemp(prefix="circulateur_optimize_") if cleanup else work_dir)
+
+    designs, objectives, errors = [], [], []
+    submitted = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker,
+                                 initargs=(version,)) as pool:
+            futures = {}
+
+            def submit():
+                nonlocal submitted
+                candidate = optimizer.ask()
+                row = {**fixed, **candidate}
+                futures[pool.submit(solve_row, template, spec, row, submitted, work_dir, version, design, setup, sweep, cores, prepare)] = (candidate, row)
+                submitted += 1
+
+            def reached():
+                return target is not None and optimizer.best is not None and optimizer.best[1] >= target
+
+            # Un candidat par session libre, tant que la cible n'est pas atteinte
+            while not reached() and len(futures) < workers and submitted < budget:
+                submit()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    candidate, row = futures.pop(future)
+                    value, error = np.nan, ""
+                    try:
+                        _, frequencies, s_parameters = future.result()
+                        value = float(objective(frequencies, s_parameters, isolation_min, insertion_loss_max))
+                        if store is not None:
+                            store.append(design_variables(graph, candidate), frequencies, s_parameters)
+                    except Exception as exception:
+                        error = "{}: {}".format(type(exception).__name__, exception)
+                    optimizer.tell(candidate, None if error else value)
+                    designs.append(row)
+                    objectives.append(value)
+                    errors.append(error)
+                    if callback is not None:
+                        callback(row, value, error)
+                while not reached() and len(futures) < workers and submitted < budget:
+                    submit()
+    finally:
+        if cleanup:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    best, best_objective = optimizer.best or ({}, np.nan)
+    return OptimizationResult(designs=designs, objectives=np.array(objectives), errors=errors,
+                              best={**fixed, **best}, best_objective=best_objective)
+
+
+def _bounds(text):
+    # "nom=bas:haut" -> (nom, (bas, haut))
+    name, _, bounds = text.partition("=")
+    low, _, high = bounds.partition(":")
+    if not name or not low or not high:
+        raise argparse.ArgumentTypeError("Expected name=low:high, got '{}'".format(text))
+    return name.strip(), (low.strip(), high.strip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maximize the isolation bandwidth of a circulator in parallel AEDT sessions.")
+    parser.add_argument("script", help="circulator script describing the template")
+    parser.add_argument("--template", default=None, help="parametrized .aedt project, by default the project of the script")
+    parser.add_argument("--space", type=_bounds, action="append", required=True, help="optimized variable, name=low:high")
+    parser.add_argument("--budget", type=int, default=30, help="number of solves")
+    parser.add_argument("--workers", type=int, default=2, help="number of parallel AEDT sessions")
+    parser.add_argument("--target", default=None, help="bandwidth ending the optimization, e.g. 1.5GHz")
+    parser.add_argument("--isolation-min", type=float, default=20.0, help="isolation defining the band in dB")
+    parser.add_argument("--insertion-loss-max", type=float, default=None, help="insertion loss above which a design scores 0, in dB")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--version", default="2024.2", help="AEDT version")
+    parser.add_argument("--design", default="Circulateur")
+    parser.add_argument("--setup", default="Setup")
+    parser.add_argument("--sweep", default="Sweep")
+    parser.add_argument("--cores", type=int, default=None, help="cores per solve")
+    parser.add_argument("--work-dir", default=None, help="keep the per-solve projects in this directory")
+    parser.add_argument("--store", default=None, help="result store directory, warm start and destination of the solves")
+    args = parser.parse_args(argv)
+
+    def report(row, value, error):
+        variables = ", ".join("{} = {}".format(name, row[name]) for name, _ in args.space)
+        print("  {}: {}".format(variables, error or ("{:.4g} GHz".format(value/1e9) if value > 0 else "no band")))
+
+    spec = load_spec(args.script)
+    template = args.template or project_path(spec, Path(args.script).resolve().parent)
+    result = optimize(template, spec, dict(args.space),
+                      budget=args.budget,
+                      workers=args.workers,
+                      target=None if args.target is None else float(evaluate(args.target)),
+                      isolation_min=args.isolation_min,
+                      insertion_loss_max=args.insertion_loss_max,
+                      seed=args.seed,
+                      store=None if args.store is None else ResultStore(args.store, n_ports=N_PORTS),
+                      version=args.version,
+                      design=args.design,
+                      setup=args.setup,
+                      sweep=args.sweep,
+                      cores=args.cores,
+                      work_dir=args.work_dir,
+                      callback=report)
+    if not result.best:
+        print("No design solved")
+        return 1
+    if result.best_objective <= 0:
+        print("No design reaches {} dB of isolation".format(args.isolation_min))
+        return 1
+    print("Best isolation bandwidth {:.4g} GHz with {}".format(result.best_objective/1e9,
+                                                              ", ".join("{} = {}".format(name, value) for name, value in result.best.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,166 @@
+"""
+Parametric Optimetrics sweep over the circulator design variables
+
+Every dimension of the builder is a design variable, so geometry studies
+need no new project: one parametric setup reusing the existing ``Setup``
+solves all the variations in a single job. Ranges are given per variable:
+
+- ``("900um", "1000um", 5)``: 5 points from start to stop (``LINC``),
+- ``("900um", "1000um", "25um")``: fixed step (``LIN``),
+- ``["900um", "1000um"]``: explicit values.
+
+Several variables give the full grid of their values, listed by
+``variations``. The variations start from a copy of the nominal mesh and are
+spread over the solve tasks.
+"""
+
+import itertools
+import re
+
+import numpy as np
+
+from circulateur.expressions import unit_scale
+from circulateur.variables import Computed
+
+# Nom du setup paramétrique créé par le builder
+PARAMETRIC_SETUP = "Balayage"
+
+_QUANTITY = re.compile(r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([A-Za-z_]*)\s*")
+
+
+def _variations(variable, values):
+    # (start_point, end_point, step, variation_type) de SetupParam.add_variation
+    if isinstance(values, tuple):
+        if len(values) != 3:
+            raise ValueError("Range of '{}' must be (start, stop, count) or (start, stop, step), got {}".format(variable, values))
+        start, stop, step = values
+        return [(start, stop, step, "LinearCount" if isinstance(step, int) else "LinearStep")]
+    return [(value, None, 0, "SingleValue") for value in values]
+
+
+def check_ranges(graph, ranges):
+    """Check that every swept variable can be varied inside HFSS.
+
+    Variables computed in Python (``Computed``) are not re-evaluated by HFSS
+    from one variation to the other, so neither they nor their inputs can be
+    swept.
+
+    Raises
+    ------
+    KeyError
+        If a variable is not defined.
+    ValueError
+        If a variable is computed or feeds a computed variable.
+    """
+    unknown = [variable for variable in ranges if variable not in graph]
+    if unknown:
+        raise KeyError("Unknown variables: {}".format(", ".join(unknown)))
+    for variable in ranges:
+        computed = [name for name in graph.affected([variable]) if isinstance(graph.definition(name), Computed)]
+        if computed:
+            raise ValueError("'{}' cannot be swept in HFSS, it is or feeds variables computed in Python: {}".format(variable, ", ".join(computed)))
+
+
+def _quantity(variable, expression):
+    # (valeur, unité) d'une borne de plage, e.g. "900um" -> (900.0, "um")
+    match = _QUANTITY.fullmatch(str(expression))
+    if match is None:
+        raise ValueError("Range of '{}' must be given by values, got '{}'".format(variable, expression))
+    return float(match.group(1)), match.group(2)
+
+
+def _values(variable, values):
+    # Expressions prises par une variable, dans l'unité du début de plage
+    if not isinstance(values, tuple):
+        return [str(value) for value in values]
+    _variations(variable, values)
+    start, stop, step = values
+    start, unit = _quantity(variable, start)
+    stop = _quantity(variable, stop)
+    stop = stop[0]*unit_scale(stop[1])/unit_scale(unit)
+    if isinstance(step, int):
+        points = np.linspace(start, stop, step)
+    else:
+        step = _quantity(variable, step)
+        step = step[0]*unit_scale(step[1])/unit_scale(unit)
+        # Borne de fin comprise comme dans AEDT, à l'arrondi près
+        points = start + step*np.arange(int(np.floor((stop - start)/step + 1e-9)) + 1)
+    return ["{:.12g}{}".format(point, unit) for point in points]
+
+
+def variations(ranges):
+    """Every variation ``{variable: expression}`` solved for ``ranges``.
+
+    Parameters
+    ----------
+    ranges : dict
+        ``{variable: range}``, see the module documentation.
+
+    Returns
+    -------
+    list of dict
+        Full grid of the variable values, the first variable varying the
+        slowest.
+    """
+    names = list(ranges)
+    return [dict(zip(names, values)) for values in itertools.product(*(_values(name, ranges[name]) for name in names))]
+
+
+def add_parametric_sweep(app, graph, ranges, name=PARAMETRIC_SETUP, setup="Setup", sweep="Sweep", copy_mesh=True):
+    """Create one parametric setup sweeping ``ranges`` on the existing setup.
+
+    Parameters
+    ----------
+    app : ansys.aedt.core.Hfss
+    graph : circulateur.variables.VariableGraph
+        Variables pushed by the builder, used to check the ranges.
+    ranges : dict
+        ``{variable: range}``, see the module documentation.
+    name : str, optional
+        Name of the parametric setup. The default is ``PARAMETRIC_SETUP``.
+    setup, sweep : str, optional
+        Setup and frequency sweep solved for every variation.
+    copy_mesh : bool, optional
+        Whether variations start from the mesh of the nominal design. The
+        default is ``True``.
+
+    Returns
+    -------
+    ansys.aedt.core.modules.design_xploration.SetupParam
+    """
+    check_ranges(graph, ranges)
+    parametric = None
+    for variable, values in ranges.items():
+        for start, stop, step, variation_type in _variations(variable, values):
+            if parametric is None:
+                parametric = app.parametrics.add(variable = variable,
+                                                 start_point = start,
+                                                 end_point = stop,
+                                                 step = step,
+                                                 variation_type = variation_type,
+                                                 solution = "{} : {}".format(setup, sweep),
+                                                 name = name)
+                if not parametric:
+                    raise RuntimeError("Parametric setup '{}' could not be created".format(name))
+            elif not parametric.add_variation(sweep_variable = variable,
+                                              start_point = start,
+                                              end_point = stop,
+                                              step = step,
+                                              variation_type = variation_type):
+                raise RuntimeError("Variation of '{}' could not be added to '{}'".format(variable, name))
+    if parametric is None:
+        raise ValueError("No parameter range given")
+
+    # Maillage initial copié du design nominal, raffiné si la géométrie de la variation l'exige
+    parametric.props["ProdOptiSetupDataV2"]["CopyMesh"] = copy_mesh
+    parametric.props["ProdOptiSetupDataV2"]["SolveWithCopiedMeshOnly"] = False
+    parametric.update()
+    return parametric
+
+
+def solve_parametric(parametric, cores=4, tasks=2):
+    """Solve every variation, distributed over ``tasks`` parallel tasks."""
+    if not parametric.analyze(cores = cores,
+                              tasks = tasks):
+        raise RuntimeError("Solve of parametric setup '{}' failed".format(parametric.name))
+    return parametric
@@ -0,0 +1,126 @@
+"""
+Analytic pre-screening of junction circulators
+
+First-order Bosma / Fay-Comstock model of a ferrite disk junction: the
+circulation frequency is the one where the counter-rotating n=+-1 modes of
+the disk straddle the first zero of J1' (x11 = 1.8412), the loaded quality
+factor follows from the splitting kappa/mu, and the isolation bandwidth comes
+from the single-resonance response of the junction.
+
+It does not replace an HFSS solve (fringing fields, adaptation lines and
+substrate shape are ignored) but it is cheap enough to reject whole regions
+of the design space before a Desktop is opened. Every function broadcasts
+over its inputs.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from circulateur.ferrite import internal_field, polder_tensor
+
+X11 = 1.8412 # Premier zéro de J1'
+C0 = 299792458.0 # m/s
+
+
+class Estimation(NamedTuple):
+    """Analytic estimate of the circulator operating point."""
+    frequency: np.ndarray # Fréquence de circulation en Hz
+    Hint: np.ndarray # Champ interne en Oe
+    mu_eff: np.ndarray # Perméabilité effective à la fréquence de circulation
+    kappa_mu: np.ndarray # Rapport kappa/mu à la fréquence de circulation
+    loaded_q: np.ndarray # Facteur de qualité en charge
+    bandwidth: np.ndarray # Bande passante à isolation_min en Hz
+    isolation: np.ndarray # Isolation minimale sur la bande visée en dB
+    feasible: np.ndarray # Paramètres compatibles avec le cahier des charges
+    reasons: np.ndarray # Premier motif de rejet ("" si accepté)
+
+
+def circulation_frequency(radius, epsilon, Hk, Nz, Mr, dH, f_dH, iterations=20):
+    """Self-consistent circulation frequency of the disk junction in Hz.
+
+    ``radius`` is the junction radius in meters and ``epsilon`` the ferrite
+    permittivity. Since mu_eff depends on frequency, the resonance condition
+    ``k_eff*R = x11`` is solved by fixed-point iteration. Points where mu_eff
+    is not positive (ferrite not propagating) are returned as NaN.
+    """
+    radius, epsilon = np.asarray(radius, dtype=float), np.asarray(epsilon, dtype=float)
+    f_0 = X11*C0/(2*np.pi*radius*np.sqrt(epsilon))
+    freq = f_0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for _ in range(iterations):
+            mu_eff = np.real(polder_tensor(freq, Hk, Nz, Mr, dH, f_dH)[2])
+            freq = np.where(mu_eff > 0, f_0/np.sqrt(mu_eff), np.nan)
+    return freq
+
+
+def isolation_bandwidth(loaded_q, frequency, isolation_min=20.0):
+    """Bandwidth in Hz over which the isolation stays above ``isolation_min`` dB.
+
+    For a lossless symmetric junction the isolation equals the return loss of
+    the single-resonance model, ``|Gamma| = x/sqrt(1+x^2)`` with
+    ``x = 2*Q_L*(f-f0)/f0``.
+    """
+    rho = 10**(-np.asarray(isolation_min, dtype=float)/20)
+    return np.asarray(frequency)*rho/(np.asarray(loaded_q)*np.sqrt(1 - rho**2))
+
+
+def isolation_at(loaded_q, frequency, f):
+    """Isolation in dB of the single-resonance model at frequency ``f``."""
+    x = 2*np.asarray(loaded_q)*(np.asarray(f) - frequency)/frequency
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return -20*np.log10(np.abs(x)/np.sqrt(1 + x**2))
+
+
+def estimate(radius, epsilon, Hk, Nz, Mr, dH, f_dH, f_min, f_max, isolation_min=20.0, bandwidth_min=0.0):
+    """Estimate the operating point and check it against a specification.
+
+    Parameters
+    ----------
+    radius : float or array_like
+        Junction radius in meters.
+    epsilon : float or array_like
+        Relative permittivity of the ferrite.
+    Hk, Nz, Mr, dH, f_dH : float or array_like
+        Ferrite parameters, see :func:`circulateur.ferrite.polder_tensor`.
+    f_min, f_max : float
+        Band in Hz where circulation has to happen.
+    isolation_min : float, optional
+        Isolation in dB defining the bandwidth. The default is ``20``.
+    bandwidth_min : float, optional
+        Required bandwidth in Hz at ``isolation_min``. The default is ``0``.
+
+    Returns
+    -------
+    Estimation
+        Broadcast arrays of the estimate, with ``feasible`` and the first
+        rejection reason for each parameter set.
+    """
+    Hint = internal_field(Hk, Nz, Mr)
+    frequency = circulation_frequency(radius, epsilon, Hk, Nz, Mr, dH, f_dH)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mu, kappa, mu_eff = polder_tensor(frequency, Hk, Nz, Mr, dH, f_dH)
+        kappa_mu = np.abs(np.real(kappa)/np.real(mu))
+        loaded_q = 1/(np.sqrt(3)*kappa_mu)
+    bandwidth = isolation_bandwidth(loaded_q, frequency, isolation_min)
+    # Isolation garantie sur toute la bande demandée autour de la fréquence de circulation
+    isolation = isolation_at(loaded_q, frequency, frequency + bandwidth_min/2)
+
+    shape = np.broadcast_shapes(np.shape(frequency), np.shape(Hint))
+    reasons = np.full(shape, "", dtype=object)
+    # Les motifs sont appliqués du moins prioritaire au plus prioritaire
+    reasons[np.broadcast_to(isolation < isolation_min, shape)] = "bande d'isolation insuffisante"
+    reasons[np.broadcast_to((frequency < f_min) | (frequency > f_max), shape)] = "fréquence de circulation hors bande"
+    reasons[np.broadcast_to(np.isnan(frequency), shape)] = "mu_eff négatif, pas de propagation"
+    reasons[np.broadcast_to(Hint <= 0, shape)] = "ferrite non saturé (Hint <= 0)"
+
+    return Estimation(frequency=frequency,
+                      Hint=Hint,
+                      mu_eff=np.real(mu_eff),
+                      kappa_mu=kappa_mu,
+                      loaded_q=loaded_q,
+                      bandwidth=bandwidth,
+                      isolation=isolation,
+                      feasible=reasons == "",
+                      reasons=reasons)
@@ -0,0 +1,169 @@
+"""
+Timing of the build stages as JSON lines
+
+The builders run in named stages (``desktop``, ``variables``, ``materials``,
+``geometry``, ``ports``, ``setup``, ``reports``, ``parametric``, ``solve``,
+``export``). A ``Profiler`` passed to ``open_project``, ``build``,
+``open_or_update`` or ``solve_and_export`` times each of them and appends
+one JSON line per stage to its log::
+
+    {"time": "2025-03-02T21:14:07", "event": "stage", "stage": "geometry",
+     "design": "Circulateur en Y", "parameters": "3f2a...", "wall_time": 1.82,
+     "calls": 31, "status": "ok"}
+
+``parameters`` is the ``circulateur.results.variables_hash`` of the design
+variables and ``calls`` the number of AEDT calls of the stage: the calls
+recorded by ``circulateur.mock.MockHfss``, or the calls of every AEDT object
+through the gRPC API of PyAEDT once ``count_aedt_calls`` is installed, which
+``open_project`` does, ``null`` otherwise. With ``profile_dir`` every stage is also run under ``cProfile``
+and its statistics are written to ``<design>_<stage>_<n>.prof``, to be
+read with ``pstats`` or snakeviz. From the scripts::
+
+    python Circulateur_Y_Ferrite_substrate.py --non-graphical --profile-log stages.jsonl --cprofile profiles
+"""
+
+import cProfile
+import datetime
+import functools
+import json
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# Appels gRPC d'AEDT du processus, None tant que count_aedt_calls n'est pas installé
+_aedt_calls = None
+
+
+def count_aedt_calls():
+    """Count the calls of every AEDT object made through the gRPC API of PyAEDT.
+
+    ``AedtObjWrapper.__Invoke__``, through which every method call and
+    property access of the desktop, project, design, editor and module
+    objects goes, is wrapped once per process. The count covers every
+    session of the process.
+
+    Returns
+    -------
+    bool
+        Whether the calls are counted, ``False`` without the gRPC API.
+    """
+    global _aedt_calls
+    try:
+        from ansys.aedt.core.internal.grpc_plugin_dll_class import AedtObjWrapper
+    except ImportError:
+        return False
+    invoke = AedtObjWrapper.__Invoke__
+    if getattr(invoke, "counted", False):
+        return True
+
+    @functools.wraps(invoke)
+    def counted_invoke(self, funcName, argv):
+        global _aedt_calls
+        _aedt_calls += 1
+        return invoke(self, funcName, argv)
+
+    counted_invoke.counted = True
+    _aedt_calls = _aedt_calls or 0
+    AedtObjWrapper.__Invoke__ = counted_invoke
+    return True
+
+
+def _call_log(app):
+    # CallLog de circulateur.mock, reconnu à sa liste d'appels
+    calls = getattr(getattr(app, "log", None), "calls", None)
+    return calls if isinstance(calls, list) else None
+
+
+def call_count(app):
+    """Number of AEDT calls made so far by ``app``, ``None`` if they are not recorded.
+
+    The calls recorded by the mock are used first, then those counted by
+    ``count_aedt_calls``.
+    """
+    calls = _call_log(app)
+    return _aedt_calls if calls is None else len(calls)
+
+
+class Profiler:
+    """Stage timer writing JSON lines.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path, optional
+        JSON lines file, appended to. The default is ``None``, which only
+        keeps the records in ``records``.
+    profile_dir : str or pathlib.Path, optional
+        Directory receiving one cProfile statistics file per stage. The
+        default is ``None``, without cProfile.
+    **context
+        Fields written in every record, e.g. ``design``.
+    """
+
+    def __init__(self, path=None, profile_dir=None, **context):
+        self.path = None if path is None else Path(path)
+        self.profile_dir = None if profile_dir is None else Path(profile_dir)
+        self.context = {"design": None, "parameters": None, **context}
+        self.records = []
+        self.app = None
+
+    def write(self, event, **fields):
+        """Append a record ``{"time", "event", **context, **fields}``."""
+        record = {"time": datetime.datetime.now().isoformat(timespec="seconds"), "event": event, **self.context, **fields}
+        self.records.append(record)
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as log:
+                log.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        return record
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as stage ``name``, an exception being logged then re-raised.
+
+        The AEDT calls are counted on ``self.app``, which a stage opening
+        the project may set.
+        """
+        app = self.app
+        calls = call_count(app)
+        profile = cProfile.Profile() if self.profile_dir is not None else None
+        status, error = "ok", None
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield self
+        except BaseException as exception:
+            status, error = "error", "{}: {}".format(type(exception).__name__, exception)
+            raise
+        finally:
+            if profile is not None:
+                profile.disable()
+            wall_time = time.perf_counter() - start
+            count = call_count(self.app)
+            if self.app is not app and _call_log(self.app) is not None:
+                # Application ouverte par l'étape : son journal commence avec elle
+                calls = 0
+            fields = {"stage": name, "wall_time": wall_time, "calls": None if count is None else count - (calls or 0), "status": status}
+            if error is not None:
+                fields["error"] = error
+            if profile is not None:
+                fields["profile"] = str(self._dump(profile, name))
+            self.write("stage", **fields)
+
+    def _dump(self, profile, name):
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        design = re.sub(r"\W+", "_", str(self.context.get("design") or "design")).strip("_")
+        index = sum(1 for record in self.records if record.get("stage") == name)
+        path = self.profile_dir / "{}_{}_{}.prof".format(design, name, index)
+        profile.dump_stats(path)
+        return path
+
+    def timings(self):
+        """``{stage: total wall time in s}`` of the records so far."""
+        timings = {}
+        for record in self.records:
+            if record["event"] == "stage":
+                timings[record["stage"]] = timings.get(record["stage"], 0.0) + record["wall_time"]
+        return timings
@@ -0,0 +1,164 @@
+"""
+Update mode: reuse an existing project instead of rebuilding it
+
+Every geometry, port and material of the builder is parametrized by design
+variables, so two specs that only differ by variable values give the same
+HFSS project up to those values. ``structure_hash`` fingerprints everything
+else (topology, variable names, datasets, setup, parametric sweep, reports)
+and is stored with the pushed variable expressions in a
+``<name>.circulateur.json`` file next to the project.
+
+``open_or_update`` reopens ``Designs/<name>/<name>.aedt`` when its stored hash
+matches the spec and only pushes the variables whose expression changed.
+Otherwise the old project is moved aside and the circulator is built from
+scratch. The adaptive settings of the setup (``ADAPTIVE_FIELDS``), which
+``circulateur.adaptive`` tunes per design, are not part of the structure
+and are updated in place.
+"""
+
+import hashlib
+import json
+import time
+from dataclasses import asdict, fields, is_dataclass
+from typing import NamedTuple
+
+from circulateur.builder import build, configure_adaptive, open_project, project_path, variable_graph
+from circulateur.profiling import Profiler
+from circulateur.results import variables_hash
+from circulateur.topologies import TOPOLOGIES
+from circulateur.variables import Computed, VariableTable
+
+SIDECAR_SUFFIX = ".circulateur.json"
+
+# Réglages du setup adaptatif modifiés sans reconstruire le projet
+ADAPTIVE_FIELDS = ("max_passes", "max_delta_S", "percent_refinement", "lambda_target")
+
+
+class ProjectState(NamedTuple):
+    """Project opened by ``open_or_update``."""
+    app: object # Application Hfss
+    variables: object # VariableGraph de la spec
+    rebuilt: bool # True si le circulateur a été reconstruit
+    pushed: list # Variables envoyées à AEDT
+
+
+def _canonical(value):
+    # Représentation JSON stable des données de topologie, les fonctions par leur nom qualifié
+    if is_dataclass(value):
+        return [type(value).__name__, {field.name: _canonical(getattr(value, field.name)) for field in fields(value)}]
+    if isinstance(value, Computed):
+        return ["Computed", list(value.inputs), _canonical(value.function)]
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if callable(value):
+        return "{}.{}".format(value.__module__, value.__qualname__)
+    return value
+
+
+def structure_hash(spec, reports=True, graph=None):
+    """Fingerprint of everything in the project that is not a variable value."""
+    graph = graph or variable_graph(spec)
+    structure = {"design": spec.design,
+                 "topology": _canonical(TOPOLOGIES[spec.topology]),
+                 "variables": list(graph),
+                 "datasets": {name: hashlib.sha256(dataset.x.tobytes() + dataset.y.tobytes()).hexdigest()
+                              for name, dataset in graph.datasets.items()},
+                 "setup": {name: value for name, value in _canonical(spec.setup)[1].items() if name not in ADAPTIVE_FIELDS},
+                 "parametric": _canonical(spec.parametric),
+                 "reports": reports}
+    return hashlib.sha256(json.dumps(structure, sort_keys=True).encode()).hexdigest()
+
+
+def sidecar_path(spec, directory):
+    project = project_path(spec, directory)
+    return project.with_name(project.stem + SIDECAR_SUFFIX)
+
+
+def read_sidecar(spec, directory):
+    """Stored ``{"structure": hash, "variables": {name: expression}, "adaptive": {field: value}}``, or ``None``."""
+    try:
+        with open(sidecar_path(spec, directory)) as sidecar:
+            return json.load(sidecar)
+    except (OSError, ValueError):
+        return None
+
+
+def _adaptive(spec):
+    return {name: value for name, value in asdict(spec.setup).items() if name in ADAPTIVE_FIELDS}
+
+
+def _write_sidecar(spec, directory, structure, graph):
+    with open(sidecar_path(spec, directory), "w") as sidecar:
+        json.dump({"structure": structure, "variables": dict(graph.items()), "adaptive": _adaptive(spec)}, sidecar, indent=1)
+
+
+def _move_aside(spec, directory):
+    # Un projet de structure différente est gardé sous un autre nom plutôt qu'écrasé
+    project = project_path(spec, directory)
+    if project.with_name(project.name + ".lock").exists():
+        raise RuntimeError("{} is open in AEDT, close it before rebuilding".format(project))
+    suffix = "_" + time.strftime("%Y%m%d_%H%M%S")
+    for path in (project, project.with_name(project.stem + ".aedtresults")):
+        if path.exists():
+            path.rename(path.with_name(path.stem + suffix + path.suffix))
+    sidecar_path(spec, directory).unlink(missing_ok=True)
+
+
+def open_or_update(spec, directory, version="2024.2", non_graphical=False, new_desktop=False, reports=None, profiler=None):
+    """Open the spec's project, updating its variables or rebuilding it.
+
+    Parameters
+    ----------
+    spec : circulateur.spec.CirculatorSpec
+    directory : str or pathlib.Path
+        Directory containing ``Designs/<name>/<name>.aedt``.
+    version, non_graphical : optional
+        See ``circulateur.builder.open_project``.
+    new_desktop : bool, optional
+        Whether to start a new AEDT session. The default is ``False``, which
+        attaches to a running session, where the project may already be open.
+    reports : bool, optional
+        Whether the project has the S-parameter reports. The default is
+        ``None``, which creates them in graphical sessions only.
+    profiler : circulateur.profiling.Profiler, optional
+        Timer of the stages of the opening and of the update or rebuild.
+
+    Returns
+    -------
+    ProjectState
+    """
+    if reports is None:
+        reports = not non_graphical
+    graph = variable_graph(spec)
+    structure = structure_hash(spec, reports, graph)
+    stored = read_sidecar(spec, directory)
+    current = (stored is not None and stored.get("structure") == structure
+               and project_path(spec, directory).exists())
+    if not current and project_path(spec, directory).exists():
+        _move_aside(spec, directory)
+
+    profiler = profiler if profiler is not None else Profiler()
+    app = open_project(spec, directory, version=version, non_graphical=non_graphical, new_desktop=new_desktop, profiler=profiler)
+    if current:
+        with profiler.stage("variables"):
+            changed = VariableTable({name: expression for name, expression in graph.items()
+                                     if stored["variables"].get(name) != expression})
+            pushed = changed.push(app, set(graph) | set(graph.datasets))
+            profiler.context["parameters"] = variables_hash(dict(graph.items()))
+        adaptive = stored.get("adaptive", {})
+        if adaptive != _adaptive(spec):
+            with profiler.stage("setup"):
+                setup = app.get_setup("Setup")
+                configure_adaptive(setup, spec.setup)
+                if spec.setup.lambda_target is None and adaptive.get("lambda_target") is not None:
+                    # Retour à la cible lambda par défaut d'AEDT
+                    setup.update({"SetLambdaTarget": False})
+    else:
+        graph = build(app, spec, reports=reports, profiler=profiler)
+        pushed = list(graph)
+    with profiler.stage("save"):
+        app.save_project()
+    _write_sidecar(spec, directory, structure, graph)
+    return ProjectState(app=app, variables=graph, rebuilt=not current, pushed=pushed)
@@ -0,0 +1,92 @@
+"""
+S-parameter report templates of the circulators
+
+All the reports of a project are declared once as ``ReportTemplate`` and
+created in a single pass by ``create_reports``: one ``CreateReport`` per
+report, then the legend and axis settings shared by several reports are
+changed for all of them at once, with one ``ChangeProperty`` call per
+distinct setting instead of a rename, a legend edit and an axis edit per
+report. Reports are only useful in the GUI, ``build`` skips them in
+non-graphical sessions.
+"""
+
+from typing import NamedTuple
+
+
+class ReportTemplate(NamedTuple):
+    """Rectangular plot of S-parameters in dB."""
+    name: str
+    expressions: tuple
+    show_solution_name: bool = False # Nom de la solution dans la légende
+    y_min: str = "-30"
+    y_max: str = "0"
+    legend_font_size: int = 10
+
+
+REPORTS = [ReportTemplate("Tous les ports", ("dB(S(1,1))", "dB(S(2,1))", "dB(S(3,1))",
+                                             "dB(S(2,2))", "dB(S(3,2))", "dB(S(1,2))",
+                                             "dB(S(3,3))", "dB(S(1,3))", "dB(S(2,3))"), show_solution_name = True),
+           ReportTemplate("Port 1", ("db(S11)", "db(S21)", "db(S31)")),
+           ReportTemplate("Port 2", ("dB(S(2,2))", "dB(S(3,2))", "dB(S(1,2))")),
+           ReportTemplate("Port 3", ("dB(S(3,3))", "dB(S(1,3))", "dB(S(2,3))")),
+           ReportTemplate("Adaptation", ("dB(S(1,1))", "dB(S(2,2))", "dB(S(3,3))")),
+           ReportTemplate("Isolation", ("dB(S(2,1))", "dB(S(3,2))", "dB(S(1,3))")),
+           ReportTemplate("Transmission", ("dB(S(3,1))", "dB(S(1,2))", "dB(S(2,3))"))]
+
+
+def _shared_properties(template):
+    # (onglet, serveur de propriétés, propriétés modifiées) de chaque réglage du rapport
+    legend = (("NAME:Show Solution Name", "Value:=", template.show_solution_name),
+              ("NAME:Show Trace Name", "Value:=", False),
+              ("NAME:Show Variation Key", "Value:=", True))
+    scaling = (("NAME:Axis Scaling", "Value:=", "Linear"),
+               ("NAME:Min", "Value:=", template.y_min),
+               ("NAME:Max", "Value:=", template.y_max),
+               ("NAME:Minor Tick Divs", "Value:=", "5"))
+    return [("legend", "legend", legend), ("Scaling", "AxisY1", scaling)]
+
+
+def change_properties(app, groups):
+    """Apply ``{(tab, server, properties): [report names]}`` with one call per group."""
+    for (tab, server, properties), names in groups.items():
+        app.post.oreportsetup.ChangeProperty(["NAME:AllTabs",
+                                              ["NAME:" + tab,
+                                               ["NAME:PropServers"] + ["{}:{}".format(name, server) for name in names],
+                                               ["NAME:ChangedProps"] + [list(change) for change in properties]]])
+
+
+def create_reports(app, templates=REPORTS, setup="Setup : Sweep"):
+    """Create the reports of ``templates`` in one pass.
+
+    Parameters
+    ----------
+    app : ansys.aedt.core.Hfss
+    templates : list of ReportTemplate, optional
+        The default is ``REPORTS``.
+    setup : str, optional
+        Solution plotted. The default is ``"Setup : Sweep"``.
+
+    Returns
+    -------
+    dict
+        ``{name: report}`` of the created reports.
+    """
+    reports = {}
+    groups = {}
+    for template in templates:
+        report = app.post.reports_by_category.standard(expressions = list(template.expressions),
+                                                       setup = setup)
+        if not report.create(template.name):
+            raise RuntimeError("Report '{}' could not be created".format(template.name))
+        reports[template.name] = report
+        for setting in _shared_properties(template):
+            groups.setdefault(setting, []).append(template.name)
+    change_properties(app, groups)
+
+    # La taille de police de la légende n'est accessible que par les propriétés de l'objet rapport
+    for template in templates:
+        if template.legend_font_size is not None:
+            legend = app.get_oo_object(app.post.oreportsetup, "{}/Legend".format(template.name))
+            legend.SetPropValue("Font/Height", template.legend_font_size)
+            legend.SetPropValue("Header Row Font/Height", template.legend_font_size)
+    return reports
@@ -0,0 +1,249 @@
+"""
+Append-only store of solved S-parameter sweeps
+
+Every solved variant is appended to a directory that can be memory-mapped
+instead of re-exported from AEDT:
+
+- ``frequencies.npy``: frequency grid of the store in Hz, shared by all records,
+- ``s_parameters.bin``: raw ``complex128`` records of shape
+  ``(n_freq, n_ports, n_ports)``, one after the other,
+- ``index.jsonl``: one line per record with the design variables
+  ``{name: expression}`` and their hash.
+
+``ResultStore.s_parameters`` maps the records as a read-only
+``(n_records, n_freq, n_ports, n_ports)`` array, so frequency ranges and
+port pairs are views of the file::
+
+    store = ResultStore("results/Circulateur en Y")
+    s21 = store.select(frequency=(17e9, 19e9), port=(2, 1))
+    s21_at_950um = s21[store.rows(rayon_jonction="950um")]
+
+A single process appends to a store at a time. A record only counts once its
+index line is written, so an interrupted append leaves the store readable.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from circulateur.expressions import evaluate, unit_scale
+
+DTYPE = np.dtype(np.complex128)
+
+
+def variables_hash(variables):
+    """Key of a variant: SHA-256 of its ``{name: expression}`` table."""
+    canonical = json.dumps({str(name): str(expression) for name, expression in variables.items()}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def solution_s_parameters(app, setup="Setup", sweep="Sweep", n_ports=3, variation=None):
+    """Frequencies in Hz and ``(n_freq, n, n)`` S-parameters of a solved sweep.
+
+    ``variation`` gives the ``{variable: expression}`` of a solved parametric
+    variation, the other variables keeping their nominal values. The
+    default is ``None``, the nominal design.
+
+    Raises
+    ------
+    RuntimeError
+        If the sweep has no solution data.
+    """
+    expressions = ["S({},{})".format(i, j) for i in range(1, n_ports + 1) for j in range(1, n_ports + 1)]
+    variations = None
+    if variation:
+        variations = {name: [expression] for name, expression in app.available_variations.nominal_values.items()}
+        variations.update({name: [str(expression)] for name, expression in variation.items()})
+        variations["Freq"] = ["All"]
+    data = app.post.get_solution_data(expressions=expressions,
+                                      setup_sweep_name="{} : {}".format(setup, sweep),
+                                      variations=variations)
+    if not data:
+        raise RuntimeError("No solution data for '{} : {}'{}".format(setup, sweep, " at {}".format(variation) if variation else ""))
+    frequencies = None
+    s_parameters = None
+    for k, expression in enumerate(expressions):
+        freq, real = data.get_expression_data(expression, formula="real")
+        _, imag = data.get_expression_data(expression, formula="imag")
+        if s_parameters is None:
+            frequencies = np.asarray(freq, dtype=float)*unit_scale(data.units_sweeps.get(data.primary_sweep) or "Hz")
+            s_parameters = np.empty((len(frequencies), n_ports, n_ports), dtype=complex)
+        s_parameters[:, k // n_ports, k % n_ports] = np.asarray(real) + 1j*np.asarray(imag)
+    return frequencies, s_parameters
+
+
+def _si(expression):
+    # Valeur SI d'une expression simple, None si elle dépend d'autres variables
+    try:
+        return float(evaluate(expression))
+    except (ValueError, KeyError, TypeError, SyntaxError, ArithmeticError):
+        return None
+
+
+class ResultStore:
+    """Directory of S-parameter sweeps keyed by design-variable hash.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        Store directory, created on the first append.
+    n_ports : int, optional
+        Number of ports of a new store. The default is ``3``.
+    """
+
+    def __init__(self, path, n_ports=3):
+        self.path = Path(path)
+        self.n_ports = n_ports
+        self._frequencies = None
+        self._records = [] # Lignes de index.jsonl
+        self._rows = {} # Clé -> dernière ligne de la clé
+        self._map = None
+        self._index_size = 0 # Octets de index.jsonl couverts par des enregistrements complets
+        if (self.path / "frequencies.npy").exists():
+            self._frequencies = np.load(self.path / "frequencies.npy")
+            self.n_ports = json.loads((self.path / "store.json").read_text())["n_ports"]
+            self._read_index()
+
+    @property
+    def _record_size(self):
+        return len(self._frequencies)*self.n_ports**2*DTYPE.itemsize
+
+    def _read_index(self):
+        # Les lignes sans données complètes (ajout interrompu) sont ignorées
+        size = os.path.getsize(self.path / "s_parameters.bin") if (self.path / "s_parameters.bin").exists() else 0
+        n_records = size // self._record_size if self._record_size else 0
+        with open(self.path / "index.jsonl", "rb") as index:
+            for line in index:
+                if len(self._records) == n_records or not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._rows[record["key"]] = len(self._records)
+                self._records.append(record)
+                self._index_size += len(line)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, variables):
+        return (variables if isinstance(variables, str) else variables_hash(variables)) in self._rows
+
+    @property
+    def frequencies(self):
+        """Frequency grid in Hz."""
+        return np.empty(0) if self._frequencies is None else self._frequencies
+
+    @property
+    def variables(self):
+        """``{name: expression}`` of every record."""
+        return [record["variables"] for record in self._records]
+
+    @property
+    def s_parameters(self):
+        """Read-only memory map of shape ``(n_records, n_freq, n_ports, n_ports)``."""
+        shape = (len(self), len(self.frequencies), self.n_ports, self.n_ports)
+        if not len(self) or not shape[1]:
+            return np.empty(shape, dtype=DTYPE)
+        if self._map is None or len(self._map) != len(self):
+            self._map = np.memmap(self.path / "s_parameters.bin", dtype=DTYPE, mode="r", shape=shape)
+        return self._map
+
+    def append(self, variables, frequencies, s_parameters):
+        """Append one solved variant.
+
+        Parameters
+        ----------
+        variables : dict
+            ``{name: expression}`` of the variant.
+        frequencies : numpy.ndarray
+            Frequencies in Hz, identical to the grid of the store.
+        s_parameters : numpy.ndarray
+            Complex array of shape ``(n_freq, n_ports, n_ports)``.
+
+        Returns
+        -------
+        int
+            Row of the record. A variant appended again supersedes the
+            previous record of the same key.
+        """
+        frequencies = np.asarray(frequencies, dtype=float)
+        s_parameters = np.ascontiguousarray(s_parameters, dtype=DTYPE)
+        if self._frequencies is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            np.save(self.path / "frequencies.npy", frequencies)
+            (self.path / "store.json").write_text(json.dumps({"n_ports": self.n_ports, "dtype": DTYPE.str}))
+            self._frequencies = frequencies
+        elif len(frequencies) != len(self._frequencies) or not np.allclose(frequencies, self._frequencies):
+            raise ValueError("Frequency grid differs from the grid of {}".format(self.path))
+        if s_parameters.shape != (len(frequencies), self.n_ports, self.n_ports):
+            raise ValueError("Expected S-parameters of shape {}, got {}".format((len(frequencies), self.n_ports, self.n_ports), s_parameters.shape))
+
+        # Données d'abord, puis la ligne d'index qui valide l'enregistrement
+        data = self.path / "s_parameters.bin"
+        with open(data, "ab") as output:
+            output.truncate(len(self)*self._record_size)
+            output.write(s_parameters.tobytes())
+        record = {"key": variables_hash(variables), "variables": {str(name): str(expression) for name, expression in variables.items()}}
+        line = (json.dumps(record) + "\n").encode()
+        with open(self.path / "index.jsonl", "ab") as index:
+            index.truncate(self._index_size)
+            index.write(line)
+        self._index_size += len(line)
+        self._rows[record["key"]] = len(self._records)
+        self._records.append(record)
+        return len(self._records) - 1
+
+    def get(self, variables):
+        """S-parameters ``(n_freq, n_ports, n_ports)`` of a variant, a view of the store."""
+        key = variables if isinstance(variables, str) else variables_hash(variables)
+        if key not in self._rows:
+            raise KeyError("No record for {}".format(variables))
+        return self.s_parameters[self._rows[key]]
+
+    def rows(self, **conditions):
+        """Rows whose variables match ``conditions``.
+
+        Values are compared in SI units when both sides are plain values
+        (``"0.95mm"`` matches ``"950um"``), as strings otherwise. Only the
+        latest record of each key is returned.
+        """
+        rows = []
+        for row in sorted(self._rows.values()):
+            variables = self._records[row]["variables"]
+            for name, expected in conditions.items():
+                if name not in variables:
+                    break
+                value, target = _si(variables[name]), _si(str(expected))
+                if not np.isclose(value, target, rtol=1e-9, atol=0) if value is not None and target is not None else variables[name] != str(expected):
+                    break
+            else:
+                rows.append(row)
+        return np.array(rows, dtype=int)
+
+    def select(self, frequency=None, port=None):
+        """View of the records over a frequency range and/or a port pair.
+
+        Parameters
+        ----------
+        frequency : tuple, optional
+            ``(f_min, f_max)`` in Hz, bounds included.
+        port : tuple, optional
+            ``(i, j)`` 1-based port pair, e.g. ``(2, 1)`` for S21.
+
+        Returns
+        -------
+        numpy.ndarray
+            ``(n_records, n_freq[, n_ports, n_ports])`` view of the memory map.
+        """
+        frequencies = slice(None)
+        if frequency is not None:
+            start, stop = np.searchsorted(self.frequencies, frequency[0], "left"), np.searchsorted(self.frequencies, frequency[1], "right")
+            frequencies = slice(start, stop)
+        if port is None:
+            return self.s_parameters[:, frequencies]
+        return self.s_parameters[:, frequencies, port[0] - 1, port[1] - 1]
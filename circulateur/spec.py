@@ -0,0 +1,141 @@
+"""
+Declarative description of a circulator design
+
+A ``CirculatorSpec`` gathers everything the builder needs to generate an
+HFSS project: the topology (substrate shape and access lines), the design
+dimensions, the ferrite and dielectric properties and the analysis setup.
+Geometry is described with the primitives below, whose arguments are HFSS
+expressions over the design variables, so one engine can emit the modeler
+calls for every topology.
+"""
+
+from dataclasses import dataclass, field, replace
+from typing import Callable, Optional
+
+
+@dataclass
+class Box:
+    """Box primitive, ``modeler.create_box``."""
+    name: str
+    origin: list
+    sizes: list
+    material: str
+    rotate: Optional[str] = None # Rotation autour de Z après création
+    color: Optional[tuple] = None
+    material_appearance: bool = False
+
+
+@dataclass
+class Cylinder:
+    """Cylinder along Z, or regular prism when ``num_sides`` is set."""
+    name: str
+    origin: list
+    radius: str
+    height: str
+    material: str
+    num_sides: int = 0
+    rotate: Optional[str] = None
+    color: Optional[tuple] = None
+    material_appearance: bool = False
+
+
+@dataclass
+class BentLine:
+    """Equation-based surface in (_u, _v), thickened into a bent strip."""
+    name: str
+    x_uv: str
+    y_uv: str
+    z_uv: str
+    u_start: str
+    u_end: str
+    v_start: str
+    v_end: str
+    thickness: str
+    material: str
+
+
+@dataclass
+class Port:
+    """Wave port on a face of a PEC box."""
+    name: str
+    box: Box
+    face: str # Attribut de l'objet portant la face, e.g. "bottom_face_x"
+    rotate: Optional[str] = None # Rotation de la boîte après la création du port
+
+
+@dataclass
+class Topology:
+    """Substrate shape and access-line layout of a circulator."""
+    name: str
+    variables: dict # Variables dérivées des dimensions, dans l'ordre de définition
+    substrate: list # Primitives du substrat
+    cavity: tuple # (blank, tool) soustraits en gardant les originaux
+    metallisation: list # Primitives unies en une seule métallisation, la première donne son nom
+    ports: list
+    demagnetisation: str # "aharoni" (plaque rectangulaire) ou "chen" (disque, Nzm_Chen.tab)
+    taper: bool = False # Cadre de ferrite à perméabilité effective autour du substrat
+    # Dimensions (longueur, largeur, hauteur) en um de la plaque pour le modèle de Aharoni
+    demagnetisation_dimensions: Optional[Callable] = None
+    # Variables calculées en Python (circulateur.variables.Computed) à partir des valeurs des autres variables
+    computed_variables: Optional[dict] = None
+
+
+@dataclass
+class FerriteSpec:
+    """Ferrite material and magnetic properties."""
+    epsilon: str = "20"
+    tand: str = "0.005"
+    Hk: str = "18000" # en Oe
+    Mr: str = "3500" # en Gauss
+    delta_H: str = "200Oe"
+    freq_delta_H: str = "40GHz"
+
+
+@dataclass
+class DielectricSpec:
+    """Dielectric substrate around a ferrite insert."""
+    epsilon: str = "21"
+    tand: str = "0.003"
+
+
+@dataclass
+class SetupSpec:
+    """Adaptive setup and frequency sweep."""
+    frequency: str = "18GHz"
+    sweep_start: str = "16GHz"
+    sweep_stop: str = "20GHz"
+    sweep_step: str = "0.05GHz"
+    max_passes: int = 30
+    max_delta_S: float = 0.02
+    percent_refinement: int = 20
+    lambda_target: Optional[float] = None # Cible en longueurs d'onde du maillage initial, None pour celle d'AEDT
+
+
+@dataclass
+class CirculatorSpec:
+    """Complete description of one circulator project."""
+    name: str # Nom du projet, e.g. "Circulateur en Y"
+    topology: str # Clé de circulateur.topologies.TOPOLOGIES
+    dimensions: dict # Variables de design des dimensions, dans l'ordre de définition
+    ferrite: FerriteSpec = field(default_factory=FerriteSpec)
+    setup: SetupSpec = field(default_factory=SetupSpec)
+    dielectric: Optional[DielectricSpec] = None
+    design: str = "Circulateur"
+    nzm_chen_path: Optional[str] = None # Dataset de Chen, par défaut celui à côté des scripts
+    # {variable: plage} balayées dans un seul setup paramétrique, voir circulateur.parametric
+    parametric: dict = field(default_factory=dict)
+
+    def variant(self, name=None, **values):
+        """Copy of the spec with some dimensions or ferrite properties replaced.
+
+        Keyword names are dimension names (``rayon_jonction="1000um"``) or
+        ``FerriteSpec`` fields (``Hk="17000"``).
+        """
+        ferrite_fields = {key: values.pop(key) for key in list(values) if key in FerriteSpec.__dataclass_fields__}
+        unknown = [key for key in values if key not in self.dimensions]
+        if unknown:
+            raise KeyError("Unknown dimensions for '{}': {}".format(self.name, ", ".join(unknown)))
+        return replace(self,
+                       name=name or self.name,
+                       dimensions={**self.dimensions, **values},
+                       ferrite=replace(self.ferrite, **ferrite_fields))
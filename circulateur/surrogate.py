@@ -0,0 +1,247 @@
+"""
+Gaussian-process surrogate of the S-parameters of solved variants
+
+Trained on the records of a ``circulateur.results.ResultStore``, the
+surrogate interpolates the 3x3 S-parameters over a few design variables
+(by default ``rayon_jonction``, ``longueur_adaptation``,
+``largeur_adaptation`` and ``Hint``) at every frequency of the store. The
+variables of each record are evaluated locally, so derived variables such
+as ``Hint`` can be used as inputs.
+
+All the real and imaginary parts share one Matern 5/2 kernel
+(``GaussianProcess``), whose length scales and noise are fitted on the log
+marginal likelihood: training factorizes a single ``n x n`` matrix and a
+prediction is one kernel row and one matrix product, with a standard
+deviation for every S-parameter::
+
+    surrogate = Surrogate.fit(ResultStore("Designs/Circulateur en Y/Resultats"))
+    s, std = surrogate.predict({"rayon_jonction": "1000um", "longueur_adaptation": "500um",
+                                "largeur_adaptation": "48um", "Hint": 12000})
+    best = surrogate.screen(candidates, 5)
+
+``screen`` ranks candidate designs on the predicted isolation bandwidth so
+that only the most promising ones are solved in HFSS.
+"""
+
+import numpy as np
+
+from circulateur.expressions import Evaluator, references
+from circulateur.metrics import figures_of_merit, ranking
+from circulateur.nzm_chen import load_dataset
+
+INPUTS = ("rayon_jonction", "longueur_adaptation", "largeur_adaptation", "Hint")
+
+
+def _matern52(a, b, length_scales):
+    # Noyau de Matern 5/2 entre les lignes de a et de b, entrées normalisées
+    distance = np.sqrt(np.maximum(np.sum(((a[:, None, :] - b[None, :, :])/length_scales)**2, axis=-1), 0))
+    scaled = np.sqrt(5)*distance
+    return (1 + scaled + scaled**2/3)*np.exp(-scaled)
+
+
+def training_set(store, inputs=INPUTS, datasets=None, skip_missing=False, conditions=None):
+    """Inputs in SI units ``(n, d)`` and S-parameters of the latest record of every variant.
+
+    Parameters
+    ----------
+    store : circulateur.results.ResultStore
+    inputs : tuple of str, optional
+        Variables used as inputs, evaluated from the variables of each record.
+    datasets : dict, optional
+        Datasets of the ``pwl`` expressions. The default loads ``Nzm_Chen``
+        when a record uses it.
+    skip_missing : bool, optional
+        Whether records that do not define every input are left out. The
+        default is ``False``, which raises a ``KeyError``.
+    conditions : dict, optional
+        ``{name: expression}`` the records must match, see
+        ``ResultStore.rows``. The default keeps every record.
+    """
+    datasets = dict(datasets or {})
+    rows = []
+    X = []
+    for row in store.rows(**(conditions or {})):
+        variables = store.variables[row]
+        if "Nzm_Chen" not in datasets and any("Nzm_Chen" in references(expression) for expression in variables.values()):
+            datasets["Nzm_Chen"] = load_dataset()
+        values = Evaluator(variables, datasets).evaluate()
+        missing = [name for name in inputs if name not in values]
+        if missing:
+            if skip_missing:
+                continue
+            raise KeyError("Record {} has no variable {}".format(row, ", ".join(missing)))
+        rows.append(row)
+        X.append([float(values[name]) for name in inputs])
+    return np.array(X, dtype=float).reshape(len(rows), len(inputs)), store.frequencies, np.asarray(store.s_parameters[rows])
+
+
+class GaussianProcess:
+    """Gaussian process regression with one kernel shared by all the outputs.
+
+    Parameters
+    ----------
+    X : numpy.ndarray
+        Training inputs, ``(n, d)``.
+    Y : numpy.ndarray
+        Training outputs, ``(n, m)``, each column centered and scaled.
+    length_scales : numpy.ndarray, optional
+        Length scales relative to the range of each input. The default is
+        ``None``, which fits them with the noise on the log marginal
+        likelihood.
+    noise : float, optional
+        Noise variance relative to the output variance.
+    bounds : tuple of numpy.ndarray, optional
+        ``(lower, upper)`` range of the inputs. The default is the range of
+        ``X``.
+    """
+
+    def __init__(self, X, Y, length_scales=None, noise=1e-6, bounds=None):
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        Y = np.asarray(Y, dtype=float).reshape(len(X), -1)
+        if len(X) < 2:
+            raise ValueError("At least 2 training points are needed, got {}".format(len(X)))
+
+        # Entrées ramenées à [0, 1], sorties centrées réduites par colonne
+        lower, upper = bounds if bounds is not None else (X.min(axis=0), X.max(axis=0))
+        self._x_offset = np.asarray(lower, dtype=float)
+        self._x_scale = np.where(np.asarray(upper) - lower > 0, np.asarray(upper) - lower, 1.0)
+        self._X = (X - self._x_offset)/self._x_scale
+        self._y_mean = Y.mean(axis=0)
+        self._y_scale = np.where(Y.std(axis=0) > 0, Y.std(axis=0), 1.0)
+        self._Y = (Y - self._y_mean)/self._y_scale
+
+        if length_scales is None:
+            length_scales, noise = self._fit_hyperparameters(noise)
+        self.length_scales = np.broadcast_to(np.asarray(length_scales, dtype=float), (X.shape[1],)).copy()
+        self.noise = float(noise)
+        self._factorize()
+
+    def _log_likelihood(self, length_scales, noise):
+        # Vraisemblance marginale partagée par toutes les colonnes de sortie
+        K = _matern52(self._X, self._X, length_scales) + noise*np.eye(len(self._X))
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return -np.inf
+        alpha = np.linalg.solve(L, self._Y)
+        return -0.5*np.sum(alpha**2) - self._Y.shape[1]*np.sum(np.log(np.diag(L)))
+
+    def _fit_hyperparameters(self, noise, rounds=30):
+        # Recherche par coordonnées sur les logarithmes, pas divisé par deux quand rien ne s'améliore
+        parameters = np.log(np.append(np.full(self._X.shape[1], 0.5), noise))
+        best = self._log_likelihood(np.exp(parameters[:-1]), np.exp(parameters[-1]))
+        step = np.log(4.0)
+        for _ in range(rounds):
+            improved = False
+            for k in range(len(parameters)):
+                for direction in (1, -1):
+                    trial = parameters.copy()
+                    trial[k] = np.clip(trial[k] + direction*step, np.log(1e-10) if k == len(parameters) - 1 else np.log(1e-2), np.log(1e2))
+                    value = self._log_likelihood(np.exp(trial[:-1]), np.exp(trial[-1]))
+                    if value > best:
+                        parameters, best, improved = trial, value, True
+                        break
+            if not improved:
+                step /= 2
+                if step < 0.05:
+                    break
+        return np.exp(parameters[:-1]), np.exp(parameters[-1])
+
+    def _factorize(self):
+        K = _matern52(self._X, self._X, self.length_scales) + self.noise*np.eye(len(self._X))
+        # Inverse du facteur de Cholesky gardé : une prédiction ne résout plus de système
+        self._L_inv = np.linalg.inv(np.linalg.cholesky(K))
+        self._alpha = self._L_inv.T @ (self._L_inv @ self._Y)
+
+    def predict(self, X):
+        """Mean ``(n, m)`` and standard deviation ``(n, m)`` at the inputs ``X``."""
+        X = (np.atleast_2d(np.asarray(X, dtype=float)) - self._x_offset)/self._x_scale
+        k = _matern52(X, self._X, self.length_scales)
+        variance = np.maximum(1 - np.sum((self._L_inv @ k.T)**2, axis=0), 0)
+        return k @ self._alpha*self._y_scale + self._y_mean, np.sqrt(variance)[:, None]*self._y_scale
+
+    def condition(self, X, Y):
+        """Process with the same hyperparameters and scaling, trained on more points."""
+        process = object.__new__(GaussianProcess)
+        process.__dict__.update(self.__dict__)
+        process._X = np.concatenate((self._X, (np.atleast_2d(X) - self._x_offset)/self._x_scale))
+        Y = np.asarray(Y, dtype=float).reshape(len(np.atleast_2d(X)), -1)
+        process._Y = np.concatenate((self._Y, (Y - self._y_mean)/self._y_scale))
+        process._factorize()
+        return process
+
+
+class Surrogate:
+    """Gaussian process from design variables to S-parameters.
+
+    Parameters
+    ----------
+    inputs : tuple of str
+        Names of the input variables.
+    X : numpy.ndarray
+        Training inputs in SI units, ``(n, d)``.
+    frequencies : numpy.ndarray
+        Frequencies in Hz of the S-parameters.
+    s_parameters : numpy.ndarray
+        Training S-parameters, ``(n, n_freq, n_ports, n_ports)``.
+    **kwargs
+        ``length_scales`` and ``noise`` of ``GaussianProcess``.
+    """
+
+    def __init__(self, inputs, X, frequencies, s_parameters, **kwargs):
+        self.inputs = tuple(inputs)
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.shape = s_parameters.shape[1:]
+        # Parties réelles puis imaginaires de chaque ligne de la matrice S
+        Y = np.concatenate((s_parameters.real, s_parameters.imag), axis=-1).reshape(len(s_parameters), -1)
+        self.process = GaussianProcess(X, Y, **kwargs)
+
+    @classmethod
+    def fit(cls, store, inputs=INPUTS, datasets=None, **kwargs):
+        """Surrogate trained on every variant of a result store."""
+        X, frequencies, s_parameters = training_set(store, inputs, datasets)
+        return cls(inputs, X, frequencies, s_parameters, **kwargs)
+
+    def _as_inputs(self, design):
+        # Dictionnaire {variable: expression ou valeur SI} ou tableau (..., d) en unités SI
+        if isinstance(design, dict):
+            values = Evaluator({name: design[name] if isinstance(design[name], str) else repr(float(design[name]))
+                                for name in self.inputs}).evaluate()
+            return np.array([[float(values[name]) for name in self.inputs]])
+        return np.atleast_2d(np.asarray(design, dtype=float))
+
+    def predict(self, design):
+        """Predicted S-parameters and their standard deviation.
+
+        Parameters
+        ----------
+        design : dict or numpy.ndarray
+            ``{variable: expression}`` of one design, or inputs in SI units
+            of shape ``(n, d)`` in the order of ``inputs``.
+
+        Returns
+        -------
+        tuple of numpy.ndarray
+            Complex mean and real standard deviation of the S-parameters,
+            ``(n, n_freq, n_ports, n_ports)``. The standard deviation applies
+            to the real and to the imaginary part.
+        """
+        Y, std = self.process.predict(self._as_inputs(design))
+        n_freq, n_ports, _ = self.shape
+        Y = Y.reshape(len(Y), n_freq, n_ports, 2*n_ports)
+        std = std.reshape(len(std), n_freq, n_ports, 2*n_ports)
+        return Y[..., :n_ports] + 1j*Y[..., n_ports:], np.sqrt((std[..., :n_ports]**2 + std[..., n_ports:]**2)/2)
+
+    def screen(self, candidates, count, isolation_min=20.0):
+        """Indices of the ``count`` candidates with the widest predicted isolation band.
+
+        Ties are broken by the predicted insertion loss, see
+        ``circulateur.metrics.ranking``.
+
+        Parameters
+        ----------
+        candidates : numpy.ndarray
+            Inputs in SI units, ``(n, d)``.
+        """
+        mean, _ = self.predict(candidates)
+        return ranking(figures_of_merit(self.frequencies, mean, isolation_min))[:count]
@@ -0,0 +1,285 @@
+"""
+Circulator topologies
+
+Y-junction circulators share the junction disk and its three adaptation
+lines; they differ by the substrate shape and by how the access lines reach
+the ports. Each topology below only describes those differences, the builder
+in ``circulateur.builder`` emits the corresponding HFSS calls.
+
+- ``"Y"``: ferrite plate, ports 2 and 3 brought back to the rear edge,
+- ``"T"``: ferrite plate, ports 2 and 3 on the side edges,
+- ``"hexagonal"``: hexagonal dielectric substrate with a ferrite insert and
+  straight access lines at 120 degrees.
+"""
+
+import numpy as np
+
+from circulateur.expressions import unit_scale
+from circulateur.spec import BentLine, Box, Cylinder, Port, Topology
+from circulateur.variables import Computed
+
+PORT_COLOR = (255,0,255)
+
+
+def _adaptation_lines(suffixed):
+    # Lignes d'adaptation à 0, 120 et 240 degrés, avec des variables par accès si suffixed
+    lines = []
+    for k, angle in ((1, None), (2, "120deg"), (3, "240deg")):
+        longueur = "longueur_adaptation_{}".format(k) if suffixed else "longueur_adaptation"
+        largeur = "largeur_adaptation_{}".format(k) if suffixed else "largeur_adaptation"
+        lines.append(Box(name = "Ligne_adaptation_{}".format(k),
+                         origin = [0, "-{}/2".format(largeur), "hauteur_substrat"],
+                         sizes = ["rayon_jonction+{}".format(longueur), largeur, "epaisseur_metallisation"],
+                         material = "gold",
+                         rotate = angle))
+    return lines
+
+
+def _ferrite_plate():
+    # Plan de masse, substrat de ferrite et taper autour du ferrite
+    return [Box(name = "GND",
+                origin = ["-longueur_substrat_arriere", "-largeur_substrat/2", "0mm"],
+                sizes = ["longueur_substrat","largeur_substrat","-epaisseur_metallisation"],
+                material = "gold",
+                material_appearance = True),
+            Box(name = "Ferrite",
+                origin = ["-longueur_substrat_arriere+largeur_taper", "-largeur_substrat/2+largeur_taper", "0mm"],
+                sizes = ["longueur_substrat-2*largeur_taper","largeur_substrat-2*largeur_taper","hauteur_substrat"],
+                material = "mon_ferrite",
+                color = (64,64,64)),
+            Box(name = "Taper",
+                origin = ["-longueur_substrat_arriere", "-largeur_substrat/2", "0mm"],
+                sizes = ["longueur_substrat","largeur_substrat","hauteur_substrat"],
+                material = "mon_ferrite_taper",
+                color = (160,160,160))]
+
+
+def _plate_metallisation():
+    # Jonction, lignes d'adaptation, accès 1 et lignes droites avant les courbes des accès 2 et 3
+    metallisation = [Cylinder(name = "Jonction",
+                              origin = [0, 0, "hauteur_substrat"],
+                              radius = "rayon_jonction",
+                              height = "epaisseur_metallisation",
+                              material = "gold",
+                              material_appearance = True)]
+    metallisation += _adaptation_lines(suffixed=True)
+    metallisation.append(Box(name = "Ligne_50_Ohm_1",
+                             origin = ["rayon_jonction+longueur_adaptation_1", "-largeur_50_Ohm/2", "hauteur_substrat"],
+                             sizes = ["longueur_substrat_avant-rayon_jonction-longueur_adaptation_1","largeur_50_Ohm","epaisseur_metallisation"],
+                             material = "gold"))
+    for k, angle in ((2, "120deg"), (3, "240deg")):
+        metallisation.append(Box(name = "Ligne_50_Ohm_avant_courbe_{}".format(k),
+                                 origin = ["rayon_jonction+longueur_adaptation_{}".format(k), "-largeur_50_Ohm/2", "hauteur_substrat"],
+                                 sizes = ["longueur_50_Ohm_avant_courbe_{}".format(k),"largeur_50_Ohm","epaisseur_metallisation"],
+                                 material = "gold",
+                                 rotate = angle))
+    return metallisation
+
+
+def _plate_variables():
+    variables = {}
+    for k in (1, 2, 3):
+        variables["longueur_adaptation_{}".format(k)] = "longueur_adaptation"
+    for k in (1, 2, 3):
+        variables["largeur_adaptation_{}".format(k)] = "largeur_adaptation"
+    variables["rayon_courbure_2"] = "rayon_courbure"
+    variables["rayon_courbure_3"] = "rayon_courbure"
+    return variables
+
+
+def _plate_dimensions(values):
+    return (values["longueur_substrat_avant"] + values["longueur_substrat_arriere"],
+            values["largeur_substrat"],
+            values["hauteur_substrat"])
+
+
+def _port_1():
+    return Port(name = "1",
+                box = Box(name = "PEC_Port_1",
+                          origin = ["longueur_substrat_avant", "-largeur_port/2", 0],
+                          sizes = ["epaisseur_pec","largeur_port","hauteur_port"],
+                          material = "pec",
+                          color = PORT_COLOR),
+                face = "bottom_face_x")
+
+
+###########
+# Accès Y #
+###########
+
+Y = Topology(name = "Y",
+             variables = {**_plate_variables(),
+                          "longueur_50_Ohm_avant_courbe_2": "(ecartement_ports/2-(rayon_jonction+longueur_adaptation_2)*sin(60deg)-rayon_courbure_2*(1-cos(60deg)))/sin(60deg)",
+                          "longueur_50_Ohm_avant_courbe_3": "(ecartement_ports/2-(rayon_jonction+longueur_adaptation_3)*sin(60deg)-rayon_courbure_3*(1-cos(60deg)))/sin(60deg)",
+                          "longueur_50_Ohm_2": "longueur_substrat_arriere-(rayon_jonction+longueur_adaptation_2+longueur_50_Ohm_avant_courbe_2)*cos(60deg)-rayon_courbure_2*sin(60deg)",
+                          "longueur_50_Ohm_3": "longueur_substrat_arriere-(rayon_jonction+longueur_adaptation_3+longueur_50_Ohm_avant_courbe_3)*cos(60deg)-rayon_courbure_3*sin(60deg)"},
+             substrate = _ferrite_plate(),
+             cavity = ("Taper", "Ferrite"),
+             metallisation = _plate_metallisation() + [
+                 BentLine(name = "Ligne_50_Ohm_Courbe_2",
+                          x_uv = "_u*cos(_v)-sin(30deg)*(rayon_jonction+longueur_adaptation_2+longueur_50_Ohm_avant_courbe_2)-cos(30deg)*rayon_courbure_2",
+                          y_uv = "_u*sin(_v)+cos(30deg)*(rayon_jonction+longueur_adaptation_2+longueur_50_Ohm_avant_courbe_2)-sin(30deg)*rayon_courbure_2",
+                          z_uv = "hauteur_substrat",
+                          u_start = "rayon_courbure_2-largeur_50_Ohm/2",
+                          u_end = "rayon_courbure_2+largeur_50_Ohm/2",
+                          v_start = "30deg",
+                          v_end = "90deg",
+                          thickness = "epaisseur_metallisation",
+                          material = "gold"),
+                 BentLine(name = "Ligne_50_Ohm_Courbe_3",
+                          x_uv = "_u*cos(_v)-sin(30deg)*(rayon_jonction+longueur_adaptation_3+longueur_50_Ohm_avant_courbe_3)-cos(30deg)*rayon_courbure_3",
+                          y_uv = "_u*sin(_v)-cos(30deg)*(rayon_jonction+longueur_adaptation_3+longueur_50_Ohm_avant_courbe_3)+sin(30deg)*rayon_courbure_3",
+                          z_uv = "hauteur_substrat",
+                          u_start = "rayon_courbure_2-largeur_50_Ohm/2",
+                          u_end = "rayon_courbure_2+largeur_50_Ohm/2",
+                          v_start = "270deg",
+                          v_end = "330deg",
+                          thickness = "epaisseur_metallisation",
+                          material = "gold"),
+                 Box(name = "Ligne_50_Ohm_2",
+                     origin = ["-longueur_substrat_arriere", "ecartement_ports/2-largeur_50_Ohm/2", "hauteur_substrat"],
+                     sizes = ["longueur_50_Ohm_2","largeur_50_Ohm","epaisseur_metallisation"],
+                     material = "gold"),
+                 Box(name = "Ligne_50_Ohm_3",
+                     origin = ["-longueur_substrat_arriere", "-ecartement_ports/2-largeur_50_Ohm/2", "hauteur_substrat"],
+                     sizes = ["longueur_50_Ohm_3","largeur_50_Ohm","epaisseur_metallisation"],
+                     material = "gold")],
+             ports = [_port_1(),
+                      Port(name = "2",
+                           box = Box(name = "PEC_Port_2",
+                                     origin = ["-longueur_substrat_arriere", "ecartement_ports/2-largeur_port/2", 0],
+                                     sizes = ["epaisseur_pec","largeur_port","hauteur_port"],
+                                     material = "pec",
+                                     color = PORT_COLOR),
+                           face = "bottom_face_y"),
+                      Port(name = "3",
+                           box = Box(name = "PEC_Port_3",
+                                     origin = ["-longueur_substrat_arriere", "-ecartement_ports/2-largeur_port/2", 0],
+                                     sizes = ["epaisseur_pec","largeur_port","hauteur_port"],
+                                     material = "pec",
+                                     color = PORT_COLOR),
+                           face = "top_face_y")],
+             demagnetisation = "aharoni",
+             taper = True,
+             demagnetisation_dimensions = _plate_dimensions)
+
+###########
+# Accès T #
+###########
+
+T = Topology(name = "T",
+             variables = {**_plate_variables(),
+                          "longueur_50_Ohm_avant_courbe_2": "(-emplacement_ports-(rayon_jonction+longueur_adaptation_2)*sin(30deg)-rayon_courbure_2*(1-cos(30deg)))/sin(30deg)",
+                          "longueur_50_Ohm_avant_courbe_3": "(-emplacement_ports-(rayon_jonction+longueur_adaptation_3)*sin(30deg)-rayon_courbure_3*(1-cos(30deg)))/sin(30deg)",
+                          "longueur_50_Ohm_2": "largeur_substrat/2-(rayon_jonction+longueur_adaptation_2+longueur_50_Ohm_avant_courbe_2)*cos(30deg)-rayon_courbure_2*sin(30deg)",
+                          "longueur_50_Ohm_3": "largeur_substrat/2-(rayon_jonction+longueur_adaptation_3+longueur_50_Ohm_avant_courbe_3)*cos(30deg)-rayon_courbure_3*sin(30deg)"},
+             substrate = _ferrite_plate(),
+             cavity = ("Taper", "Ferrite"),
+             metallisation = _plate_metallisation() + [
+                 BentLine(name = "Ligne_50_Ohm_Courbe_2",
+                          x_uv = "_u*cos(_v)-sin(30deg)*(rayon_jonction+longueur_adaptation_2+longueur_50_Ohm_avant_courbe_2)+cos(30deg)*rayon_courbure_2",
+                          y_uv = "_u*sin(_v)+cos(30deg)*(rayon_jonction+longueur_adaptation_2+longueur_50_Ohm_avant_courbe_2)+sin(30deg)*rayon_courbure_2",
+                          z_uv = "hauteur_substrat",
+                          u_start = "rayon_courbure_2-largeur_50_Ohm/2",
+                          u_end = "rayon_courbure_2+largeur_50_Ohm/2",
+                          v_start = "180deg",
+                          v_end = "210deg",
+                          thickness = "epaisseur_metallisation",
+                          material = "gold"),
+                 BentLine(name = "Ligne_50_Ohm_Courbe_3",
+                          x_uv = "_u*cos(_v)-sin(30deg)*(rayon_jonction+longueur_adaptation_3+longueur_50_Ohm_avant_courbe_3)+cos(30deg)*rayon_courbure_3",
+                          y_uv = "_u*sin(_v)-cos(30deg)*(rayon_jonction+longueur_adaptation_3+longueur_50_Ohm_avant_courbe_3)-sin(30deg)*rayon_courbure_3",
+                          z_uv = "hauteur_substrat",
+                          u_start = "rayon_courbure_3-largeur_50_Ohm/2",
+                          u_end = "rayon_courbure_3+largeur_50_Ohm/2",
+                          v_start = "150deg",
+                          v_end = "180deg",
+                          thickness = "epaisseur_metallisation",
+                          material = "gold"),
+                 Box(name = "Ligne_50_Ohm_2",
+                     origin = ["emplacement_ports-largeur_50_Ohm/2", "largeur_substrat/2", "hauteur_substrat"],
+                     sizes = ["largeur_50_Ohm","-longueur_50_Ohm_2","epaisseur_metallisation"],
+                     material = "gold"),
+                 Box(name = "Ligne_50_Ohm_3",
+                     origin = ["emplacement_ports-largeur_50_Ohm/2", "-largeur_substrat/2", "hauteur_substrat"],
+                     sizes = ["largeur_50_Ohm","longueur_50_Ohm_3","epaisseur_metallisation"],
+                     material = "gold")],
+             ports = [_port_1(),
+                      Port(name = "2",
+                           box = Box(name = "PEC_Port_2",
+                                     origin = ["emplacement_ports-largeur_port/2", "largeur_substrat/2", 0],
+                                     sizes = ["largeur_port","epaisseur_pec","hauteur_port"],
+                                     material = "pec",
+                                     color = PORT_COLOR),
+                           face = "bottom_face_y"),
+                      Port(name = "3",
+                           box = Box(name = "PEC_Port_3",
+                                     origin = ["emplacement_ports-largeur_port/2", "-largeur_substrat/2", 0],
+                                     sizes = ["largeur_port","-epaisseur_pec","hauteur_port"],
+                                     material = "pec",
+                                     color = PORT_COLOR),
+                           face = "top_face_y")],
+             demagnetisation = "aharoni",
+             taper = True,
+             demagnetisation_dimensions = _plate_dimensions)
+
+######################
+# Substrat hexagonal #
+######################
+
+def _hexagonal_substrate_length(values):
+    # Le substrat doit contenir les ports et au moins longueur_50_Ohm_min de ligne d'accès
+    values = {name: value/unit_scale("um") for name, value in values.items()}
+    longueur_substrat = np.max([1.5*values["largeur_port"]/(2*np.tan(30*np.pi/180)),
+                                values["rayon_jonction"]+values["longueur_adaptation"]+values["longueur_50_Ohm_min"]])
+    return str(longueur_substrat)+"um"
+
+
+HEXAGONAL = Topology(name = "hexagonal",
+                     variables = {},
+                     substrate = [Cylinder(name = "GND",
+                                           origin = [0, 0, 0],
+                                           radius = "longueur_substrat/cos(30deg)",
+                                           height = "-epaisseur_metallisation",
+                                           num_sides = 6,
+                                           material = "gold",
+                                           rotate = "30deg"),
+                                  Cylinder(name = "Substrat",
+                                           origin = [0, 0, 0],
+                                           radius = "longueur_substrat/cos(30deg)",
+                                           height = "hauteur_substrat",
+                                           num_sides = 6,
+                                           material = "mon_dielectrique",
+                                           rotate = "30deg"),
+                                  Cylinder(name = "Ferrite",
+                                           origin = [0, 0, 0],
+                                           radius = "rayon_ferrite",
+                                           height = "hauteur_substrat",
+                                           material = "mon_ferrite")],
+                     cavity = ("Substrat", "Ferrite"),
+                     metallisation = [Cylinder(name = "Jonction",
+                                               origin = [0, 0, "hauteur_substrat"],
+                                               radius = "rayon_jonction",
+                                               height = "epaisseur_metallisation",
+                                               material = "gold")]
+                                     + _adaptation_lines(suffixed=False)
+                                     + [Box(name = "Ligne_50_Ohm_{}".format(k),
+                                            origin = ["rayon_jonction+longueur_adaptation", "-largeur_50_Ohm/2", "hauteur_substrat"],
+                                            sizes = ["longueur_substrat-rayon_jonction-longueur_adaptation","largeur_50_Ohm","epaisseur_metallisation"],
+                                            material = "gold",
+                                            rotate = angle)
+                                        for k, angle in ((1, None), (2, "120deg"), (3, "240deg"))],
+                     ports = [Port(name = str(k),
+                                   box = Box(name = "PEC_Port_{}".format(k),
+                                             origin = ["longueur_substrat", "-largeur_port/2", 0],
+                                             sizes = ["epaisseur_pec","largeur_port","hauteur_port"],
+                                             material = "pec",
+                                             color = PORT_COLOR),
+                                   face = "bottom_face_x",
+                                   rotate = angle)
+                              for k, angle in ((1, None), (2, "120deg"), (3, "240deg"))],
+                     demagnetisation = "chen",
+                     computed_variables = {"longueur_substrat": Computed(inputs = ("largeur_port", "rayon_jonction", "longueur_adaptation", "longueur_50_Ohm_min"),
+                                                                         function = _hexagonal_substrate_length)})
+
+TOPOLOGIES = {"Y": Y, "T": T, "hexagonal": HEXAGONAL}
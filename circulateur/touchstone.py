@@ -0,0 +1,237 @@
+"""
+Vectorized Touchstone (``.sNp``) reader and writer
+
+Touchstone 1.x files of S-parameters, as exported by HFSS for the
+circulators (``.s3p``):
+
+- the option line ``# GHz S MA R 50`` gives the frequency unit, the format
+  (``RI``, ``MA`` or ``DB``) and the reference impedance,
+- every frequency point is the frequency followed by the ``n_ports**2``
+  complex values row by row, one matrix row per line (column by column,
+  ``S11 S21 S12 S22``, on a single line for 2 ports).
+
+The data is parsed as one flat block of numbers by NumPy and reshaped, never
+line by line, and large files are read by chunks of bytes with
+``iter_touchstone``. Files holding several variations one after the other
+(the frequency starts again) are read as a ``(n_variations, n_freq, n, n)``
+array. The writer formats whole blocks of points with a single format string.
+Noise parameters and Touchstone 2.0 keywords are not supported.
+"""
+
+import re
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+FREQUENCY_UNITS = {"HZ": 1.0, "KHZ": 1e3, "MHZ": 1e6, "GHZ": 1e9}
+FORMATS = ("RI", "MA", "DB")
+
+_COMMENT = re.compile(r"!.*")
+_OPTION = re.compile(r"^[ \t]*#(.*)$", re.M)
+
+
+class Touchstone(NamedTuple):
+    """Content of a Touchstone file."""
+    frequencies: np.ndarray # Fréquences en Hz
+    s_parameters: np.ndarray # (n_freq, n, n), ou (n_variations, n_freq, n, n)
+    z0: float # Impédance de référence en Ohm
+
+
+class Options(NamedTuple):
+    unit: str = "GHZ"
+    format: str = "MA"
+    z0: float = 50.0
+
+
+def n_ports(path):
+    """Number of ports given by the ``.sNp`` extension."""
+    match = re.fullmatch(r"\.s(\d+)p", Path(path).suffix.lower())
+    if match is None:
+        raise ValueError("{} is not a .sNp Touchstone file".format(path))
+    return int(match.group(1))
+
+
+def parse_options(line):
+    """``Options`` of a ``# <unit> S <format> R <z0>`` option line."""
+    unit, format, z0 = Options()
+    words = line.strip().lstrip("#").upper().split()
+    index = 0
+    while index < len(words):
+        word = words[index]
+        if word in FREQUENCY_UNITS:
+            unit = word
+        elif word in FORMATS:
+            format = word
+        elif word == "R" and index + 1 < len(words):
+            z0 = float(words[index + 1])
+            index += 1
+        elif word != "S":
+            raise ValueError("Unsupported Touchstone option '{}', only S-parameters are read".format(word))
+        index += 1
+    return Options(unit, format, z0)
+
+
+def _complex(pairs, format):
+    # pairs[..., 0] et pairs[..., 1] selon le format du fichier
+    first, second = pairs[..., 0], pairs[..., 1]
+    if format == "RI":
+        return first + 1j*second
+    magnitude = first if format == "MA" else 10**(first/20)
+    return magnitude*np.exp(1j*np.deg2rad(second))
+
+
+def _points(values, ports, options):
+    # Bloc (n_points*(1 + 2*n²),) de nombres -> fréquences en Hz et S (n_points, n, n)
+    records = values.reshape(-1, 1 + 2*ports**2)
+    s_parameters = _complex(records[:, 1:].reshape(-1, ports, ports, 2), options.format)
+    if ports == 2:
+        s_parameters = s_parameters.transpose(0, 2, 1)
+    return records[:, 0]*FREQUENCY_UNITS[options.unit], s_parameters
+
+
+def iter_touchstone(path, chunk_size=1 << 24):
+    """Read a Touchstone file by chunks of complete frequency points.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        ``.sNp`` file.
+    chunk_size : int, optional
+        Bytes read at a time. The default is 16 MB.
+
+    Yields
+    ------
+    tuple
+        ``(options, frequencies, s_parameters)`` with frequencies in Hz and
+        S-parameters of shape ``(n_points, n, n)``.
+    """
+    ports = n_ports(path)
+    record_size = 1 + 2*ports**2
+    options = None
+    remainder = np.empty(0)
+    pending = ""
+    with open(path, "r", errors="replace") as touchstone:
+        while True:
+            chunk = touchstone.read(chunk_size)
+            # Les lignes coupées en fin de bloc sont gardées pour le suivant
+            text = pending + chunk
+            cut = text.rfind("\n") + 1 if chunk else len(text)
+            text, pending = text[:cut], text[cut:]
+            text = _COMMENT.sub("", text)
+            if options is None:
+                option = _OPTION.search(text)
+                if option is not None:
+                    options = parse_options(option.group(1))
+            text = _OPTION.sub("", text)
+            if "[" in text:
+                raise ValueError("{}: Touchstone 2.0 keywords are not supported".format(path))
+            values = np.fromstring(text, sep=" ") if text.strip() else np.empty(0)
+            values = np.concatenate((remainder, values)) if len(remainder) else values
+            complete = len(values) - len(values) % record_size
+            remainder = values[complete:]
+            if complete:
+                yield (options or Options(), *_points(values[:complete], ports, options or Options()))
+            if not chunk:
+                break
+    if len(remainder):
+        raise ValueError("{}: incomplete last frequency point ({} of {} values)".format(path, len(remainder), record_size))
+
+
+def read_touchstone(path, chunk_size=1 << 24):
+    """Read a whole Touchstone file.
+
+    Returns
+    -------
+    Touchstone
+        S-parameters of shape ``(n_freq, n, n)``, or
+        ``(n_variations, n_freq, n, n)`` when the frequency starts again.
+    """
+    options = Options()
+    frequencies, s_parameters = [], []
+    for options, freq, s in iter_touchstone(path, chunk_size):
+        frequencies.append(freq)
+        s_parameters.append(s)
+    if not frequencies:
+        raise ValueError("{}: no frequency point".format(path))
+    frequencies = np.concatenate(frequencies)
+    s_parameters = np.concatenate(s_parameters)
+
+    restarts = np.flatnonzero(np.diff(frequencies) <= 0) + 1
+    if len(restarts):
+        n_freq = restarts[0]
+        if len(frequencies) % n_freq or not np.array_equal(frequencies.reshape(-1, n_freq), np.broadcast_to(frequencies[:n_freq], (len(frequencies)//n_freq, n_freq))):
+            raise ValueError("{}: the variations do not share the same frequency points".format(path))
+        ports = s_parameters.shape[-1]
+        return Touchstone(frequencies[:n_freq], s_parameters.reshape(-1, n_freq, ports, ports), options.z0)
+    return Touchstone(frequencies, s_parameters, options.z0)
+
+
+def _record_format(ports, precision):
+    # Format d'un point : fréquence et une ligne par ligne de la matrice, 4 paires au plus par ligne
+    value = "%.{}e".format(precision)
+    pair = " ".join((value, value))
+    lines = []
+    for _ in range(ports):
+        row = [pair]*ports
+        lines.extend(" ".join(row[start:start + 4]) for start in range(0, ports, 4))
+    if ports <= 2:
+        lines = [" ".join(lines)]
+    return value + " " + "\n".join(lines) + "\n"
+
+
+def write_touchstone(path, frequencies, s_parameters, format="MA", unit="GHz", z0=50.0, precision=9, comments=(), chunk_points=10000):
+    """Write S-parameters to a Touchstone file.
+
+    Parameters
+    ----------
+    path : str or pathlib.Path
+        ``.sNp`` file, ``N`` matching the number of ports.
+    frequencies : numpy.ndarray
+        Frequencies in Hz.
+    s_parameters : numpy.ndarray
+        Complex array of shape ``(n_freq, n, n)``.
+    format : str, optional
+        ``"RI"``, ``"MA"`` or ``"DB"``. The default is ``"MA"``.
+    unit : str, optional
+        Frequency unit of the file. The default is ``"GHz"``.
+    z0 : float, optional
+        Reference impedance. The default is ``50``.
+    precision : int, optional
+        Digits after the decimal point. The default is ``9``.
+    comments : list of str, optional
+        ``!`` comment lines written before the option line.
+    chunk_points : int, optional
+        Frequency points formatted at a time. The default is ``10000``.
+    """
+    format = format.upper()
+    if format not in FORMATS:
+        raise ValueError("Format must be one of {}, got '{}'".format(FORMATS, format))
+    frequencies = np.asarray(frequencies, dtype=float)
+    s_parameters = np.asarray(s_parameters, dtype=complex)
+    ports = s_parameters.shape[-1]
+    if s_parameters.shape != (len(frequencies), ports, ports):
+        raise ValueError("Expected S-parameters of shape {}, got {}".format((len(frequencies), ports, ports), s_parameters.shape))
+    if n_ports(path) != ports:
+        raise ValueError("{} does not match {} ports".format(path, ports))
+
+    if ports == 2:
+        s_parameters = s_parameters.transpose(0, 2, 1)
+    if format == "RI":
+        pairs = np.stack((s_parameters.real, s_parameters.imag), axis=-1)
+    else:
+        magnitude = np.abs(s_parameters)
+        if format == "DB":
+            with np.errstate(divide="ignore"):
+                magnitude = 20*np.log10(magnitude)
+        pairs = np.stack((magnitude, np.angle(s_parameters, deg=True)), axis=-1)
+    records = np.concatenate((frequencies[:, None]/FREQUENCY_UNITS[unit.upper()], pairs.reshape(len(frequencies), -1)), axis=1)
+
+    record = _record_format(ports, precision)
+    with open(path, "w") as touchstone:
+        for comment in comments:
+            touchstone.write("! {}\n".format(comment))
+        touchstone.write("# {} S {} R {:g}\n".format(unit, format, z0))
+        for start in range(0, len(records), chunk_points):
+            block = records[start:start + chunk_points]
+            touchstone.write((record*len(block)) % tuple(block.ravel()))
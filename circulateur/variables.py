@@ -0,0 +1,220 @@
+"""
+Ordered table of HFSS variables pushed to AEDT in one batch
+
+Setting ``app[name] = expression`` costs one round trip to AEDT per variable
+and makes AEDT re-evaluate every dependent expression each time. A
+``VariableTable`` collects the project (``$``) and design variables locally
+with the same ``table[name] = expression`` syntax, checks the units and
+references of every expression, sorts the table so that each variable comes
+after the variables it uses, and submits everything with a single
+``variable_manager.set_variable`` call (one ``ChangeProperty`` for the design
+variables and one for the project variables).
+
+``VariableGraph`` keeps the table after the first push together with its
+dependency graph and the local values of every variable. When some inputs
+change, only the variables downstream of them are re-evaluated, and only the
+changed inputs and the variables computed in Python (port sizes, taper
+permeability...) are pushed again: AEDT re-evaluates the expression
+variables by itself.
+"""
+
+from typing import Callable, NamedTuple
+
+from circulateur.expressions import dependency_order, evaluate, references
+
+
+class VariableTable:
+    """Project and design variables to push to AEDT in one operation.
+
+    Assignments keep their order, reassigning a name replaces its expression
+    in place, like successive ``app[name] = expression`` calls.
+    """
+
+    def __init__(self, variables=None):
+        self._expressions = {}
+        for name, expression in (variables or {}).items():
+            self[name] = expression
+
+    def __setitem__(self, name, expression):
+        self._expressions[name] = str(expression)
+
+    def __getitem__(self, name):
+        return self._expressions[name]
+
+    def __contains__(self, name):
+        return name in self._expressions
+
+    def __iter__(self):
+        return iter(self._expressions)
+
+    def __len__(self):
+        return len(self._expressions)
+
+    def items(self):
+        return self._expressions.items()
+
+    def update(self, variables):
+        for name, expression in variables.items():
+            self[name] = expression
+
+    def ordered(self, known=()):
+        """Variable names sorted so that every variable follows its references.
+
+        See ``circulateur.expressions.dependency_order``.
+        """
+        return dependency_order(self._expressions, known)
+
+    def push(self, app, known=()):
+        """Validate the table and submit it to ``app`` in a single batch.
+
+        Parameters
+        ----------
+        app : ansys.aedt.core.Hfss
+            Application receiving the variables.
+        known : iterable of str, optional
+            Names already defined in the design or project, see ``ordered``.
+
+        Returns
+        -------
+        list of str
+            Names in the order they were submitted.
+        """
+        names = self.ordered(known)
+        if not names:
+            return names
+        if not app.variable_manager.set_variable(name = names,
+                                                 expression = [self._expressions[name] for name in names]):
+            raise RuntimeError("AEDT rejected the variable table of design '{}'".format(app.design_name))
+        return names
+
+
+class Computed(NamedTuple):
+    """Variable whose expression is computed in Python from other variables."""
+    inputs: tuple # Noms des variables utilisées
+    function: Callable # function({nom: valeur SI}) -> expression HFSS
+
+
+class VariableGraph:
+    """Variable table with its dependency graph, updated incrementally.
+
+    Parameters
+    ----------
+    variables : dict
+        ``{name: expression or Computed}`` in definition order.
+    datasets : dict, optional
+        ``{name: circulateur.nzm_chen.Dataset1D}`` of the datasets imported
+        in AEDT and referenced by ``pwl``.
+    """
+
+    def __init__(self, variables, datasets=None):
+        self.datasets = dict(datasets or {})
+        self._definitions = {name: definition if isinstance(definition, Computed) else str(definition)
+                             for name, definition in variables.items()}
+        self.expressions = {} # Expressions courantes, Computed résolus
+        self.values = {} # Valeurs locales en SI
+        self._link()
+        self._evaluate(self.order)
+
+    def _link(self):
+        expressions = {name: "" if isinstance(definition, Computed) else definition
+                       for name, definition in self._definitions.items()}
+        inputs = {name: list(definition.inputs)
+                  for name, definition in self._definitions.items() if isinstance(definition, Computed)}
+        self.order = dependency_order(expressions, known=self.datasets, dependencies=inputs)
+        self.dependents = {name: [] for name in self._definitions}
+        for name, expression in expressions.items():
+            for ref in references(expression) + inputs.get(name, []):
+                if ref in self.dependents:
+                    self.dependents[ref].append(name)
+
+    def _evaluate(self, names):
+        for name in names:
+            definition = self._definitions[name]
+            if isinstance(definition, Computed):
+                expression = str(definition.function({ref: self.values[ref] for ref in definition.inputs}))
+            else:
+                expression = definition
+            self.expressions[name] = expression
+            self.values[name] = evaluate(expression, self.values, self.datasets, name)
+
+    def __getitem__(self, name):
+        return self.expressions[name]
+
+    def definition(self, name):
+        """Expression or ``Computed`` the variable was defined with."""
+        return self._definitions[name]
+
+    def __contains__(self, name):
+        return name in self._definitions
+
+    def __iter__(self):
+        return iter(self._definitions)
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def items(self):
+        return ((name, self.expressions[name]) for name in self._definitions)
+
+    def affected(self, names):
+        """``names`` and every variable depending on them, in dependency order."""
+        pending = list(names)
+        reached = set(pending)
+        while pending:
+            for dependent in self.dependents[pending.pop()]:
+                if dependent not in reached:
+                    reached.add(dependent)
+                    pending.append(dependent)
+        return [name for name in self.order if name in reached]
+
+    def push(self, app, known=()):
+        """Submit the whole table to ``app`` in one batch, see ``VariableTable.push``."""
+        return VariableTable(dict(self.items())).push(app, set(known) | set(self.datasets))
+
+    def update(self, app=None, known=(), **changes):
+        """Change some input variables and push only what AEDT cannot re-evaluate.
+
+        Parameters
+        ----------
+        app : ansys.aedt.core.Hfss, optional
+            Application holding the pushed table. The default is ``None``,
+            which only updates the local values.
+        known : iterable of str, optional
+            Other names defined in AEDT, see ``VariableTable.ordered``.
+        **changes
+            New HFSS expressions of some variables, e.g. ``rayon_jonction="1000um"``.
+
+        Returns
+        -------
+        list of str
+            Names pushed to AEDT: the changed variables and the computed
+            variables whose expression changed.
+        """
+        unknown = [name for name in changes if name not in self._definitions]
+        if unknown:
+            raise KeyError("Unknown variables: {}".format(", ".join(unknown)))
+        computed = [name for name in changes if isinstance(self._definitions[name], Computed)]
+        if computed:
+            raise ValueError("Computed variables cannot be set: {}".format(", ".join(computed)))
+
+        changes = {name: str(expression) for name, expression in changes.items() if str(expression) != self._definitions[name]}
+        previous = dict(self.expressions)
+        definitions = dict(self._definitions)
+        state = (self.order, self.dependents, dict(self.values))
+        self._definitions.update(changes)
+        try:
+            if any(references(self._definitions[name]) != references(definitions[name]) for name in changes):
+                self._link()
+            self._evaluate(self.affected(changes))
+        except Exception:
+            # Table inchangée si une expression est invalide ou ne s'évalue pas
+            self._definitions = definitions
+            self.expressions = previous
+            self.order, self.dependents, self.values = state
+            raise
+
+        pushed = [name for name in self.order
+                  if name in changes or (isinstance(self._definitions[name], Computed) and self.expressions[name] != previous[name])]
+        if app is not None and pushed:
+            VariableTable({name: self.expressions[name] for name in pushed}).push(app, set(known) | set(self._definitions) | set(self.datasets))
+        return pushed
@@ -0,0 +1,29 @@
+from circulateur.aedt_file import AedtFile
+
+PROJECT = """$begin 'AnsoftProject'
+\t$begin 'Properties'
+\t\tVariableProp('$ferrite_Mr', 'UD', 'Aimantation (Gauss', '1800Gauss')
+\t$end 'Properties'
+\t$begin 'HFSSModel'
+\t\tName='Circulateur'
+\t\t$begin 'ModelSetup'
+\t\t\t$begin 'Properties'
+\t\t\t\tVariableProp('s', 'UD', 'desc, with (paren', '1mm')
+\t\t\t\tVariableProp('rayon_jonction', 'UD', '', '950um')
+\t\t\t\tVariableProp('longueur', 'UD', 'sur (deux',
+\t\t\t\t\t'2*s')
+\t\t\t\tVariableProp('hauteur', 'UD', 'fin ) de phrase', '100um')
+\t\t\t$end 'Properties'
+\t\t$end 'ModelSetup'
+\t$end 'HFSSModel'
+$end 'AnsoftProject'
+"""
+
+
+def test_quoted_parentheses(tmp_path):
+    path = tmp_path / "projet.aedt"
+    path.write_text(PROJECT)
+    with AedtFile(path) as project:
+        variables = project.variables()
+    assert variables["$ferrite_Mr"] == "1800Gauss"
+    assert variables["Circulateur"] == {"s": "1mm", "rayon_jonction": "950um", "longueur": "2*s", "hauteur": "100um"}
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from circulateur.demag import AHARONI_EXPRESSIONS, aharoni_nz, check_hfss_expressions
+
+
+def test_hfss_expressions_random_prisms():
+    # Prismes aléatoires, du disque mince au barreau
+    rng = np.random.default_rng(1998)
+    length, width, height = 10**rng.uniform(-5, -2, size=(3, 200))
+    assert check_hfss_expressions(length, width, height)
+
+
+def test_hfss_expressions_cube():
+    assert check_hfss_expressions(1e-3, 1e-3, 1e-3)
+    assert aharoni_nz(1e-3, 1e-3, 1e-3) == pytest.approx(1/3, rel=1e-12)
+
+
+def test_thin_plate():
+    assert aharoni_nz(1.0, 1.0, 1e-4) == pytest.approx(1.0, abs=1e-3)
+    assert check_hfss_expressions(1.0, 1.0, 1e-4)
+
+
+def test_check_detects_mismatch(monkeypatch):
+    # Un terme oublié dans les expressions HFSS doit être signalé
+    monkeypatch.setitem(AHARONI_EXPRESSIONS, "Nz", "(N1+N2+N3+N4+N5+N6+N7+N8+N9-N11)/pi")
+    with pytest.raises(AssertionError):
+        check_hfss_expressions(1e-3, 2e-3, 3e-3)